@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, CancelledError, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from money import format_amount
+from pdf_backends import DEFAULT_LAYOUT_BACKEND
+from purchase_extractor import (
+    _shutdown_extraction_pool,
+    extract_page_range,
+    extraction_pool,
+    page_ranges,
+    page_shard_plan,
+    parse_statement,
+    read_statement,
+    statement_parser,
+    tag_statement_rows,
+)
+from tag_rules import compile_tag_rules
+from tracing import merge_events, run_traced, span, trace_state
+
+
+PIPELINE_MAX_IN_FLIGHT = 4
+PIPELINE_QUEUE_SIZE = 4
+_DONE = object()
+
+
+def _read_for_pipeline(path, bank, account_type):
+    # Un trabajo por archivo: los PDF que conviene repartir ya se separaron
+    # en rangos de paginas (ver ImportPipeline._submit_read).
+    started = time.perf_counter()
+    content = read_statement(path, bank, account_type, page_workers=1)
+    return content, time.perf_counter() - started
+
+
+class _ShardedRead:
+    """
+    Un PDF grande que se lee por rangos de paginas; `texts` se llena a medida
+    que terminan los rangos.
+    """
+
+    def __init__(self, path, plan):
+        self.path = path
+        self.texts = [None] * plan["pages"]
+        self.layout_pages = plan["layout_pages"]
+        self.waiting = 0
+        self.finished = False
+        self.started = time.perf_counter()
+
+    def submit(self, executor, pages, backend_name):
+        jobs = {}
+        for start, stop in page_ranges(pages):
+            future = executor.submit(run_traced, trace_state(), extract_page_range, self.path, start, stop, backend_name)
+            jobs[future] = (self.path, self, start)
+        self.waiting += len(jobs)
+        return jobs
+
+
+def _unfinished(pending):
+    """
+    Archivos de los trabajos pendientes, sin repetir ni incluir los PDF
+    repartidos que ya terminaron con error.
+    """
+    return list(dict.fromkeys(path for path, sharded, _start in pending.values() if sharded is None or not sharded.finished))
+
+
+class ImportPipeline:
+    """
+    Importa varios estados de cuenta en tres etapas encadenadas:
+
+    1. lectura del archivo (texto del PDF) en un grupo de procesos; los PDF
+       grandes se reparten por rangos de paginas en ese mismo grupo;
+    2. interpretacion con el parser del banco, en un hilo;
+    3. etiquetado y formato de montos, en otro hilo.
+
+    Entre etapas hay colas acotadas y como mucho `max_in_flight` archivos se
+    leen a la vez, de modo que si nadie consume los resultados el pipeline se
+    detiene en lugar de acumular texto en memoria. Cada archivo terminado
+    sale por `drain()` como un diccionario con "path", "rows" ([fecha,
+    descripcion, monto, moneda, etiqueta]), "error" y "seconds".
+    """
+
+    def __init__(
+        self,
+        files,
+        bank,
+        account_type,
+        tags,
+        natag="N/A",
+        executor=None,
+        max_in_flight=PIPELINE_MAX_IN_FLIGHT,
+        queue_size=PIPELINE_QUEUE_SIZE,
+    ):
+        statement_parser(bank, account_type)
+        self.files = list(files)
+        self.bank = bank
+        self.account_type = account_type
+        self.tags = tags
+        self.matcher = compile_tag_rules(tags, natag)
+        self.max_in_flight = max_in_flight
+        self._executor = executor
+        self._parse_queue = queue.Queue(maxsize=queue_size)
+        self._tag_queue = queue.Queue(maxsize=queue_size)
+        self._results = queue.Queue(maxsize=queue_size)
+        self._cancelled = threading.Event()
+        self._threads = []
+        self.finished = False
+
+    def start(self):
+        for name, target in (
+            ("import-read", self._read_stage),
+            ("import-parse", self._parse_stage),
+            ("import-tag", self._tag_stage),
+        ):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def drain(self):
+        """
+        Devuelve sin bloquear los archivos terminados desde la ultima llamada.
+        """
+        completed = []
+        while not self.finished:
+            try:
+                result = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if result is _DONE:
+                self.finished = True
+            else:
+                completed.append(result)
+        return completed
+
+    def __iter__(self):
+        """
+        Recorre los resultados bloqueando hasta que termine el ultimo archivo.
+        """
+        while not self.finished:
+            result = self._results.get()
+            if result is _DONE:
+                self.finished = True
+            else:
+                yield result
+
+    def cancel(self):
+        self._cancelled.set()
+        for stage_queue in (self._parse_queue, self._tag_queue, self._results):
+            while True:
+                try:
+                    stage_queue.get_nowait()
+                except queue.Empty:
+                    break
+            # Despierta a la etapa que espera en esta cola.
+            try:
+                stage_queue.put_nowait(_DONE)
+            except queue.Full:
+                pass
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _put(self, stage_queue, item):
+        while not self._cancelled.is_set():
+            try:
+                stage_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read_stage(self):
+        executor = self._executor or extraction_pool()
+        pending = {}
+        files = iter(self.files)
+        try:
+            while not self._cancelled.is_set():
+                while executor is not None and len(pending) < self.max_in_flight:
+                    path = next(files, None)
+                    if path is None:
+                        break
+                    try:
+                        pending.update(self._submit_read(executor, path))
+                    except (BrokenProcessPool, RuntimeError):
+                        files = self._read_in_process(executor, [path, *_unfinished(pending)], files)
+                        pending.clear()
+                        executor = None
+                if executor is None:
+                    path = next(files, None)
+                    if path is None:
+                        break
+                    item = self._read_item(path, run_traced, trace_state(), _read_for_pipeline, path, self.bank, self.account_type)
+                    if not self._put(self._parse_queue, item):
+                        return
+                    continue
+                if not pending:
+                    break
+                done, _not_done = wait(pending, return_when=FIRST_COMPLETED)
+                broken = []
+                for future in done:
+                    path, sharded, start = pending.pop(future)
+                    try:
+                        if sharded is None:
+                            item = self._read_item(path, future.result)
+                        else:
+                            item = self._shard_done(executor, pending, sharded, start, future)
+                    except (BrokenProcessPool, CancelledError):
+                        if sharded is not None:
+                            sharded.finished = True
+                        broken.append(path)
+                        continue
+                    if item is not None and not self._put(self._parse_queue, item):
+                        return
+                if broken:
+                    files = self._read_in_process(executor, [*broken, *_unfinished(pending)], files)
+                    pending.clear()
+                    executor = None
+        finally:
+            for future in pending:
+                future.cancel()
+            self._put(self._parse_queue, _DONE)
+
+    def _submit_read(self, executor, path):
+        """
+        Envia la lectura de un archivo: entera en un trabajo o, si es un PDF
+        grande, por rangos de paginas en el mismo grupo de procesos.
+        """
+        try:
+            plan = page_shard_plan(path, self.bank, self.account_type)
+        except Exception:
+            # El trabajo completo reporta el error al leer el archivo.
+            plan = None
+        if plan is None:
+            return {executor.submit(run_traced, trace_state(), _read_for_pipeline, path, self.bank, self.account_type): (path, None, 0)}
+        sharded = _ShardedRead(path, plan)
+        return sharded.submit(executor, range(plan["pages"]), plan["backend"])
+
+    def _shard_done(self, executor, pending, sharded, start, future):
+        """
+        Guarda el texto de un rango. Devuelve el item del archivo cuando ya no
+        faltan rangos, o None mientras falten (o si el archivo ya fallo).
+        """
+        if sharded.finished:
+            return None
+        try:
+            texts, events = future.result()
+        except (BrokenProcessPool, CancelledError):
+            raise
+        except Exception as e:
+            sharded.finished = True
+            return {"path": sharded.path, "content": None, "seconds": 0.0, "error": e}
+        merge_events(events, file=os.path.basename(sharded.path))
+        sharded.texts[start:start + len(texts)] = texts
+        sharded.waiting -= 1
+        if sharded.waiting:
+            return None
+        if sharded.layout_pages is not None:
+            # Segunda pasada, como en extract_text: layout solo en las
+            # paginas de tabla (o en todas si el selector no las encuentra).
+            pages = sharded.layout_pages(sharded.texts)
+            sharded.layout_pages = None
+            pages = range(len(sharded.texts)) if pages is None else pages
+            if pages:
+                pending.update(sharded.submit(executor, pages, DEFAULT_LAYOUT_BACKEND))
+                return None
+        sharded.finished = True
+        content = "\n".join(text for text in sharded.texts if text)
+        return {"path": sharded.path, "content": content, "seconds": time.perf_counter() - sharded.started, "error": None}
+
+    def _read_in_process(self, executor, unfinished, files):
+        """
+        El grupo de procesos se rompio (un trabajador murio o se cerro): se
+        cierra el grupo compartido para que la proxima importacion cree otro,
+        y los archivos sin terminar se leen en este proceso.
+        """
+        if self._executor is None:
+            _shutdown_extraction_pool(executor)
+        return itertools.chain(unfinished, files)
+
+    @staticmethod
+    def _read_item(path, read, *args):
+        try:
+            (content, seconds), events = read(*args)
+        except (BrokenProcessPool, CancelledError):
+            raise
+        except Exception as e:
+            return {"path": path, "content": None, "seconds": 0.0, "error": e}
+        merge_events(events, file=os.path.basename(path))
+        return {"path": path, "content": content, "seconds": seconds, "error": None}
+
+    def _parse_stage(self):
+        while True:
+            item = self._parse_queue.get()
+            if item is _DONE or self._cancelled.is_set():
+                break
+            if item["error"] is None:
+                started = time.perf_counter()
+                try:
+                    with span("statement", file=os.path.basename(item["path"])):
+                        item["raw"] = parse_statement(item["content"], self.bank, self.account_type)
+                except Exception as e:
+                    item["error"] = e
+                item["seconds"] += time.perf_counter() - started
+            item["content"] = None
+            if not self._put(self._tag_queue, item):
+                return
+        self._put(self._tag_queue, _DONE)
+
+    def _tag_stage(self):
+        while True:
+            item = self._tag_queue.get()
+            if item is _DONE or self._cancelled.is_set():
+                break
+            rows = []
+            if item["error"] is None:
+                started = time.perf_counter()
+                try:
+                    with span("statement", file=os.path.basename(item["path"])):
+                        purchases = tag_statement_rows(item.pop("raw"), self.tags, self.matcher)
+                        with span("format_amount", count=len(purchases)):
+                            rows = [
+                                [date, description, format_amount(amount), currency, tag]
+                                for date, description, amount, currency, tag, _limit in purchases
+                            ]
+                except Exception as e:
+                    item["error"] = e
+                item["seconds"] += time.perf_counter() - started
+            result = {"path": item["path"], "rows": rows, "error": item["error"], "seconds": item["seconds"]}
+            if not self._put(self._results, result):
+                return
+        self._put(self._results, _DONE)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import importlib
+import sys
+import time
+
+
+IMPORT_TIMINGS = {}
+
+
+def import_module_timed(name):
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMINGS.setdefault(name, time.perf_counter() - started)
+    return module
+
+
+class LazyModule:
+    """
+    Proxy que importa el modulo real en el primer acceso a un atributo.
+    """
+
+    def __init__(self, name):
+        self.__dict__["_lazy_name"] = name
+
+    def __getattr__(self, attribute):
+        return getattr(import_module_timed(self._lazy_name), attribute)
+
+    def __repr__(self):
+        return f"<lazy module {self._lazy_name!r}>"
+
+
+class LazyAttribute:
+    """
+    Proxy invocable para una clase o funcion de un modulo importado bajo demanda.
+    """
+
+    def __init__(self, module_name, attribute):
+        self._module_name = module_name
+        self._attribute = attribute
+
+    def resolve(self):
+        return getattr(import_module_timed(self._module_name), self._attribute)
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        return f"<lazy attribute {self._module_name}.{self._attribute}>"
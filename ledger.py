@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+import hashlib
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+from money import CENT, parse_amount
+from tag_store import default_tag_file_path
+
+
+LEDGER_FILENAME = "ledger.sqlite3"
+LEDGER_SCHEMA_VERSION = 4
+LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS statements (
+    source_hash TEXT PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    bank TEXT NOT NULL,
+    account_type TEXT NOT NULL,
+    imported_at TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    parser_version INTEGER NOT NULL DEFAULT 0,
+    tags_version TEXT NOT NULL DEFAULT '',
+    extraction_seconds REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS movements (
+    id INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL UNIQUE,
+    date TEXT NOT NULL,
+    description TEXT NOT NULL,
+    amount TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    manual INTEGER NOT NULL DEFAULT 0,
+    bank TEXT NOT NULL,
+    account_type TEXT NOT NULL,
+    source_hash TEXT NOT NULL REFERENCES statements(source_hash)
+);
+CREATE INDEX IF NOT EXISTS idx_movements_source ON movements(source_hash);
+CREATE TABLE IF NOT EXISTS watched_files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    source_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shared_movements (
+    source_hash TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    PRIMARY KEY (source_hash, fingerprint)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_shared_movements_fingerprint ON shared_movements(fingerprint);
+"""
+LEDGER_MIGRATIONS = {
+    2: (
+        "ALTER TABLE statements ADD COLUMN parser_version INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE statements ADD COLUMN tags_version TEXT NOT NULL DEFAULT ''",
+        "ALTER TABLE statements ADD COLUMN extraction_seconds REAL NOT NULL DEFAULT 0",
+    ),
+    3: (
+        "CREATE TABLE IF NOT EXISTS watched_files (path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, "
+        "size INTEGER NOT NULL, source_hash TEXT NOT NULL)",
+    ),
+    4: (
+        "CREATE TABLE IF NOT EXISTS shared_movements (source_hash TEXT NOT NULL, fingerprint TEXT NOT NULL, "
+        "PRIMARY KEY (source_hash, fingerprint)) WITHOUT ROWID",
+        "CREATE INDEX IF NOT EXISTS idx_shared_movements_fingerprint ON shared_movements(fingerprint)",
+    ),
+}
+STATEMENT_FIELDS = (
+    "source_hash",
+    "file_name",
+    "bank",
+    "account_type",
+    "imported_at",
+    "row_count",
+    "parser_version",
+    "tags_version",
+    "extraction_seconds",
+)
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def default_ledger_path():
+    return default_tag_file_path().with_name(LEDGER_FILENAME)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def movement_fingerprint(date, description, amount, currency, bank, account_type, occurrence=0):
+    """
+    Huella determinista de un movimiento normalizado. `occurrence` distingue
+    movimientos identicos dentro del mismo estado de cuenta (dos cafes iguales
+    el mismo dia), de modo que solo se descartan repeticiones entre archivos.
+    """
+    normalized = (
+        str(date).strip(),
+        " ".join(str(description).split()).upper(),
+        str(parse_amount(amount).quantize(CENT)),
+        str(currency).strip().upper(),
+        str(bank),
+        str(account_type),
+        str(occurrence),
+    )
+    return hashlib.sha256("\x1f".join(normalized).encode("utf-8")).hexdigest()
+
+
+class PurchaseLedger:
+    """
+    Libro local de movimientos importados en SQLite. Registra cada estado de
+    cuenta por el hash de su contenido y guarda cada movimiento una sola vez
+    segun su huella, con el primer estado de cuenta que lo trajo;
+    `shared_movements` anota los otros que tambien lo traen.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._conn = None
+
+    def has_statement(self, source_hash):
+        return self.statement(source_hash) is not None
+
+    def statement(self, source_hash):
+        """
+        Devuelve el registro de un estado de cuenta importado como diccionario
+        con los campos de STATEMENT_FIELDS, o None si no se conoce.
+        """
+        row = self._connection().execute(
+            f"SELECT {', '.join(STATEMENT_FIELDS)} FROM statements WHERE source_hash = ?",
+            (source_hash,),
+        ).fetchone()
+        return None if row is None else dict(zip(STATEMENT_FIELDS, row))
+
+    def current_statement(self, source_hash, bank, account_type, parser_version):
+        """
+        Devuelve el registro si el archivo puede servirse sin volver a
+        extraerlo: mismo banco, mismo tipo de cuenta y mismo parser.
+        """
+        statement = self.statement(source_hash)
+        if (
+            statement is None
+            or statement["bank"] != bank
+            or statement["account_type"] != account_type
+            or statement["parser_version"] != parser_version
+        ):
+            return None
+        return statement
+
+    def record_statement(
+        self,
+        source_hash,
+        file_name,
+        bank,
+        account_type,
+        rows,
+        parser_version=0,
+        tags_version="",
+        extraction_seconds=0.0,
+    ):
+        """
+        Guarda un estado de cuenta y sus filas [fecha, descripcion, monto,
+        moneda, etiqueta, ...]. Devuelve {"inserted": n, "duplicates": n,
+        "new_rows": [(huella, fila)]} con las filas que no estaban en el libro.
+
+        Si el archivo ya estaba registrado (por ejemplo, con otro parser), su
+        registro se actualiza y se eliminan los movimientos suyos que la nueva
+        extraccion ya no produce, salvo los etiquetados a mano.
+        """
+        conn = self._connection()
+        occurrences = {}
+        fingerprints = []
+        new_rows = []
+        shared = []
+        with conn:
+            conn.execute(
+                "INSERT INTO statements (source_hash, file_name, bank, account_type, imported_at, row_count, "
+                "parser_version, tags_version, extraction_seconds) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(source_hash) DO UPDATE SET file_name = excluded.file_name, bank = excluded.bank, "
+                "account_type = excluded.account_type, imported_at = excluded.imported_at, "
+                "row_count = excluded.row_count, parser_version = excluded.parser_version, "
+                "tags_version = excluded.tags_version, extraction_seconds = excluded.extraction_seconds",
+                (
+                    source_hash,
+                    file_name,
+                    bank,
+                    account_type,
+                    datetime.now().isoformat(timespec="seconds"),
+                    len(rows),
+                    parser_version,
+                    tags_version,
+                    extraction_seconds,
+                ),
+            )
+            for row in rows:
+                date, description, amount, currency, tag = row[:5]
+                base = movement_fingerprint(date, description, amount, currency, bank, account_type)
+                occurrence = occurrences.get(base, 0)
+                occurrences[base] = occurrence + 1
+                fingerprint = movement_fingerprint(date, description, amount, currency, bank, account_type, occurrence)
+                fingerprints.append(fingerprint)
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO movements (fingerprint, date, description, amount, currency, tag, "
+                    "bank, account_type, source_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (fingerprint, date, description, amount, currency, tag, bank, account_type, source_hash),
+                )
+                if cursor.rowcount:
+                    new_rows.append((fingerprint, row))
+                else:
+                    shared.append((source_hash, fingerprint))
+            conn.executemany("INSERT OR IGNORE INTO shared_movements (source_hash, fingerprint) VALUES (?, ?)", shared)
+            conn.execute(
+                "DELETE FROM shared_movements WHERE source_hash = ? AND fingerprint IN "
+                "(SELECT fingerprint FROM movements WHERE source_hash = ?)",
+                (source_hash, source_hash),
+            )
+            current = set(fingerprints)
+            conn.executemany(
+                "DELETE FROM shared_movements WHERE source_hash = ? AND fingerprint = ?",
+                [
+                    (source_hash, fingerprint)
+                    for (fingerprint,) in conn.execute(
+                        "SELECT fingerprint FROM shared_movements WHERE source_hash = ?", (source_hash,)
+                    ).fetchall()
+                    if fingerprint not in current
+                ],
+            )
+            stale = [
+                fingerprint
+                for (fingerprint,) in conn.execute(
+                    "SELECT fingerprint FROM movements WHERE source_hash = ? AND manual = 0",
+                    (source_hash,),
+                ).fetchall()
+                if fingerprint not in current
+            ]
+            self._release_movements(conn, source_hash, stale)
+        return {"inserted": len(new_rows), "duplicates": len(rows) - len(new_rows), "new_rows": new_rows}
+
+    def remove_statement(self, source_hash):
+        """
+        Quita del libro un estado de cuenta y sus movimientos, tambien los
+        etiquetados a mano. Los que otro estado de cuenta registrado tambien
+        trae pasan a ese (con su etiqueta) en lugar de borrarse. Devuelve
+        cuantos movimientos se borraron.
+        """
+        with self._connection() as conn:
+            conn.execute("DELETE FROM shared_movements WHERE source_hash = ?", (source_hash,))
+            owned = [
+                fingerprint
+                for (fingerprint,) in conn.execute(
+                    "SELECT fingerprint FROM movements WHERE source_hash = ?", (source_hash,)
+                ).fetchall()
+            ]
+            removed = self._release_movements(conn, source_hash, owned)
+            conn.execute("DELETE FROM statements WHERE source_hash = ?", (source_hash,))
+        return removed
+
+    def set_tags_version(self, source_hash, tags_version):
+        with self._connection() as conn:
+            conn.execute("UPDATE statements SET tags_version = ? WHERE source_hash = ?", (tags_version, source_hash))
+
+    def watched_files(self):
+        """
+        Devuelve {ruta: (mtime_ns, tamano)} de los archivos ya procesados por
+        la vigilancia de carpeta.
+        """
+        return {
+            path: (mtime_ns, size)
+            for path, mtime_ns, size in self._connection().execute("SELECT path, mtime_ns, size FROM watched_files")
+        }
+
+    def mark_watched(self, path, mtime_ns, size, source_hash):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO watched_files (path, mtime_ns, size, source_hash) VALUES (?, ?, ?, ?)",
+                (str(path), mtime_ns, size, source_hash),
+            )
+
+    def movements(self):
+        """
+        Devuelve (huella, fecha, descripcion, monto, moneda, etiqueta, manual)
+        en orden de importacion.
+        """
+        return [
+            (fingerprint, date, description, amount, currency, tag, bool(manual))
+            for fingerprint, date, description, amount, currency, tag, manual in self._connection().execute(
+                "SELECT fingerprint, date, description, amount, currency, tag, manual FROM movements ORDER BY id"
+            )
+        ]
+
+    def change_marker(self):
+        """
+        Cambia con cada escritura del libro: cantidad de movimientos, ultimo
+        id y tamano y fecha de modificacion del archivo. Sirve para saber si
+        una copia de sus filas sigue vigente.
+        """
+        count, last_id = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM movements"
+        ).fetchone()
+        stat = self.path.stat()
+        return [count, last_id, stat.st_size, stat.st_mtime_ns]
+
+    def set_manual_tag(self, fingerprint, tag):
+        self.set_manual_tags([fingerprint], tag)
+
+    def set_manual_tags(self, fingerprints, tag):
+        """
+        Etiqueta a mano varios movimientos en una sola transaccion, para las
+        asignaciones en bloque.
+        """
+        with self._connection() as conn:
+            conn.executemany(
+                "UPDATE movements SET tag = ?, manual = 1 WHERE fingerprint = ?",
+                [(tag, fingerprint) for fingerprint in fingerprints],
+            )
+
+    def rename_manual_tag(self, old_tag, new_tag):
+        """
+        Cambia `old_tag` por `new_tag` en los movimientos etiquetados a mano,
+        al renombrar o eliminar una etiqueta. Los demas se vuelven a etiquetar
+        al leer el historial. Devuelve cuantos movimientos cambiaron.
+        """
+        with self._connection() as conn:
+            return conn.execute(
+                "UPDATE movements SET tag = ? WHERE manual = 1 AND tag = ?",
+                (new_tag, old_tag),
+            ).rowcount
+
+    @staticmethod
+    def _release_movements(conn, source_hash, fingerprints):
+        """
+        Los movimientos `fingerprints` dejan de pertenecer a `source_hash`:
+        pasan a otro estado de cuenta que tambien los trae o se borran.
+        Devuelve cuantos se borraron.
+        """
+        removed = 0
+        for fingerprint in fingerprints:
+            other = conn.execute(
+                "SELECT source_hash FROM shared_movements WHERE fingerprint = ? AND source_hash != ? LIMIT 1",
+                (fingerprint, source_hash),
+            ).fetchone()
+            if other is None:
+                conn.execute("DELETE FROM movements WHERE fingerprint = ?", (fingerprint,))
+                removed += 1
+            else:
+                conn.execute("UPDATE movements SET source_hash = ? WHERE fingerprint = ?", (other[0], fingerprint))
+                conn.execute("DELETE FROM shared_movements WHERE source_hash = ? AND fingerprint = ?", (other[0], fingerprint))
+        return removed
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path))
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < LEDGER_SCHEMA_VERSION:
+                with conn:
+                    if version == 0:
+                        conn.executescript(LEDGER_SCHEMA)
+                    else:
+                        for target in range(version + 1, LEDGER_SCHEMA_VERSION + 1):
+                            for statement in LEDGER_MIGRATIONS[target]:
+                                conn.execute(statement)
+                    conn.execute(f"PRAGMA user_version = {LEDGER_SCHEMA_VERSION}")
+            self._conn = conn
+        return self._conn
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+import os
+import sys
+import tracemalloc
+
+
+MEMORY_REPORT_FLAG = "--memory-report"
+MEMORY_TRACE_FRAMES = 25
+MEMORY_REPORT_LIMIT = 8
+MB = 1024 * 1024
+# Presupuesto de memoria por cada 100 000 filas: pico durante la operacion y
+# lo que queda retenido al terminar. Los revisa test_purchase_tagger_app. La
+# carga incluye el pipeline de importacion, la escritura en el libro y la
+# huella de cada fila.
+MEMORY_BUDGET_ROWS = 100_000
+MEMORY_BUDGETS = {
+    "load": {"peak": 80 * MB, "retained": 52 * MB},
+    "apply_filter": {"peak": 16 * MB, "retained": 12 * MB},
+    "draw_summary": {"peak": 6 * MB, "retained": 2 * MB},
+}
+# Subsistema al que se cargan las asignaciones: se recorre la pila desde el
+# marco mas interno y gana el primero cuyo archivo coincide.
+MEMORY_SUBSYSTEMS = (
+    ("Extracción PDF", ("pypdf", "pdfplumber", "pdfminer", "fitz", "purchase_extractor.py", "pdf_backends.py", "import_pipeline.py")),
+    ("Historial", ("ledger.py", "sqlite3")),
+    ("Gráficos", ("matplotlib", "PIL", "numpy")),
+    ("Resumen", ("summary.py",)),
+    ("Etiquetas", ("tag_rules.py", "tag_store.py", "sqlite_tag_store.py", "retag_engine.py")),
+    ("Filtros y orden", ("ui_state.py",)),
+    ("Montos", ("money.py",)),
+    ("Interfaz", ("tkinter", "customtkinter", f"views{os.sep}")),
+    ("Filas de la app", ("purchase_tagger_app.py",)),
+)
+OTHER_SUBSYSTEM = "Otros"
+# tracemalloc solo ve este proceso: lo que pypdf asigna en el grupo de
+# procesos de extraccion no aparece en el reporte ni en los presupuestos.
+PROCESS_POOL_NOTE = (
+    "  Nota: el texto de los PDF se extrae en procesos aparte; \"Extracción PDF\" "
+    "solo cuenta el texto recibido, su interpretación y las lecturas hechas en este proceso."
+)
+
+
+def start_memory_tracking(frames=MEMORY_TRACE_FRAMES):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def subsystem_for(traceback):
+    for frame in reversed(traceback):
+        filename = frame.filename
+        for subsystem, fragments in MEMORY_SUBSYSTEMS:
+            if any(fragment in filename for fragment in fragments):
+                return subsystem
+    return OTHER_SUBSYSTEM
+
+
+def memory_by_subsystem(snapshot):
+    """
+    Suma los bytes vivos de una captura de tracemalloc por subsistema.
+    Devuelve [(subsistema, bytes, bloques)] de mayor a menor.
+    """
+    totals = {}
+    for trace in snapshot.traces:
+        subsystem = subsystem_for(trace.traceback)
+        size, count = totals.get(subsystem, (0, 0))
+        totals[subsystem] = (size + trace.size, count + 1)
+    return sorted(
+        ((subsystem, size, count) for subsystem, (size, count) in totals.items()),
+        key=lambda item: (-item[1], item[0]),
+    )
+
+
+class MemoryProbe:
+    """
+    Mide con tracemalloc el pico y lo retenido por un bloque de codigo,
+    relativos a la memoria viva al entrar. Si tracemalloc no estaba activo,
+    lo enciende solo durante el bloque.
+    """
+
+    def __init__(self, frames=1):
+        self.frames = frames
+        self.peak = 0
+        self.retained = 0
+
+    def __enter__(self):
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start(self.frames)
+        tracemalloc.reset_peak()
+        self.baseline = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak = max(0, peak - self.baseline)
+        self.retained = max(0, current - self.baseline)
+        if self.started_tracing:
+            tracemalloc.stop()
+        return False
+
+    def per_rows(self, rows, budget_rows=MEMORY_BUDGET_ROWS):
+        """
+        Pico y retenido escalados a `budget_rows` filas.
+        """
+        scale = budget_rows / rows if rows else 0
+        return {"peak": self.peak * scale, "retained": self.retained * scale}
+
+
+def budget_overruns(operation, measured):
+    """
+    Compara una medicion de `MemoryProbe.per_rows` con MEMORY_BUDGETS y
+    devuelve los limites excedidos como textos.
+    """
+    budget = MEMORY_BUDGETS[operation]
+    return [
+        f"{operation} {kind}: {measured[kind] / MB:.1f} MB > {budget[kind] / MB:.0f} MB por {MEMORY_BUDGET_ROWS} filas"
+        for kind in ("peak", "retained")
+        if measured[kind] > budget[kind]
+    ]
+
+
+def collect_memory_report(app):
+    """
+    Captura la memoria viva por subsistema y cuenta las estructuras que la
+    app mantiene: filas, filas filtradas, items de la tabla y figuras.
+    """
+    if not tracemalloc.is_tracing():
+        return None
+    current, peak = tracemalloc.get_traced_memory()
+    state = app.__dict__
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    return {
+        "current": current,
+        "peak": peak,
+        "subsystems": memory_by_subsystem(tracemalloc.take_snapshot()),
+        "structures": {
+            "all_rows": len(state.get("all_rows") or ()),
+            "filtered_rows": len(state.get("filtered_rows") or ()),
+            "tree_item_rows": len(state.get("tree_item_rows") or ()),
+            "figures": len(pyplot.get_fignums()) if pyplot is not None else 0,
+        },
+    }
+
+
+def format_memory_report(report, limit=MEMORY_REPORT_LIMIT):
+    if report is None:
+        return "Reporte de memoria: tracemalloc no esta activo"
+    structures = report["structures"]
+    lines = [
+        "Reporte de memoria",
+        f"  En uso: {report['current'] / MB:.1f} MB (pico {report['peak'] / MB:.1f} MB)",
+        f"  Filas: {structures['all_rows']}, filtradas: {structures['filtered_rows']}, "
+        f"en la tabla: {structures['tree_item_rows']}, figuras abiertas: {structures['figures']}",
+        "  Por subsistema:",
+    ]
+    for subsystem, size, count in report["subsystems"][:limit]:
+        lines.append(f"    {subsystem:<18} {size / MB:8.2f} MB  {count:>8} bloques")
+    lines.append(PROCESS_POOL_NOTE)
+    return "\n".join(lines)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+from abc import ABC, abstractmethod
+import importlib.util
+import json
+import os
+import threading
+
+from tag_store import default_tag_file_path
+
+
+BACKEND_CHOICES_FILENAME = "pdf_backends.json"
+DEFAULT_TEXT_BACKEND = "pypdf"
+DEFAULT_LAYOUT_BACKEND = "pypdf_layout"
+# No es un backend propio: texto plano de pypdf y layout solo en las paginas
+# que elige el parser (ver purchase_extractor.LAYOUT_PAGE_SELECTORS).
+TARGETED_LAYOUT_BACKEND = "pypdf_targeted"
+
+
+class PdfTextBackend(ABC):
+    """
+    Extractor de texto de PDF. Cada backend abre el documento, informa cuantas
+    paginas tiene y devuelve el texto de una pagina. `module` es la dependencia
+    opcional que necesita; si no esta instalada el backend no esta disponible.
+    """
+
+    name = ""
+    module = ""
+    span_name = ""
+
+    def available(self):
+        return importlib.util.find_spec(self.module) is not None
+
+    @abstractmethod
+    def open(self, pdf_path):
+        """
+        Abre el PDF y devuelve el documento que reciben los demas metodos.
+        """
+
+    def page_count(self, document):
+        return len(document.pages)
+
+    @abstractmethod
+    def page_text(self, document, index):
+        """
+        Texto de la pagina `index` (desde 0) del documento abierto.
+        """
+
+    def close(self, document):
+        pass
+
+
+class PypdfBackend(PdfTextBackend):
+    module = "pypdf"
+
+    def __init__(self, name, layout):
+        self.name = name
+        self.layout = layout
+        self.span_name = "pdf_text_layout" if layout else "pdf_text"
+
+    def open(self, pdf_path):
+        from pypdf import PdfReader
+
+        return PdfReader(pdf_path)
+
+    def page_text(self, document, index):
+        page = document.pages[index]
+        if self.layout:
+            return page.extract_text(extraction_mode="layout")
+        return page.extract_text()
+
+
+class PyMuPDFBackend(PdfTextBackend):
+    name = "pymupdf"
+    module = "fitz"
+    span_name = "pdf_text_pymupdf"
+
+    def open(self, pdf_path):
+        import fitz
+
+        return fitz.open(os.fspath(pdf_path))
+
+    def page_count(self, document):
+        return document.page_count
+
+    def page_text(self, document, index):
+        return document[index].get_text("text", sort=True)
+
+    def close(self, document):
+        document.close()
+
+
+class PdfplumberBackend(PdfTextBackend):
+    name = "pdfplumber"
+    module = "pdfplumber"
+    span_name = "pdf_text_pdfplumber"
+
+    def open(self, pdf_path):
+        import pdfplumber
+
+        return pdfplumber.open(pdf_path)
+
+    def page_text(self, document, index):
+        return document.pages[index].extract_text(layout=True) or ""
+
+    def close(self, document):
+        document.close()
+
+
+PDF_TEXT_BACKENDS = {
+    backend.name: backend
+    for backend in (
+        PypdfBackend(DEFAULT_TEXT_BACKEND, layout=False),
+        PypdfBackend(DEFAULT_LAYOUT_BACKEND, layout=True),
+        PyMuPDFBackend(),
+        PdfplumberBackend(),
+    )
+}
+
+
+def text_backend(name):
+    backend = PDF_TEXT_BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"Unknown PDF text backend: {name}")
+    if not backend.available():
+        raise ValueError(f"PDF text backend {name} needs the {backend.module} package")
+    return backend
+
+
+def available_text_backends():
+    return [name for name, backend in PDF_TEXT_BACKENDS.items() if backend.available()]
+
+
+def default_backend_choices_path():
+    return default_tag_file_path().with_name(BACKEND_CHOICES_FILENAME)
+
+
+_CHOICES_CACHE = {}
+_CHOICES_LOCK = threading.Lock()
+
+
+def load_backend_choices(path=None):
+    """
+    Devuelve {(banco, tipo de cuenta): backend} elegidos por la calibracion.
+    Si el archivo no existe o no se puede leer, no hay eleccion.
+    """
+    path = os.fspath(path or default_backend_choices_path())
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+    with _CHOICES_LOCK:
+        cached = _CHOICES_CACHE.get(path)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        choices = {
+            tuple(key.split("/", 1)): entry["backend"]
+            for key, entry in data.items()
+            if entry.get("backend") in PDF_TEXT_BACKENDS or entry.get("backend") == TARGETED_LAYOUT_BACKEND
+        }
+    except (OSError, ValueError, AttributeError, TypeError, KeyError):
+        choices = {}
+    with _CHOICES_LOCK:
+        _CHOICES_CACHE[path] = (mtime_ns, choices)
+    return choices
+
+
+def save_backend_choices(calibration, path=None):
+    """
+    Guarda el resultado de `calibrate_text_backends`: por banco y tipo de
+    cuenta, el backend elegido y las mediciones de cada backend.
+    """
+    path = os.fspath(path or default_backend_choices_path())
+    data = {
+        f"{bank}/{account_type}": entry
+        for (bank, account_type), entry in sorted(calibration.items())
+    }
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+    with _CHOICES_LOCK:
+        _CHOICES_CACHE.pop(path, None)
+
+
+def chosen_backend(bank, account_type, path=None):
+    """
+    Backend calibrado para el banco y tipo de cuenta, o None si no hay uno
+    elegido o ya no esta instalado.
+    """
+    name = load_backend_choices(path).get((bank, account_type))
+    if name is None or name == TARGETED_LAYOUT_BACKEND:
+        return name
+    if not PDF_TEXT_BACKENDS[name].available():
+        return None
+    return name
@@ -1,11 +1,29 @@
 #!/usr/bin/env python3
+import atexit
+from collections import Counter
 from datetime import datetime
 from decimal import Decimal
 from html.parser import HTMLParser
+import math
+import os
 import re
+import sys
+import tempfile
+import threading
+import time
 import unicodedata
-from pypdf import PdfReader
-from tag_store import load_tags, tag_purchase
+from pdf_backends import (
+    DEFAULT_LAYOUT_BACKEND,
+    DEFAULT_TEXT_BACKEND,
+    TARGETED_LAYOUT_BACKEND,
+    available_text_backends,
+    chosen_backend,
+    save_backend_choices,
+    text_backend,
+)
+from tag_rules import compile_tag_rules
+from tag_store import load_tags
+from tracing import merge_events, run_traced, span, trace_state
 
 MONTH_NUMBERS = {
     "ENE": 1,
@@ -48,6 +66,14 @@ SUPPORTED_ACCOUNT_TYPES_BY_BANK = {
     BANK_PROMERICA: (ACCOUNT_TYPE_CREDIT,),
     BANK_BCR: (ACCOUNT_TYPE_DEBIT,),
 }
+# Un PDF con al menos PAGE_SHARD_THRESHOLD paginas se reparte en rangos de
+# paginas entre procesos; cada rango tiene al menos PAGE_SHARD_MIN_PAGES.
+PAGE_SHARD_THRESHOLD = 24
+PAGE_SHARD_MIN_PAGES = 8
+PAGE_SHARD_MAX_WORKERS = 4
+# Subir al cambiar como se leen los estados de cuenta, para que los archivos
+# ya registrados se vuelvan a procesar.
+PARSER_VERSION = 1
 TRANSACTION_START_RE = re.compile(
     rf"^(?:\d+\s+)?\d{{1,2}}-(?:{MONTH_RE})-\d{{2}}\b",
     re.IGNORECASE,
@@ -120,20 +146,175 @@ def normalize_numeric_date(day, month, year):
     return f"{date.day:02d}-{MONTH_NAMES[date.month]}-{date.year % 100:02d}"
 
 
-def extract_text(pdf_path, layout=False):
+def extract_text(pdf_path, layout=False, workers=None, backend=None, layout_pages=None):
     """
-    Extrae todo el texto de un PDF.
+    Extrae todo el texto de un PDF con el backend indicado (ver
+    `pdf_backends.PDF_TEXT_BACKENDS`); sin backend se usa pypdf, con o sin
+    `layout`. Los PDF grandes se reparten por rangos de paginas entre procesos
+    (ver `page_shard_workers`) y el texto se une en el orden de las paginas.
+    `workers=1` fuerza la extraccion secuencial.
+
+    Con `layout_pages` la extraccion se hace en dos pasadas: texto plano de
+    todas las paginas y layout solo en los indices que devuelve
+    `layout_pages(textos planos)`; si devuelve None, layout en todas.
     """
-    reader = PdfReader(pdf_path)
-    texts = []
-    for page in reader.pages:
-        if layout:
-            text = page.extract_text(extraction_mode="layout")
-        else:
-            text = page.extract_text()
-        if text:
-            texts.append(text)
-    return "\n".join(texts)
+    if layout_pages is not None:
+        texts = _targeted_layout_texts(pdf_path, layout_pages, workers)
+    else:
+        texts = _page_texts(pdf_path, backend or (DEFAULT_LAYOUT_BACKEND if layout else DEFAULT_TEXT_BACKEND), workers)
+    return "\n".join(text for text in texts if text)
+
+
+def _page_texts(pdf_path, backend_name, workers=None, pages=None):
+    """
+    Texto de cada pagina, o solo de los indices `pages` (en ese orden y sin
+    repartir entre procesos).
+    """
+    backend = text_backend(backend_name)
+    with span("pdf_open"):
+        document = backend.open(pdf_path)
+    try:
+        if pages is None:
+            pages = range(backend.page_count(document))
+            if workers is None:
+                workers = page_shard_workers(len(pages))
+            if workers > 1:
+                with span("pdf_text_sharded", count=len(pages)):
+                    texts = _extract_sharded_text(pdf_path, len(pages), backend.name, workers)
+                if texts is not None:
+                    return texts
+        with span(backend.span_name) as stage:
+            texts = []
+            for index in pages:
+                texts.append(backend.page_text(document, index))
+                stage.add(1)
+        return texts
+    finally:
+        backend.close(document)
+
+
+def _targeted_layout_texts(pdf_path, layout_pages, workers):
+    texts = _page_texts(pdf_path, DEFAULT_TEXT_BACKEND, workers)
+    pages = layout_pages(texts)
+    if pages is None:
+        return _page_texts(pdf_path, DEFAULT_LAYOUT_BACKEND, workers)
+    pages = sorted(pages)
+    if pages:
+        for index, text in zip(pages, _page_texts(pdf_path, DEFAULT_LAYOUT_BACKEND, pages=pages)):
+            texts[index] = text
+    return texts
+
+
+def section_pages(page_texts, start_markers, end_markers):
+    """
+    Indices de las paginas desde la primera que contiene todos los
+    `start_markers` hasta la primera siguiente que contiene alguno de los
+    `end_markers` (o la ultima). None si ninguna pagina tiene el inicio.
+    """
+    start = end = None
+    for index, text in enumerate(page_texts):
+        folded = (text or "").casefold()
+        if start is None and all(marker.casefold() in folded for marker in start_markers):
+            start = index
+        if start is not None and any(marker.casefold() in folded for marker in end_markers):
+            end = index
+            break
+    if start is None:
+        return None
+    return set(range(start, len(page_texts) if end is None else end + 1))
+
+
+def page_shard_workers(page_count, cpu_count=None):
+    """
+    Cantidad de procesos para extraer un PDF de `page_count` paginas: 1 por
+    debajo del umbral, y luego uno por cada PAGE_SHARD_MIN_PAGES paginas,
+    limitado por los nucleos disponibles y PAGE_SHARD_MAX_WORKERS.
+    """
+    if page_count < PAGE_SHARD_THRESHOLD:
+        return 1
+    cpu_count = os.cpu_count() if cpu_count is None else cpu_count
+    return max(1, min(cpu_count or 1, PAGE_SHARD_MAX_WORKERS, page_count // PAGE_SHARD_MIN_PAGES))
+
+
+def page_shards(page_count, shard_count):
+    """
+    Divide [0, page_count) en `shard_count` rangos contiguos de tamano parejo.
+    """
+    size = math.ceil(page_count / shard_count)
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def extract_page_range(pdf_path, start, stop, backend_name):
+    """
+    Trabajo de un proceso: abre su propia copia del documento y extrae las
+    paginas [start, stop).
+    """
+    backend = text_backend(backend_name)
+    with span("pdf_open"):
+        document = backend.open(pdf_path)
+    try:
+        with span(backend.span_name, count=stop - start):
+            return [backend.page_text(document, index) for index in range(start, stop)]
+    finally:
+        backend.close(document)
+
+
+_EXTRACTION_POOL = None
+_EXTRACTION_POOL_LOCK = threading.Lock()
+
+
+def extraction_pool():
+    """
+    Grupo de procesos compartido para extraer texto de PDF, creado al primer
+    uso y cerrado al salir.
+    """
+    global _EXTRACTION_POOL
+    from concurrent.futures import ProcessPoolExecutor
+
+    with _EXTRACTION_POOL_LOCK:
+        if _EXTRACTION_POOL is None:
+            _EXTRACTION_POOL = ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, PAGE_SHARD_MAX_WORKERS) or 1)
+            atexit.register(_shutdown_extraction_pool)
+        return _EXTRACTION_POOL
+
+
+def _shutdown_extraction_pool(broken=None):
+    """
+    Cierra el grupo compartido; con `broken`, solo si sigue siendo ese grupo
+    (otro hilo puede haberlo reemplazado ya).
+    """
+    global _EXTRACTION_POOL
+    with _EXTRACTION_POOL_LOCK:
+        if broken is not None and _EXTRACTION_POOL is not broken:
+            return
+        pool, _EXTRACTION_POOL = _EXTRACTION_POOL, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _extract_sharded_text(pdf_path, page_count, backend_name, workers):
+    """
+    Devuelve el texto de cada pagina en orden, o None si el grupo de procesos
+    no esta disponible (la extraccion sigue entonces en este proceso).
+    """
+    from concurrent.futures.process import BrokenProcessPool
+
+    try:
+        pool = extraction_pool()
+        state = trace_state()
+        futures = [
+            pool.submit(run_traced, state, extract_page_range, os.fspath(pdf_path), start, stop, backend_name)
+            for start, stop in page_shards(page_count, workers)
+        ]
+        texts = []
+        for future in futures:
+            page_texts, events = future.result()
+            merge_events(events)
+            texts.extend(page_texts)
+        return texts
+    except (BrokenProcessPool, OSError):
+        _shutdown_extraction_pool()
+        return None
 
 
 def _line_has_marker(line, markers):
@@ -318,6 +499,14 @@ def extract_bac_credit_movements(full_text):
     return movements
 
 
+def bac_credit_layout_pages(page_texts):
+    """
+    Solo la tabla de pagos depende de columnas (`_bac_credit_payment_columns`);
+    las compras se leen igual del texto plano.
+    """
+    return section_pages(page_texts, ("detalle de pago del periodo",), ("detalle de compras del periodo",))
+
+
 def _bac_debit_currency(full_text):
     m = re.search(r"\bMoneda:\s*([A-ZÁÉÍÓÚ]+)", full_text, re.IGNORECASE)
     if not m:
@@ -414,6 +603,14 @@ def extract_bac_debit_movements(full_text):
     return movements
 
 
+def bac_debit_layout_pages(page_texts):
+    """
+    Paginas de la tabla de movimientos, cuyo signo sale de la columna
+    DÉBITOS o CRÉDITOS en que cae el monto.
+    """
+    return section_pages(page_texts, ("NO. REFERENCIA", "DÉBITOS", "CRÉDITOS"), ("ÚLTIMA LÍNEA",))
+
+
 class _BCRMovementsHTMLParser(HTMLParser):
     def __init__(self):
         super().__init__()
@@ -722,12 +919,18 @@ PARSER_REGISTRY = {
     (BANK_PROMERICA, ACCOUNT_TYPE_CREDIT): (extract_promerica_credit_movements, SOURCE_PDF_TEXT, True),
     (BANK_BCR, ACCOUNT_TYPE_DEBIT): (extract_bcr_debit_movements_from_file, SOURCE_FILE, None),
 }
+# Parsers que solo necesitan layout en algunas paginas: extract_text saca el
+# texto plano de todo el PDF y layout solo en las paginas que elige la funcion.
+LAYOUT_PAGE_SELECTORS = {
+    (BANK_BAC, ACCOUNT_TYPE_CREDIT): bac_credit_layout_pages,
+    (BANK_BAC, ACCOUNT_TYPE_DEBIT): bac_debit_layout_pages,
+}
 
 
-def process_purchases(file_path, bank=BANK_BAC, account_type=ACCOUNT_TYPE_CREDIT):
+def statement_parser(bank, account_type):
     """
-    Procesa un estado de cuenta y devuelve lista de tuplas:
-    (date, description, amount, currency, tag, limit)
+    Devuelve (parser, fuente, layout) de PARSER_REGISTRY para el banco y tipo
+    de cuenta, o ValueError si la combinacion no esta soportada.
     """
     parser_config = PARSER_REGISTRY.get((bank, account_type))
     if parser_config is None:
@@ -736,17 +939,284 @@ def process_purchases(file_path, bank=BANK_BAC, account_type=ACCOUNT_TYPE_CREDIT
         if account_type not in SUPPORTED_ACCOUNT_TYPES:
             raise ValueError(f"Unsupported account type: {account_type}")
         raise ValueError(f"Unsupported bank/account type: {bank} {account_type}")
+    return parser_config
+
+
+def read_statement(file_path, bank=BANK_BAC, account_type=ACCOUNT_TYPE_CREDIT, page_workers=None):
+    """
+    Primera etapa de la importacion: lee el archivo. Devuelve el texto del PDF,
+    o directamente las filas (fecha, descripcion, monto, moneda) cuando el
+    parser lee el archivo por su cuenta (BCR). El texto sale del backend que
+    eligio `calibrate_text_backends` para el banco, si hay uno; si no, los
+    parsers de LAYOUT_PAGE_SELECTORS usan layout solo en sus paginas de tabla.
+    """
+    parser, source, layout = statement_parser(bank, account_type)
+    if source == SOURCE_FILE:
+        with span("parse") as stage:
+            raw = parser(file_path)
+            stage.add(len(raw))
+        return raw
+    options = _text_options(bank, account_type)
+    if page_workers is not None:
+        options["workers"] = page_workers
+    return extract_text(file_path, layout=layout, **options)
 
-    parser, source, layout = parser_config
+
+def _text_options(bank, account_type):
+    """
+    Opciones de `extract_text` para el banco: el backend calibrado o, si no
+    hay, el selector de paginas layout del parser.
+    """
+    backend = chosen_backend(bank, account_type)
+    selector = LAYOUT_PAGE_SELECTORS.get((bank, account_type))
+    if selector is not None and backend in (None, TARGETED_LAYOUT_BACKEND):
+        return {"layout_pages": selector}
+    if backend not in (None, TARGETED_LAYOUT_BACKEND):
+        return {"backend": backend}
+    return {}
+
+
+def page_shard_plan(file_path, bank=BANK_BAC, account_type=ACCOUNT_TYPE_CREDIT):
+    """
+    Para repartir un PDF grande desde quien arma los trabajos del grupo de
+    procesos (`import_pipeline`): None si el archivo se lee entero en un solo
+    trabajo (parser que lee el archivo o menos de PAGE_SHARD_THRESHOLD
+    paginas); si no, {"pages", "backend", "layout_pages"} para extraer los
+    rangos con `extract_page_range` como lo haria `read_statement`.
+    """
+    _parser, source, layout = statement_parser(bank, account_type)
     if source == SOURCE_FILE:
-        raw = parser(file_path)
+        return None
+    options = _text_options(bank, account_type)
+    if "layout_pages" in options:
+        backend_name = DEFAULT_TEXT_BACKEND
     else:
-        full_text = extract_text(file_path, layout=layout)
-        raw = parser(full_text)
-    tags = load_tags()
+        backend_name = options.get("backend") or (DEFAULT_LAYOUT_BACKEND if layout else DEFAULT_TEXT_BACKEND)
+    backend = text_backend(backend_name)
+    with span("pdf_open"):
+        document = backend.open(file_path)
+    try:
+        page_count = backend.page_count(document)
+    finally:
+        backend.close(document)
+    if page_shard_workers(page_count) <= 1:
+        return None
+    return {"pages": page_count, "backend": backend_name, "layout_pages": options.get("layout_pages")}
+
+
+def page_ranges(pages):
+    """
+    Rangos [inicio, fin) para extraer los indices `pages` entre procesos: cada
+    tramo contiguo se divide como `page_shards` divide un PDF entero.
+    """
+    runs = []
+    for index in sorted(pages):
+        if runs and runs[-1][1] == index:
+            runs[-1][1] = index + 1
+        else:
+            runs.append([index, index + 1])
+    ranges = []
+    for start, stop in runs:
+        count = stop - start
+        ranges.extend((start + first, start + last) for first, last in page_shards(count, page_shard_workers(count)))
+    return ranges
+
+
+def parse_statement(content, bank=BANK_BAC, account_type=ACCOUNT_TYPE_CREDIT):
+    """
+    Segunda etapa: interpreta el texto que devolvio `read_statement`. Si ya
+    son filas, las devuelve tal cual.
+    """
+    if not isinstance(content, str):
+        return content
+    parser, _source, _layout = statement_parser(bank, account_type)
+    with span("parse") as stage:
+        raw = parser(content)
+        stage.add(len(raw))
+    return raw
+
+
+def tag_statement_rows(raw, tags, matcher):
+    """
+    Tercera etapa: etiqueta las filas interpretadas. Devuelve tuplas
+    (date, description, amount, currency, tag, limit).
+    """
     purchases = []
-    for date, desc, amt, cur in raw:
-        tag = tag_purchase(desc, tags)
-        limit = tags.get(tag, {}).get("limit", 0)
-        purchases.append((date, desc, amt, cur, tag, limit))
+    with span("tag_purchase", count=len(raw)):
+        for date, desc, amt, cur in raw:
+            tag = matcher.match(desc, amt, cur)
+            limit = tags.get(tag, {}).get("limit", 0)
+            purchases.append((date, desc, amt, cur, tag, limit))
     return purchases
+
+
+def process_purchases(file_path, bank=BANK_BAC, account_type=ACCOUNT_TYPE_CREDIT):
+    """
+    Procesa un estado de cuenta y devuelve lista de tuplas:
+    (date, description, amount, currency, tag, limit)
+    """
+    raw = parse_statement(read_statement(file_path, bank, account_type), bank, account_type)
+    with span("load_tags"):
+        tags = load_tags()
+        matcher = compile_tag_rules(tags)
+    return tag_statement_rows(raw, tags, matcher)
+
+
+def benchmark_page_sharding(pdf_path, page_counts=(8, 16, 32, 64), layout=True, workers=None):
+    """
+    Mide la extraccion secuencial contra la repartida por paginas para PDF de
+    distintos tamanos, armados repitiendo las paginas de `pdf_path`.
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    workers = workers or min(os.cpu_count() or 1, PAGE_SHARD_MAX_WORKERS)
+    source_pages = PdfReader(pdf_path).pages
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for page_count in page_counts:
+            writer = PdfWriter()
+            for index in range(page_count):
+                writer.add_page(source_pages[index % len(source_pages)])
+            path = os.path.join(tmp, f"{page_count}.pdf")
+            with open(path, "wb") as f:
+                writer.write(f)
+            # Calienta el grupo de procesos para no medir su arranque.
+            extract_text(path, layout=layout, workers=workers)
+            started = time.perf_counter()
+            sequential = extract_text(path, layout=layout, workers=1)
+            sequential_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            sharded = extract_text(path, layout=layout, workers=workers)
+            sharded_seconds = time.perf_counter() - started
+            results.append({
+                "pages": page_count,
+                "workers": workers,
+                "sequential_seconds": sequential_seconds,
+                "sharded_seconds": sharded_seconds,
+                "speedup": sequential_seconds / sharded_seconds if sharded_seconds else 0.0,
+                "same_text": sequential == sharded,
+            })
+    return results
+
+
+def calibrate_text_backends(corpus, backends=None):
+    """
+    Corre cada parser de PARSER_REGISTRY que lee texto de PDF sobre los PDF de
+    la carpeta `corpus`, con cada backend de texto disponible. Las filas de
+    referencia salen del backend que pide el registro (pypdf con o sin
+    layout); para cada parser se elige el backend mas rapido que da
+    exactamente esas filas en todos los archivos que el parser reconoce. Los
+    parsers de LAYOUT_PAGE_SELECTORS tambien prueban la extraccion en dos
+    pasadas ("pypdf_targeted").
+
+    Devuelve {(banco, tipo de cuenta): {"backend", "reference", "files",
+    "rows", "measurements"}}, donde "measurements" tiene por backend los
+    segundos de extraccion e interpretacion, los archivos identicos y la
+    proporcion de filas que coinciden con la referencia.
+    """
+    files = sorted(
+        os.path.join(corpus, name)
+        for name in os.listdir(corpus)
+        if name.lower().endswith(".pdf")
+    )
+    backends = list(backends or available_text_backends())
+    for reference in (DEFAULT_TEXT_BACKEND, DEFAULT_LAYOUT_BACKEND):
+        if reference not in backends:
+            backends.append(reference)
+    texts = {
+        name: {path: _timed_text(path, backend=name) for path in files}
+        for name in backends
+    }
+
+    calibration = {}
+    for key, (parser, source, layout) in PARSER_REGISTRY.items():
+        if source != SOURCE_PDF_TEXT:
+            continue
+        reference = DEFAULT_LAYOUT_BACKEND if layout else DEFAULT_TEXT_BACKEND
+        expected = {}
+        for path in files:
+            rows = _calibration_rows(parser, texts[reference][path][0])
+            if rows:
+                expected[path] = rows
+        expected_count = sum(len(rows) for rows in expected.values())
+        candidates = dict(texts)
+        selector = LAYOUT_PAGE_SELECTORS.get(key)
+        if selector is not None:
+            candidates[TARGETED_LAYOUT_BACKEND] = {path: _timed_text(path, layout_pages=selector) for path in expected}
+        measurements = {}
+        for name, candidate_texts in candidates.items():
+            seconds = 0.0
+            identical_files = 0
+            matched_rows = 0
+            for path, expected_rows in expected.items():
+                text, extract_seconds = candidate_texts[path]
+                started = time.perf_counter()
+                rows = _calibration_rows(parser, text) or []
+                seconds += extract_seconds + time.perf_counter() - started
+                identical_files += rows == expected_rows
+                matched_rows += sum((Counter(rows) & Counter(expected_rows)).values())
+            measurements[name] = {
+                "seconds": seconds,
+                "identical_files": identical_files,
+                "row_agreement": matched_rows / expected_count if expected_count else 0.0,
+            }
+        identical = [name for name in candidates if expected and measurements[name]["identical_files"] == len(expected)]
+        calibration[key] = {
+            "backend": min(identical, key=lambda name: measurements[name]["seconds"]) if identical else None,
+            "reference": reference,
+            "files": len(expected),
+            "rows": expected_count,
+            "measurements": measurements,
+        }
+    return calibration
+
+
+def _timed_text(path, **options):
+    started = time.perf_counter()
+    try:
+        text = extract_text(path, workers=1, **options)
+    except Exception:
+        text = None
+    return text, time.perf_counter() - started
+
+
+def _calibration_rows(parser, text):
+    if text is None:
+        return None
+    try:
+        return [tuple(row) for row in parser(text)]
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) == 2 and argv[0] == "--calibrate-backends":
+        calibration = calibrate_text_backends(argv[1])
+        for (bank, account_type), entry in calibration.items():
+            print(f"{bank} {account_type}: {entry['files']} archivo(s), {entry['rows']} fila(s), elegido {entry['backend'] or '-'}")
+            for name, measurement in entry["measurements"].items():
+                print(
+                    f"  {name:<14} {measurement['seconds'] * 1000:>8.0f} ms, "
+                    f"{measurement['identical_files']}/{entry['files']} archivos iguales, "
+                    f"{measurement['row_agreement']:.0%} de filas"
+                )
+        save_backend_choices(calibration)
+        return 0
+    if len(argv) < 2 or argv[0] != "--benchmark-pages":
+        print("Uso: python purchase_extractor.py --benchmark-pages estado.pdf [paginas ...]")
+        print("     python purchase_extractor.py --calibrate-backends carpeta")
+        return 2
+    page_counts = tuple(int(value) for value in argv[2:]) or (8, 16, 32, 64)
+    for result in benchmark_page_sharding(argv[1], page_counts):
+        print(
+            f"{result['pages']:>4} paginas, {result['workers']} procesos: "
+            f"secuencial {result['sequential_seconds'] * 1000:.0f} ms, "
+            f"repartido {result['sharded_seconds'] * 1000:.0f} ms, "
+            f"x{result['speedup']:.2f}{'' if result['same_text'] else ' (texto distinto)'}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
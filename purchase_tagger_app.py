@@ -1,7 +1,13 @@
 #!/usr/bin/env python3
+import time
+
+STARTUP_STARTED = time.perf_counter()
+
 import ctypes
 import csv
+import multiprocessing
 import os
+import sqlite3
 import sys
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
@@ -12,11 +18,24 @@ from purchase_extractor import (
     BANK_BAC,
     BANK_BCR,
     BANK_PROMERICA,
+    PARSER_VERSION,
     SUPPORTED_ACCOUNT_TYPES_BY_BANK,
-    process_purchases,
 )
-from tag_store import DEFAULT_PARENT_CATEGORY, default_tag_info, load_tags, merge_tags, save_tags
+from tag_store import (
+    DEFAULT_PARENT_CATEGORY,
+    WriteBehindTagSaver,
+    default_tag_info,
+    iter_tag_file_items,
+    load_tags,
+    merge_tags,
+    save_tag_changes,
+)
+from tag_store import save_tags as write_tags
+from import_pipeline import ImportPipeline
+from ledger import PurchaseLedger, default_ledger_path, file_sha256
+from statement_watcher import StatementWatcher, configured_watch_folder, format_watch_summary
 from money import ZERO, format_amount, parse_amount
+from retag_engine import RetagEngine
 from summary import (
     available_months,
     average_spend_by_tag_month,
@@ -31,18 +50,29 @@ from summary import (
 from ui_state import (
     ALL_MONTHS,
     ALL_TAGS,
+    SORT_COLUMNS,
+    FacetIndex,
+    FilteredRows,
+    KpiCounters,
+    PurchaseSortKeys,
+    StringPool,
     available_currencies,
-    available_tags,
+    build_description_index,
     build_file_label,
     filter_purchase_rows,
-    format_totals,
-    kpi_stats,
 )
+from tag_rules import compile_tag_rules, tags_version
+from tracing import span
 from version import APP_TITLE
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from lazy_import import LazyAttribute, LazyModule
+from startup_report import STARTUP_REPORT_FLAG, collect_startup_report, format_startup_report
+from memory_report import MEMORY_REPORT_FLAG, collect_memory_report, format_memory_report, start_memory_tracking
+from session_snapshot import default_session_path, encode_rows, encode_session, read_session, write_session
 from datetime import datetime
 
+plt = LazyModule("matplotlib.pyplot")
+FigureCanvasTkAgg = LazyAttribute("matplotlib.backends.backend_tkagg", "FigureCanvasTkAgg")
+
 
 def resource_path(relative_path):
     base_path = getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__)))
@@ -64,6 +94,34 @@ ALL_CURRENCIES = "Todas las monedas"
 DEFAULT_WINDOW_WIDTH = 1020
 DEFAULT_WINDOW_HEIGHT = 680
 DEFAULT_WINDOW_GEOMETRY = f"{DEFAULT_WINDOW_WIDTH}x{DEFAULT_WINDOW_HEIGHT}"
+WATCH_POLL_MS = 5000
+WATCH_BUSY_POLL_MS = 250
+IMPORT_POLL_MS = 100
+SESSION_SAVE_DELAY_MS = 2000
+# Variables de la interfaz que se guardan en la sesion, con su clave.
+SESSION_VARS = (
+    ("search_var", "search"),
+    ("currency_var", "currency"),
+    ("month_var", "month"),
+    ("tag_filter_var", "tag_filter"),
+    ("bank_var", "bank"),
+    ("account_type_var", "account_type"),
+)
+
+
+TAG_SAVER = WriteBehindTagSaver(writer=save_tag_changes)
+
+
+def save_tags(tags, path=None):
+    """
+    Guarda etiquetas. Los cambios de la biblioteca activa se agrupan y se
+    anotan en segundo plano en el diario de tags.json; las exportaciones a
+    otra ruta se escriben completas al momento.
+    """
+    if path is not None:
+        write_tags(tags, path)
+        return
+    TAG_SAVER.schedule(tags)
 
 
 def amount_sign(amount):
@@ -112,6 +170,13 @@ def simple_input(parent, title, prompt, default=None):
     return res['value']
 
 class PurchaseTaggerUI(ctk.CTk):
+    from views.diagnostics import (
+        _build_diagnostics_view,
+        clear_trace,
+        export_trace,
+        refresh_diagnostics,
+        toggle_tracing,
+    )
     from views.tags import (
         _build_tags_view,
         _parse_limit_value,
@@ -151,10 +216,19 @@ class PurchaseTaggerUI(ctk.CTk):
         self.pdf_files = []
         self.tags = load_tags()
         self.natag = 'N/A'
+        self.ledger = PurchaseLedger(default_ledger_path())
+        self.ledger_loaded = False
+        self.row_fingerprints = {}
+        self.session_path = default_session_path()
+        self.session_after_id = None
 
         self.all_rows = []
         self.filtered_rows = []
         self.tree_item_rows = {}
+        self.description_index = {}
+        self.string_pool = StringPool()
+        self.sort_keys = PurchaseSortKeys()
+        self.sort_spec = []
 
         self.active_view = "Imports"
         self.search_var = tk.StringVar()
@@ -166,6 +240,8 @@ class PurchaseTaggerUI(ctk.CTk):
         self.tag_filter_var = tk.StringVar(value=ALL_TAGS)
         self.status_var = tk.StringVar(value="Listo")
         self.file_label_var = tk.StringVar(value=build_file_label(self.pdf_files))
+        self.statement_watcher = None
+        self.import_pipeline = None
         self.total_var = tk.StringVar(value="Totales: 0.00")
         self.kpi_vars = {
             "total_rows": tk.StringVar(value="0"),
@@ -189,6 +265,21 @@ class PurchaseTaggerUI(ctk.CTk):
 
         self._build_sidebar()
         self.show_view("Imports")
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.after_idle(self.load_ledger_history)
+        watch_folder = configured_watch_folder()
+        if watch_folder is not None:
+            self.after_idle(self.start_folder_watch, watch_folder)
+
+    def on_close(self):
+        self._cancel_import()
+        self.stop_folder_watch()
+        self.flush_tag_saves()
+        if self.session_after_id is not None:
+            self.after_cancel(self.session_after_id)
+        self.save_session()
+        self.ledger.close()
+        self.destroy()
 
     def _apply_app_icon(self):
         if not os.path.exists(APP_ICON_PATH):
@@ -227,8 +318,9 @@ class PurchaseTaggerUI(ctk.CTk):
             "Purchases": "Compras",
             "Summaries": "Resúmenes",
             "Tags": "Etiquetas",
+            "Diagnostics": "Diagnóstico",
         }
-        for view in ("Imports", "Purchases", "Summaries", "Tags"):
+        for view in ("Imports", "Purchases", "Summaries", "Tags", "Diagnostics"):
             button = ctk.CTkButton(
                 self.sidebar,
                 text=nav_labels[view],
@@ -271,6 +363,9 @@ class PurchaseTaggerUI(ctk.CTk):
             self._build_summary_view()
         elif view_name == "Tags":
             self._build_tags_view()
+        elif view_name == "Diagnostics":
+            self._build_diagnostics_view()
+        self._schedule_session_save()
 
     def _clear_workspace_widget_refs(self):
         for name in (
@@ -296,6 +391,8 @@ class PurchaseTaggerUI(ctk.CTk):
             "summary_figure",
             "tag_listbox",
             "tags_tabview",
+            "diagnostics_tree",
+            "tracing_enabled_var",
             "tag_detail_title",
             "tag_name_var",
             "tag_name_entry",
@@ -629,8 +726,16 @@ class PurchaseTaggerUI(ctk.CTk):
         ctk.CTkButton(panel, text="Buscar y etiquetar", command=self.browse_pdf, width=130).grid(
             row=1, column=3, sticky="w", padx=(0, 8), pady=(2, 12)
         )
+        self.watch_button = ctk.CTkButton(
+            panel,
+            text="Detener vigilancia" if self.__dict__.get("statement_watcher") else "Vigilar carpeta",
+            command=self.toggle_folder_watch,
+            width=120,
+            fg_color="#0f766e",
+        )
+        self.watch_button.grid(row=1, column=4, sticky="w", padx=(0, 8), pady=(2, 12))
         ctk.CTkButton(panel, text="Limpiar", command=self.clear_pdfs, width=80, fg_color="#64748b").grid(
-            row=1, column=4, sticky="w", padx=(0, 14), pady=(2, 12)
+            row=1, column=5, sticky="w", padx=(0, 14), pady=(2, 12)
         )
 
     def _refresh_account_type_options(self, selected_bank=None):
@@ -676,23 +781,20 @@ class PurchaseTaggerUI(ctk.CTk):
         search.grid(row=0, column=0, sticky="ew", padx=10, pady=10)
         self.currency_menu = ctk.CTkOptionMenu(
             panel,
-            variable=self.currency_var,
             values=[ALL_CURRENCIES],
-            command=lambda _: self.apply_filter(),
+            command=lambda label: self._select_filter_option("currency_menu", "currency_var", label),
         )
         self.currency_menu.grid(row=0, column=1, padx=(0, 8))
         self.month_menu = ctk.CTkOptionMenu(
             panel,
-            variable=self.month_var,
             values=[ALL_MONTHS],
-            command=lambda _: self.apply_filter(),
+            command=lambda label: self._select_filter_option("month_menu", "month_var", label),
         )
         self.month_menu.grid(row=0, column=2, padx=(0, 8))
         self.tag_menu = ctk.CTkOptionMenu(
             panel,
-            variable=self.tag_filter_var,
             values=[ALL_TAGS],
-            command=lambda _: self.apply_filter(),
+            command=lambda label: self._select_filter_option("tag_menu", "tag_filter_var", label),
         )
         self.tag_menu.grid(row=0, column=3, padx=(0, 8))
         ctk.CTkButton(panel, text="Restablecer", command=self.reset_filters, width=96, fg_color="#64748b").grid(
@@ -777,27 +879,67 @@ class PurchaseTaggerUI(ctk.CTk):
         style.map("Treeview", background=[("selected", "#dbeafe")], foreground=[("selected", "#171a20")])
 
     def _refresh_filter_options(self):
-        if "currency_menu" in self.__dict__:
-            currency_values = [ALL_CURRENCIES] + available_currencies(self.all_rows)
-            self.currency_menu.configure(values=currency_values)
-            if self.currency_var.get() not in currency_values:
-                self.currency_var.set(ALL_CURRENCIES)
-        if "month_menu" in self.__dict__:
-            month_values = [ALL_MONTHS] + available_months(self.all_rows)
-            self.month_menu.configure(values=month_values)
-            if self.month_var.get() not in month_values:
-                self.month_var.set(ALL_MONTHS)
-        if "tag_menu" in self.__dict__:
-            tag_values = [ALL_TAGS] + available_tags(self.all_rows)
-            self.tag_menu.configure(values=tag_values)
-            if self.tag_filter_var.get() not in tag_values:
-                self.tag_filter_var.set(ALL_TAGS)
+        facets = self._facet_index()
+        self._refresh_filter_menu(facets, "currency_menu", "currency_var", "currency", ALL_CURRENCIES)
+        self._refresh_filter_menu(facets, "month_menu", "month_var", "month", ALL_MONTHS)
+        self._refresh_tag_menu_options()
+
+    def _refresh_tag_menu_options(self):
+        self._refresh_filter_menu(self._facet_index(), "tag_menu", "tag_filter_var", "tag", ALL_TAGS)
+
+    def _refresh_filter_menu(self, facets, menu_name, var_name, facet, all_label):
+        """
+        Muestra cada opcion con su cantidad de filas ("CRC (12)"); la variable
+        del filtro sigue guardando solo el valor.
+        """
+        if menu_name not in self.__dict__:
+            return
+        counts = facets.counts(facet)
+        value_labels = {all_label: all_label}
+        for value in facets.values(facet):
+            value_labels[value] = f"{value} ({counts.get(value, 0)})"
+        self.__dict__.setdefault("filter_menu_labels", {})[menu_name] = {
+            label: value for value, label in value_labels.items()
+        }
+        self._configure_filter_menu(menu_name, list(value_labels.values()))
+        var = getattr(self, var_name)
+        if var.get() not in value_labels:
+            var.set(all_label)
+        self.__dict__[menu_name].set(value_labels[var.get()])
+
+    def _select_filter_option(self, menu_name, var_name, label):
+        value = self.__dict__.get("filter_menu_labels", {}).get(menu_name, {}).get(label, label)
+        getattr(self, var_name).set(value)
+        self.apply_filter()
+
+    def _configure_filter_menu(self, menu_name, values):
+        """
+        Reconfigura el menu solo si sus opciones cambiaron desde la ultima vez
+        o si la vista lo volvio a crear.
+        """
+        menu = self.__dict__[menu_name]
+        shown = self.__dict__.setdefault("filter_menu_values", {})
+        previous = shown.get(menu_name)
+        if previous is not None and previous[0] is menu and previous[1] == values:
+            return
+        menu.configure(values=values)
+        shown[menu_name] = (menu, values)
+
+    def _kpi_counters(self):
+        counters = self.__dict__.get("kpi_counters")
+        if counters is None:
+            counters = self.kpi_counters = KpiCounters(self.all_rows, self.filtered_rows, self.natag)
+        return counters
 
     def _update_kpis(self):
-        stats = kpi_stats(self.all_rows, self.filtered_rows, self.tags, self.natag)
+        counters = self._kpi_counters()
+        stats = counters.stats(self.tags)
         for key, value in stats.items():
             if "kpi_vars" in self.__dict__ and key in self.kpi_vars:
                 self.kpi_vars[key].set(str(value))
+        self.total_var.set(counters.totals_text())
+        if "visible_count_var" in self.__dict__:
+            self.visible_count_var.set(f"Mostrando {counters.visible_rows} compras")
 
     def _build_summary_insights_panel(self, parent, row):
         self.summary_insights_frame = self._panel(parent, row=row, column=0, sticky="ew", pady=(0, 12))
@@ -1286,9 +1428,96 @@ class PurchaseTaggerUI(ctk.CTk):
             self.status_var.set(f"{len(self.pdf_files)} archivo(s) seleccionado(s)")
             self.load()
 
+    def toggle_folder_watch(self):
+        if self.__dict__.get("statement_watcher") is not None:
+            self.stop_folder_watch()
+            self.status_var.set("Vigilancia de carpeta detenida")
+            return
+        initial = configured_watch_folder()
+        folder = filedialog.askdirectory(initialdir=str(initial) if initial else None)
+        if folder:
+            self.start_folder_watch(folder)
+
+    def start_folder_watch(self, folder):
+        """
+        Vigila `folder` y agrega al historial los estados de cuenta nuevos con
+        el banco y tipo de cuenta seleccionados. La extraccion corre en hilos;
+        el registro en el libro y la tabla se actualizan en el hilo de la UI.
+        """
+        self.stop_folder_watch()
+        try:
+            self.statement_watcher = StatementWatcher(
+                folder,
+                self.ledger,
+                bank=self._var_value("bank_var", BANK_BAC),
+                account_type=self._var_value("account_type_var", ACCOUNT_TYPE_CREDIT),
+            )
+        except ValueError as e:
+            messagebox.showerror('Error', str(e))
+            return
+        self._set_watch_button_text("Detener vigilancia")
+        self.status_var.set(f"Vigilando {folder}")
+        self._poll_folder_watch()
+
+    def stop_folder_watch(self):
+        watcher = self.__dict__.get("statement_watcher")
+        if watcher is None:
+            return
+        self.statement_watcher = None
+        after_id = self.__dict__.get("watch_after_id")
+        if after_id is not None:
+            self.after_cancel(after_id)
+            self.watch_after_id = None
+        watcher.close(wait=False)
+        self._set_watch_button_text("Vigilar carpeta")
+
+    def _set_watch_button_text(self, text):
+        button = self.__dict__.get("watch_button")
+        if button is not None and button.winfo_exists():
+            button.configure(text=text)
+
+    def _poll_folder_watch(self):
+        watcher = self.__dict__.get("statement_watcher")
+        if watcher is None:
+            return
+        try:
+            watcher.submit_ready()
+            summary = watcher.collect()
+            if summary["files"] or summary["errors"]:
+                if summary["new_rows"]:
+                    # El vigilante etiqueta con el archivo de etiquetas; la tabla usa
+                    # las de la ventana, igual que al leer el historial.
+                    matcher = compile_tag_rules(self.tags, self.__dict__.get("natag", "N/A"))
+                    self._append_ledger_rows([
+                        (fingerprint, (date, description, amount, currency, matcher.match(description, amount, currency)))
+                        for fingerprint, (date, description, amount, currency, _tag) in summary["new_rows"]
+                    ])
+                    self.apply_filter()
+                self.status_var.set(f"{format_watch_summary(summary)}. Historial: {len(self.all_rows)} compras")
+        finally:
+            # Un error inesperado no detiene la vigilancia.
+            delay = WATCH_BUSY_POLL_MS if watcher.pending else WATCH_POLL_MS
+            self.watch_after_id = self.after(delay, self._poll_folder_watch)
+
     def clear_pdfs(self):
+        """
+        Quita la seleccion de archivos y reinicia los filtros. El historial
+        sigue en el libro y en la tabla; si los archivos seleccionados ya estan
+        en el historial, se ofrece quitar sus compras.
+        """
+        self._cancel_import()
+        removed = self._forget_selected_statements()
         self.pdf_files = []
-        self.all_rows = []
+        if not self.__dict__.get("ledger_loaded"):
+            self.all_rows = []
+            self.description_index = {}
+            self.facet_index = None
+            self.string_pool = StringPool()
+            self.row_fingerprints = {}
+            self.retag_engine = None
+            self._purchase_sort_keys().clear()
+        elif removed:
+            self._load_ledger_rows()
         self.filtered_rows = []
         self.tree_item_rows.clear()
         self.search_var.set("")
@@ -1296,68 +1525,410 @@ class PurchaseTaggerUI(ctk.CTk):
         self.import_currency_var.set("")
         self.month_var.set(ALL_MONTHS)
         self.tag_filter_var.set(ALL_TAGS)
+        self._refresh_filter_options()
+        self._schedule_session_save()
         self.bank_var.set(BANK_BAC)
         self.account_type_var.set(ACCOUNT_TYPE_CREDIT)
         self._refresh_account_type_options(BANK_BAC)
         self.file_label_var.set(build_file_label(self.pdf_files))
-        self.status_var.set("No hay archivos seleccionados")
+        status = f"Se quitaron {removed} archivo(s) del historial" if removed else "No hay archivos seleccionados"
+        if self.__dict__.get("ledger_loaded"):
+            status += f". Historial: {len(self.all_rows)} compras"
+        self.status_var.set(status)
         if self.__dict__.get("active_view") == "Imports":
             self.show_view("Imports")
         else:
             self.apply_filter()
 
+    def _forget_selected_statements(self):
+        ledger = self.__dict__.get("ledger")
+        if ledger is None or not self.pdf_files:
+            return 0
+        try:
+            hashes = []
+            for pdf in self.pdf_files:
+                try:
+                    source_hash = file_sha256(pdf)
+                except OSError:
+                    continue
+                if ledger.has_statement(source_hash):
+                    hashes.append(source_hash)
+            if not hashes or not messagebox.askyesno(
+                'Limpiar',
+                f'¿Quitar también del historial las compras de {len(hashes)} archivo(s) seleccionado(s)?',
+            ):
+                return 0
+            for source_hash in hashes:
+                ledger.remove_statement(source_hash)
+        except sqlite3.Error as e:
+            messagebox.showerror('Error', str(e))
+            return 0
+        return len(hashes)
+
     def load(self):
         if not self.pdf_files:
             messagebox.showwarning('Sin archivo', 'Selecciona uno o más archivos de estado de cuenta.')
             return
-        self.all_rows = []
+        self.flush_tag_saves()
+        self._load_into_ledger()
+
+    def _string_pool(self):
+        return self.__dict__.setdefault("string_pool", StringPool())
+
+    def _load_into_ledger(self):
         self.status_var.set("Procesando archivos...")
         self.update_idletasks()
+        self._cancel_import()
         bank = self._var_value("bank_var", BANK_BAC)
         account_type = self._var_value("account_type_var", ACCOUNT_TYPE_CREDIT)
+        current_tags_version = tags_version(self.tags)
+        state = self.import_state = {
+            "bank": bank,
+            "account_type": account_type,
+            "tags_version": current_tags_version,
+            "hashes": {},
+            "done": 0,
+            "inserted": 0,
+            "duplicates": 0,
+            "served": 0,
+        }
         for pdf in self.pdf_files:
             try:
-                raw = process_purchases(pdf, bank=bank, account_type=account_type)
-                for d, desc, amt, cur, tag, _ in raw:
-                    formatted_amount = format_amount(amt)
-                    self.all_rows.append([d, desc, formatted_amount, cur, tag, amount_sign(formatted_amount)])
+                source_hash = file_sha256(pdf)
+                known = self.ledger.current_statement(source_hash, bank, account_type, PARSER_VERSION)
+                if known is not None:
+                    # Las filas guardadas se reetiquetan al leer el historial, asi que
+                    # un cambio de etiquetas no obliga a extraer el PDF otra vez.
+                    if known["tags_version"] != current_tags_version:
+                        self.ledger.set_tags_version(source_hash, current_tags_version)
+                    state["served"] += 1
+                    continue
+                state["hashes"][pdf] = source_hash
             except Exception as e:
                 messagebox.showerror('Error', f'{os.path.basename(pdf)}: {e}')
+        if not self.__dict__.get("ledger_loaded"):
+            # Las compras nuevas se agregan al historial ya cargado.
+            self._load_ledger_rows()
+            self.apply_filter()
+        if not state["hashes"]:
+            self._finish_import()
+            return
+        try:
+            self.import_pipeline = ImportPipeline(
+                list(state["hashes"]),
+                bank,
+                account_type,
+                self.tags,
+                self.__dict__.get("natag", "N/A"),
+                executor=self.__dict__.get("import_executor"),
+            ).start()
+        except ValueError as e:
+            messagebox.showerror('Error', str(e))
+            self._finish_import()
+            return
+        self._drain_import_pipeline()
+
+    def _drain_import_pipeline(self):
+        """
+        Guarda en el libro los archivos que el pipeline termino y agrega sus
+        compras nuevas a la tabla sin esperar al resto del lote.
+        """
+        pipeline = self.__dict__.get("import_pipeline")
+        if pipeline is None:
+            return
+        self.import_after_id = None
+        state = self.import_state
+        appended = 0
+        for result in pipeline.drain():
+            name = os.path.basename(result["path"])
+            state["done"] += 1
+            try:
+                if result["error"] is not None:
+                    raise result["error"]
+                with span("ledger_write", file=name, count=len(result["rows"])):
+                    recorded = self.ledger.record_statement(
+                        state["hashes"][result["path"]],
+                        name,
+                        state["bank"],
+                        state["account_type"],
+                        result["rows"],
+                        parser_version=PARSER_VERSION,
+                        tags_version=state["tags_version"],
+                        extraction_seconds=result["seconds"],
+                    )
+            except Exception as e:
+                messagebox.showerror('Error', f'{name}: {e}')
+                continue
+            state["inserted"] += recorded["inserted"]
+            state["duplicates"] += recorded["duplicates"]
+            appended += self._append_ledger_rows(recorded["new_rows"])
+        if appended:
+            self.apply_filter()
+        if pipeline.finished:
+            self.import_pipeline = None
+            self._finish_import()
+            return
+        self.status_var.set(
+            f"Procesando archivos... {state['done']}/{len(state['hashes'])}. "
+            f"Historial: {len(self.all_rows)} compras"
+        )
+        self.import_after_id = self.after(IMPORT_POLL_MS, self._drain_import_pipeline)
+
+    def _append_ledger_rows(self, new_rows):
+        index = self.__dict__.setdefault("description_index", {})
+        pool_row = self._string_pool().row
+        for fingerprint, (date, description, amount, currency, tag) in new_rows:
+            row = pool_row((date, description, amount, currency, tag, amount_sign(amount)))
+            self.row_fingerprints[id(row)] = fingerprint
+            index.setdefault(description, []).append(len(self.all_rows))
+            self.all_rows.append(row)
+        return len(new_rows)
+
+    def _finish_import(self):
+        state = self.import_state
+        message = f"Se cargaron y etiquetaron {state['inserted']} compras nuevas"
+        if state["duplicates"]:
+            message += f"; {state['duplicates']} duplicada(s) omitida(s)"
+        if state["served"]:
+            message += f"; {state['served']} archivo(s) tomado(s) del registro"
+        self.status_var.set(f"{message}. Historial: {len(self.all_rows)} compras")
+        if self.__dict__.get("active_view") == "Imports":
+            self.show_view("Imports")
+        self._report_memory()
+
+    def _report_memory(self):
+        """
+        Con --memory-report imprime, al terminar cada carga, la memoria en uso
+        por subsistema.
+        """
+        if self.__dict__.get("memory_report"):
+            print(format_memory_report(collect_memory_report(self)), flush=True)
+
+    def _cancel_import(self):
+        pipeline = self.__dict__.get("import_pipeline")
+        if pipeline is None:
+            return
+        self.import_pipeline = None
+        after_id = self.__dict__.get("import_after_id")
+        if after_id is not None:
+            self.after_cancel(after_id)
+            self.import_after_id = None
+        pipeline.cancel()
+
+    def load_ledger_history(self):
+        """
+        Carga el historial del libro despues del primer cuadro, una sola vez.
+        Si la sesion guardada sigue vigente, la restaura en lugar de leer el
+        libro.
+        """
+        if self.__dict__.get("ledger") is None or self.__dict__.get("ledger_loaded"):
+            return
+        if self._restore_session():
+            return
+        self._load_ledger_rows()
         self.apply_filter()
-        self.status_var.set(f"Se cargaron y etiquetaron {len(self.all_rows)} compras")
+        if self.all_rows:
+            self.status_var.set(f"Historial: {len(self.all_rows)} compras")
         if self.__dict__.get("active_view") == "Imports":
             self.show_view("Imports")
 
+    def _schedule_session_save(self):
+        if self.__dict__.get("session_path") is None:
+            return
+        if self.session_after_id is not None:
+            self.after_cancel(self.session_after_id)
+        self.session_after_id = self.after(SESSION_SAVE_DELAY_MS, self.save_session)
+
+    def save_session(self):
+        """
+        Guarda archivos, filas con sus etiquetas, filtros y vista activa para
+        restaurarlos al abrir. Las filas codificadas se reutilizan mientras no
+        cambien, asi que guardar tras un cambio de filtro o de vista solo
+        escribe el estado.
+        """
+        self.session_after_id = None
+        path = self.__dict__.get("session_path")
+        if path is None or self.__dict__.get("ledger") is None or not self.__dict__.get("ledger_loaded"):
+            return False
+        try:
+            state = self._session_state()
+            write_session(encode_session(state, self._session_rows_block()), path)
+        except (OSError, ValueError, sqlite3.Error):
+            return False
+        return True
+
+    def _session_state(self):
+        state = {
+            "ledger": self.ledger.change_marker(),
+            "tags_version": tags_version(self.tags),
+            "pdf_files": list(self.pdf_files),
+            "active_view": self.__dict__.get("active_view", "Imports"),
+            "sort_spec": [[column, bool(descending)] for column, descending in self.__dict__.get("sort_spec", [])],
+        }
+        for var_name, key in SESSION_VARS:
+            state[key] = self._var_value(var_name, "")
+        return state
+
+    def _session_rows_block(self):
+        rows = self.all_rows
+        manual = self._retag_engine().manual
+        # Las fechas, descripciones y montos no cambian en sitio; las
+        # etiquetas y las asignaciones manuales si.
+        key = (len(rows), [row[4] for row in rows], len(manual))
+        cached = self.__dict__.get("session_rows_cache")
+        if cached is not None and cached[0] is rows and cached[1] == key:
+            return cached[2]
+        fingerprints = self.__dict__.get("row_fingerprints", {})
+        block = encode_rows(
+            rows,
+            [fingerprints.get(id(row), "") for row in rows],
+            [position for position, row in enumerate(rows) if id(row) in manual],
+        )
+        self.session_rows_cache = (rows, key, block)
+        return block
+
+    def _restore_session(self):
+        path = self.__dict__.get("session_path")
+        if path is None:
+            return False
+        try:
+            session = read_session(path)
+            if session is None:
+                return False
+            state = session["state"]
+            if state.get("ledger") != self.ledger.change_marker() or state.get("tags_version") != tags_version(self.tags):
+                return False
+            values = {key: state[key] for _var_name, key in SESSION_VARS if isinstance(state.get(key), str)}
+            sort_spec = [(column, bool(descending)) for column, descending in state.get("sort_spec", []) if column in SORT_COLUMNS]
+            pdf_files = [pdf for pdf in state.get("pdf_files", []) if isinstance(pdf, str) and os.path.exists(pdf)]
+        except (OSError, TypeError, ValueError, sqlite3.Error):
+            # Sesion danada, de otra version o ilegible: se carga el libro.
+            return False
+
+        # Filtros primero, con la tabla aun vacia, para que la traza de la
+        # busqueda no filtre todas las filas antes de tiempo.
+        for var_name, key in SESSION_VARS:
+            if key in values and var_name in self.__dict__:
+                self.__dict__[var_name].set(values[key])
+        if "account_type_menu" in self.__dict__:
+            self._refresh_account_type_options()
+        rows = session["rows"]
+        natag = self.__dict__.get("natag", "N/A")
+        self.all_rows = rows
+        self.string_pool = StringPool(session["strings"])
+        self.row_fingerprints = {id(row): fingerprint for row, fingerprint in zip(rows, session["fingerprints"])}
+        self.ledger_loaded = True
+        self.sort_spec = sort_spec
+        self._purchase_sort_keys().clear()
+        self.description_index = build_description_index(rows)
+        self.retag_engine = RetagEngine(rows, natag, manual={id(rows[position]) for position in session["manual"]})
+        self.pdf_files = pdf_files
+        self.file_label_var.set(build_file_label(pdf_files))
+        self.apply_filter()
+        self.status_var.set(f"Sesión restaurada. Historial: {len(rows)} compras")
+        active_view = state.get("active_view")
+        self.show_view(active_view if active_view in self.__dict__.get("nav_buttons", {}) else self.active_view)
+        return True
+
+    def _load_ledger_rows(self):
+        natag = self.__dict__.get("natag", "N/A")
+        matcher = compile_tag_rules(self.tags, natag)
+        rows = []
+        manual = set()
+        fingerprints = {}
+        pool = self.string_pool = StringPool()
+        with span("ledger_read") as stage:
+            for fingerprint, date, description, amount, currency, tag, is_manual in self.ledger.movements():
+                if not is_manual:
+                    tag = matcher.match(description, amount, currency)
+                row = pool.row((date, description, amount, currency, tag, amount_sign(amount)))
+                if is_manual:
+                    manual.add(id(row))
+                fingerprints[id(row)] = fingerprint
+                rows.append(row)
+            stage.add(len(rows))
+        self.all_rows = rows
+        self.row_fingerprints = fingerprints
+        self.ledger_loaded = True
+        self._purchase_sort_keys().clear()
+        self.description_index = build_description_index(rows)
+        self.retag_engine = RetagEngine(rows, natag, manual=manual)
+
     def apply_filter(self):
         self._refresh_filter_options()
         selected_currency = self._var_value("currency_var", ALL_CURRENCIES)
         currencies = set() if selected_currency == ALL_CURRENCIES else {selected_currency}
-        self.filtered_rows = filter_purchase_rows(
-            self.all_rows,
+        with span("apply_filter", count=len(self.all_rows)):
+            self.filtered_rows = FilteredRows(self.all_rows, self._facet_index().filter_indexes(
+                search_text=self._var_value("search_var", ""),
+                currencies=currencies,
+                month_key=self._var_value("month_var", ALL_MONTHS),
+                tag_name=self._var_value("tag_filter_var", ALL_TAGS),
+            ))
+            self._sort_filtered_rows()
+            self.kpi_counters = KpiCounters(self.all_rows, self.filtered_rows, self.natag)
+        self.tree_item_rows.clear()
+        if self._has_live_tree():
+            with span("treeview_rebuild", count=len(self.filtered_rows)):
+                self._render_purchase_rows()
+        self._update_kpis()
+        self._schedule_session_save()
+
+    def _facet_index(self):
+        facets = self.__dict__.get("facet_index")
+        if facets is None or facets.rows is not self.all_rows or facets.row_count > len(self.all_rows):
+            facets = self.facet_index = FacetIndex(self.all_rows)
+        else:
+            facets.extend()
+        return facets
+
+    def _move_row_tag(self, row, old_tag):
+        if self.__dict__.get("facet_index") is None:
+            return
+        facets = self._facet_index()
+        for position in self._description_positions(row[1]):
+            if self.all_rows[position] is row:
+                facets.move("tag", position, old_tag, row[4])
+                return
+
+    def _merge_tag_facet(self, old_tag, new_tag):
+        if self.__dict__.get("facet_index") is not None and "all_rows" in self.__dict__:
+            self._facet_index().merge("tag", old_tag, new_tag)
+
+    def _rename_manual_tags(self, old_tag, new_tag):
+        ledger = self.__dict__.get("ledger")
+        if ledger is not None:
+            ledger.rename_manual_tag(old_tag, new_tag)
+
+    def _row_matches_filters(self, row):
+        selected_currency = self._var_value("currency_var", ALL_CURRENCIES)
+        return bool(filter_purchase_rows(
+            [row],
             search_text=self._var_value("search_var", ""),
-            currencies=currencies,
+            currencies=set() if selected_currency == ALL_CURRENCIES else {selected_currency},
             month_key=self._var_value("month_var", ALL_MONTHS),
             tag_name=self._var_value("tag_filter_var", ALL_TAGS),
-        )
+        ))
+
+    def _render_purchase_rows(self):
         self.tree_item_rows.clear()
-        if not self._has_live_tree():
-            self._update_kpis()
-            self.total_var.set(format_totals(self.filtered_rows))
-            if "visible_count_var" in self.__dict__:
-                self.visible_count_var.set(f"Mostrando {len(self.filtered_rows)} compras")
-            return
-        for i in self.tree.get_children():
-            self.tree.delete(i)
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
         for index, row in enumerate(self.filtered_rows):
             tags = ("odd",) if index % 2 else ("even",)
             iid = self.tree.insert('', 'end', values=display_purchase_row(row), tags=tags)
             self.tree_item_rows[iid] = row
         self.tree.tag_configure("even", background="#ffffff")
         self.tree.tag_configure("odd", background="#fafbfc")
-        self._update_kpis()
-        self.total_var.set(format_totals(self.filtered_rows))
-        if "visible_count_var" in self.__dict__:
-            self.visible_count_var.set(f"Mostrando {len(self.filtered_rows)} compras")
+
+    def _purchase_sort_keys(self):
+        return self.__dict__.setdefault("sort_keys", PurchaseSortKeys())
+
+    def _sort_filtered_rows(self):
+        sort_spec = self.__dict__.get("sort_spec")
+        if sort_spec:
+            self._purchase_sort_keys().sort(self.filtered_rows, sort_spec)
 
     def reset_filters(self):
         self.search_var.set("")
@@ -1375,6 +1946,10 @@ class PurchaseTaggerUI(ctk.CTk):
         for t in self.tags:
             menu.add_command(label=t, command=lambda tag=t, iid=iid: self.assign_tag(iid, tag))
         menu.add_separator()
+        bulk_menu = tk.Menu(menu, tearoff=0)
+        for t in self.tags:
+            bulk_menu.add_command(label=t, command=lambda tag=t, iid=iid: self.assign_tag_to_description(iid, tag))
+        menu.add_cascade(label='Asignar a todas con esta descripción', menu=bulk_menu)
         menu.add_command(label='Nueva etiqueta...', command=lambda iid=iid: self.create_and_assign(iid))
         menu.tk_popup(event.x_root, event.y_root)
 
@@ -1384,16 +1959,116 @@ class PurchaseTaggerUI(ctk.CTk):
     def assign_tag(self, item_iid, tag):
         row = self._row_for_item(item_iid)
         old_tag = row[4]
+        counters = self.__dict__.get("kpi_counters")
+        if counters is not None:
+            counters.discard(row)
         row[4] = tag
-        self.tree.item(item_iid, values=display_purchase_row(row))
+        self._mark_manual_tag(row)
+        if "all_rows" in self.__dict__:
+            self._move_row_tag(row, old_tag)
         if old_tag == self.natag:
             desc = row[1]
             if desc not in self.tags[tag]["keywords"]:
                 self.tags[tag]["keywords"].append(desc)
                 save_tags(self.tags)
+        if "all_rows" not in self.__dict__:
+            self.tree.item(item_iid, values=display_purchase_row(row))
+            return
+        if counters is None:
+            self.tree.item(item_iid, values=display_purchase_row(row))
+            self.apply_filter()
+        else:
+            self._update_assigned_row(item_iid, row, counters)
+        self._set_status(f'Se asignó "{tag}" a la compra')
+
+    def _description_positions(self, description):
+        index = self.__dict__.get("description_index")
+        if index is None or sum(len(positions) for positions in index.values()) != len(self.all_rows):
+            index = self.description_index = build_description_index(self.all_rows)
+        return index.get(description, [])
+
+    def _rows_with_description(self, description):
+        return [self.all_rows[position] for position in self._description_positions(description)]
+
+    def assign_tag_to_description(self, item_iid, tag):
+        row = self._row_for_item(item_iid)
+        desc = row[1]
+        matching_rows = self._rows_with_description(desc)
+        if not any(matching is row for matching in matching_rows):
+            matching_rows.append(row)
+        retagged = []
+        had_untagged = False
+        for matching in matching_rows:
+            if matching[4] == tag:
+                continue
+            had_untagged = had_untagged or matching[4] == self.natag
+            old_tag = matching[4]
+            matching[4] = tag
+            self._move_row_tag(matching, old_tag)
+            retagged.append(matching)
+        self._mark_manual_tags(retagged, tag)
+        changed = len(retagged)
+        if had_untagged and desc not in self.tags[tag]["keywords"]:
+            self.tags[tag]["keywords"].append(desc)
+            save_tags(self.tags)
+        self.apply_filter()
+        self._set_status(f'Se asignó "{tag}" a {changed} compra(s) con la descripción "{desc}"')
+        return changed
+
+    def _retag_engine(self):
+        engine = self.__dict__.get("retag_engine")
+        if engine is None or not engine.is_current(self.all_rows):
+            manual = engine.manual if engine is not None else None
+            engine = self.retag_engine = RetagEngine(self.all_rows, self.__dict__.get("natag", "N/A"), manual=manual)
+        return engine
+
+    def _mark_manual_tag(self, row):
+        self._mark_manual_tags([row], row[4])
+
+    def _mark_manual_tags(self, rows, tag):
         if "all_rows" in self.__dict__:
+            engine = self._retag_engine()
+            for row in rows:
+                engine.mark_manual(row)
+        row_fingerprints = self.__dict__.get("row_fingerprints", {})
+        fingerprints = [row_fingerprints[id(row)] for row in rows if id(row) in row_fingerprints]
+        if fingerprints:
+            self.ledger.set_manual_tags(fingerprints, tag)
+
+    def retag_rows_for_keywords(self, added=(), removed=()):
+        if not self.__dict__.get("all_rows"):
+            return None
+        result = self._retag_engine().apply_keyword_changes(self.tags, added=added, removed=removed)
+        facets = self.__dict__.get("facet_index")
+        if facets is not None and facets.rows is self.all_rows:
+            for position, old_tag in result["retagged"]:
+                facets.move("tag", position, old_tag, self.all_rows[position][4])
+        if result["changed"]:
             self.apply_filter()
-            self._set_status(f'Se asignó "{tag}" a la compra')
+        return result
+
+    def _update_assigned_row(self, item_iid, row, counters):
+        if self._row_matches_filters(row):
+            self.tree.item(item_iid, values=display_purchase_row(row))
+            counters.add(row)
+        else:
+            self.tree.delete(item_iid)
+            self.tree_item_rows.pop(item_iid, None)
+            for index, visible_row in enumerate(self.filtered_rows):
+                if visible_row is row:
+                    del self.filtered_rows[index]
+                    break
+        self._refresh_tag_menu_options()
+        self._update_kpis()
+        self._schedule_session_save()
+
+    def flush_tag_saves(self):
+        try:
+            TAG_SAVER.flush()
+        except Exception as exc:
+            messagebox.showerror("Error", f"No se pudieron guardar las etiquetas: {exc}")
+            return False
+        return True
 
     def create_and_assign(self, item_iid):
         row = self._row_for_item(item_iid)
@@ -1415,15 +2090,13 @@ class PurchaseTaggerUI(ctk.CTk):
         self.show_view("Summaries")
 
     def sort_column(self, col, reverse):
-        data = [(self.tree.set(k, col), k) for k in self.tree.get_children('')]
-        if col == 'amount':
-            data = [(parse_amount(v), k) for v, k in data]
-        else:
-            data = [(v.lower(), k) for v, k in data]
-        data.sort(reverse=reverse)
-        for idx, (_, k) in enumerate(data):
-            self.tree.move(k, '', idx)
-        self.tree.heading(col, command=lambda _c=col: self.sort_column(_c, not reverse))
+        previous = [(column, descending) for column, descending in self.__dict__.get("sort_spec", []) if column != col]
+        self.sort_spec = [(col, reverse)] + previous
+        self._sort_filtered_rows()
+        self._schedule_session_save()
+        if self._has_live_tree():
+            self._render_purchase_rows()
+            self.tree.heading(col, command=lambda _c=col: self.sort_column(_c, not reverse))
 
     def export_csv(self):
         if not self.filtered_rows:
@@ -1441,10 +2114,21 @@ class PurchaseTaggerUI(ctk.CTk):
         except Exception as e:
             messagebox.showerror('Error', str(e))
 
-def main():
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
     set_windows_app_user_model_id()
-    PurchaseTaggerUI().mainloop()
+    if STARTUP_REPORT_FLAG in argv:
+        print(format_startup_report(collect_startup_report(PurchaseTaggerUI, STARTUP_STARTED)))
+        return
+    if MEMORY_REPORT_FLAG in argv:
+        start_memory_tracking()
+    app = PurchaseTaggerUI()
+    app.memory_report = MEMORY_REPORT_FLAG in argv
+    app.mainloop()
 
 
 if __name__ == '__main__':
+    # Los procesos que extraen paginas de PDF grandes arrancan este mismo
+    # ejecutable en la version empaquetada.
+    multiprocessing.freeze_support()
     main()
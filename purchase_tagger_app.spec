@@ -4,15 +4,32 @@ from PyInstaller.utils.hooks import collect_data_files, collect_submodules
 
 
 local_hiddenimports = [
+    'import_pipeline',
+    'lazy_import',
+    'ledger',
+    'memory_report',
     'money',
+    'pdf_backends',
     'purchase_extractor',
+    'retag_engine',
+    'session_snapshot',
+    'sqlite_tag_store',
     'summary',
+    'startup_report',
+    'statement_watcher',
+    'tag_rules',
     'tag_store',
+    'tracing',
     'ui_state',
     'version',
     'views',
+    'views.diagnostics',
     'views.tags',
 ]
+deferred_hiddenimports = [
+    'matplotlib.pyplot',
+    'matplotlib.backends.backend_tkagg',
+]
 customtkinter_datas = collect_data_files('customtkinter')
 customtkinter_hiddenimports = collect_submodules('customtkinter')
 
@@ -21,7 +38,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('tags.json', '.'), ('assets/app_icon.ico', 'assets')] + customtkinter_datas,
-    hiddenimports=local_hiddenimports + customtkinter_hiddenimports,
+    hiddenimports=local_hiddenimports + deferred_hiddenimports + customtkinter_hiddenimports,
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import time
+from itertools import chain
+
+from tag_rules import compile_tag_rules
+
+
+class RetagEngine:
+    """
+    Re-etiqueta filas ya cargadas cuando cambian palabras clave.
+
+    Agrupa las filas por descripcion en mayusculas y mantiene un indice
+    invertido palabra clave -> descripciones que la contienen, de modo que un
+    cambio solo recalcula las filas afectadas. Las filas asignadas a mano se
+    conservan.
+    """
+
+    def __init__(self, rows, natag="N/A", manual=None):
+        self.rows = rows
+        self.natag = natag
+        self.row_count = len(rows)
+        self._positions_by_description = {}
+        for position, row in enumerate(rows):
+            if len(row) > 4:
+                self._positions_by_description.setdefault(row[1].upper(), []).append(position)
+        live_ids = {id(row) for row in rows}
+        self.manual = {row_id for row_id in (manual or ()) if row_id in live_ids}
+        self._descriptions_by_keyword = {}
+
+    def is_current(self, rows):
+        return self.rows is rows and self.row_count == len(rows)
+
+    def mark_manual(self, row):
+        self.manual.add(id(row))
+
+    def descriptions_for_keyword(self, keyword):
+        keyword = keyword.upper()
+        descriptions = self._descriptions_by_keyword.get(keyword)
+        if descriptions is None:
+            descriptions = {
+                description
+                for description in self._positions_by_description
+                if keyword in description
+            }
+            self._descriptions_by_keyword[keyword] = descriptions
+        return descriptions
+
+    def apply_keyword_changes(self, tags, added=(), removed=()):
+        started = time.perf_counter()
+        descriptions = set()
+        for keyword in chain(added, removed):
+            descriptions |= self.descriptions_for_keyword(keyword)
+
+        matcher = compile_tag_rules(tags, self.natag)
+        examined = 0
+        changed = 0
+        retagged = []
+        for description in descriptions:
+            new_tag = matcher.match(description)
+            for position in self._positions_by_description[description]:
+                row = self.rows[position]
+                if id(row) in self.manual:
+                    continue
+                examined += 1
+                if matcher.has_conditions:
+                    # Las reglas por monto o moneda pueden separar filas con la misma descripcion.
+                    new_tag = matcher.match(row[1], row[2], row[3])
+                if row[4] != new_tag:
+                    retagged.append((position, row[4]))
+                    row[4] = new_tag
+                    changed += 1
+
+        return {
+            "changed": changed,
+            "examined": examined,
+            "retagged": retagged,
+            "seconds": time.perf_counter() - started,
+        }
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+import gc
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from operator import itemgetter
+
+from tag_store import default_tag_file_path
+
+
+SESSION_FILENAME = "session.snapshot"
+SESSION_MAGIC = b"PTSESS\r\n"
+SESSION_VERSION = 1
+# Columnas de texto por fila: fecha, descripcion, monto, moneda, etiqueta y
+# signo. La huella del libro va aparte.
+SESSION_COLUMNS = 6
+# Las huellas sha256 del libro se guardan como 32 bytes en lugar de texto.
+FINGERPRINT_BYTES = 32
+_HEADER = struct.Struct("<8sHII")
+_ROWS_HEADER = struct.Struct("<I")
+_INDEX_TYPECODE = "I"
+
+
+class SessionSnapshotError(ValueError):
+    pass
+
+
+def default_session_path():
+    return default_tag_file_path().with_name(SESSION_FILENAME)
+
+
+def encode_rows(rows, fingerprints, manual):
+    """
+    Codifica las filas de la sesion. Cada texto va una sola vez en una tabla
+    y cada columna es un array de posiciones en esa tabla, de modo que
+    restaurar no interpreta una estructura por fila. `manual` son las
+    posiciones de las filas etiquetadas a mano.
+    """
+    if len(fingerprints) != len(rows):
+        raise ValueError("Each row needs a ledger fingerprint")
+    strings = {}
+    column_values = [list(map(itemgetter(column), rows)) for column in range(SESSION_COLUMNS)]
+    fingerprint_blob = _packed_fingerprints(fingerprints)
+    if fingerprint_blob is None:
+        column_values.append(list(fingerprints))
+    columns = []
+    for values in column_values:
+        for value in dict.fromkeys(values):
+            if value not in strings:
+                strings[value] = len(strings)
+        columns.append(array(_INDEX_TYPECODE, map(strings.__getitem__, values)))
+    manual = array(_INDEX_TYPECODE, manual)
+    meta = json.dumps({
+        "row_count": len(rows),
+        "manual_count": len(manual),
+        "packed_fingerprints": fingerprint_blob is not None,
+        "itemsize": manual.itemsize,
+        "byteorder": sys.byteorder,
+        "strings": list(strings),
+    }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    parts = [_ROWS_HEADER.pack(len(meta)), meta]
+    parts.extend(column.tobytes() for column in columns)
+    parts.extend((manual.tobytes(), fingerprint_blob or b""))
+    return b"".join(parts)
+
+
+def encode_session(state, rows_block):
+    """
+    Arma el archivo de sesion: encabezado con version y CRC32, el estado
+    (diccionario JSON con archivos, filtros, vista, version de etiquetas y
+    marca del libro) y las filas ya codificadas con `encode_rows`.
+    """
+    state_bytes = json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    checksum = zlib.crc32(rows_block, zlib.crc32(state_bytes))
+    return _HEADER.pack(SESSION_MAGIC, SESSION_VERSION, checksum, len(state_bytes)) + state_bytes + rows_block
+
+
+def decode_session(data):
+    """
+    Inverso de `encode_session`: devuelve {"state", "rows", "fingerprints",
+    "manual", "strings"}. Lanza SessionSnapshotError si los bytes no son una
+    sesion de esta version o estan danados.
+    """
+    if len(data) < _HEADER.size:
+        raise SessionSnapshotError("Session snapshot is truncated")
+    magic, version, checksum, state_size = _HEADER.unpack_from(data)
+    if magic != SESSION_MAGIC:
+        raise SessionSnapshotError("Not a session snapshot")
+    if version != SESSION_VERSION:
+        raise SessionSnapshotError(f"Unsupported session snapshot version: {version}")
+    body = memoryview(data)[_HEADER.size:]
+    if zlib.crc32(body) != checksum:
+        raise SessionSnapshotError("Session snapshot checksum mismatch")
+    try:
+        state = json.loads(bytes(body[:state_size]).decode("utf-8"))
+        (meta_size,) = _ROWS_HEADER.unpack_from(body, state_size)
+        offset = state_size + _ROWS_HEADER.size
+        meta = json.loads(bytes(body[offset:offset + meta_size]).decode("utf-8"))
+        row_count = meta["row_count"]
+        manual_count = meta["manual_count"]
+        strings = meta["strings"]
+        packed = meta["packed_fingerprints"]
+        itemsize = meta["itemsize"]
+        byteorder = meta["byteorder"]
+    except (struct.error, UnicodeDecodeError, ValueError, KeyError, TypeError) as e:
+        raise SessionSnapshotError(f"Invalid session snapshot metadata: {e}") from e
+    if (
+        not isinstance(state, dict)
+        or not isinstance(strings, list)
+        or not all(isinstance(value, int) and value >= 0 for value in (row_count, manual_count))
+        or itemsize != array(_INDEX_TYPECODE).itemsize
+    ):
+        raise SessionSnapshotError("Invalid session snapshot metadata")
+    offset += meta_size
+    column_count = SESSION_COLUMNS if packed else SESSION_COLUMNS + 1
+    fingerprint_size = FINGERPRINT_BYTES * row_count if packed else 0
+    if len(body) != offset + itemsize * (row_count * column_count + manual_count) + fingerprint_size:
+        raise SessionSnapshotError("Session snapshot size does not match its metadata")
+
+    columns = []
+    for count in [row_count] * column_count + [manual_count]:
+        column = array(_INDEX_TYPECODE)
+        column.frombytes(body[offset:offset + count * itemsize])
+        if byteorder != sys.byteorder:
+            column.byteswap()
+        offset += count * itemsize
+        columns.append(column)
+    manual = columns.pop()
+    if any(column and max(column) >= len(strings) for column in columns) or (manual and max(manual) >= row_count):
+        raise SessionSnapshotError("Session snapshot references missing rows or strings")
+
+    values = [map(strings.__getitem__, column) for column in columns]
+    if packed:
+        hexed = body[offset:].hex()
+        width = 2 * FINGERPRINT_BYTES
+        fingerprints = [hexed[start:start + width] for start in range(0, len(hexed), width)]
+    else:
+        fingerprints = list(values.pop())
+    # Crear cien mil listas dispara el recolector de ciclos una y otra vez sin
+    # nada que liberar; se pausa mientras se arman las filas.
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        rows = list(map(list, zip(*values)))
+    finally:
+        if collecting:
+            gc.enable()
+    return {
+        "state": state,
+        "rows": rows,
+        "fingerprints": fingerprints,
+        "manual": list(manual),
+        "strings": strings,
+    }
+
+
+def _packed_fingerprints(fingerprints):
+    width = 2 * FINGERPRINT_BYTES
+    if not all(isinstance(fingerprint, str) and len(fingerprint) == width for fingerprint in fingerprints):
+        return None
+    joined = "".join(fingerprints)
+    try:
+        blob = bytes.fromhex(joined)
+    except ValueError:
+        return None
+    # bytes.hex() devuelve minusculas; solo se empaqueta si se recupera igual.
+    return blob if blob.hex() == joined else None
+
+
+def write_session(data, path=None):
+    path = os.fspath(path or default_session_path())
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def read_session(path=None):
+    """
+    Lee la sesion guardada. Devuelve None si no hay archivo y lanza
+    SessionSnapshotError si no se puede usar.
+    """
+    path = os.fspath(path or default_session_path())
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        raise SessionSnapshotError(f"Cannot read session snapshot: {e}") from e
+    return decode_session(data)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+import json
+import sqlite3
+from contextlib import closing
+from decimal import Decimal
+
+from tag_store import _json_default, _validate_and_migrate_tags
+
+
+SCHEMA_VERSION = 2
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tags (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tag_metadata (
+    tag_id INTEGER PRIMARY KEY REFERENCES tags(id) ON DELETE CASCADE,
+    planned_amount,
+    budget_type TEXT NOT NULL,
+    parent_category TEXT NOT NULL,
+    budget_period TEXT NOT NULL,
+    expense_nature TEXT,
+    financial_purpose TEXT,
+    rules TEXT
+);
+CREATE TABLE IF NOT EXISTS keywords (
+    tag_id INTEGER NOT NULL REFERENCES tags(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    keyword TEXT NOT NULL,
+    PRIMARY KEY (tag_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_tags_position ON tags(position);
+CREATE INDEX IF NOT EXISTS idx_keywords_keyword ON keywords(keyword COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_tag_metadata_parent ON tag_metadata(parent_category);
+"""
+
+
+def load_sqlite_tags(path):
+    """
+    Lee las etiquetas de la base SQLite en el mismo formato que `load_tags`.
+    """
+    with closing(_connect(path)) as conn:
+        tags = _read_tags(conn)
+    return _validate_and_migrate_tags(
+        {name: info for name, (_tag_id, _position, info) in tags.items()},
+        path=path,
+    )
+
+
+def save_sqlite_tags(tags, path):
+    """
+    Actualiza la base en una sola transaccion escribiendo solo las etiquetas,
+    metadatos y palabras clave que cambiaron. Devuelve el numero de filas
+    modificadas.
+    """
+    validated = _validate_and_migrate_tags(tags, path=path, allow_decimal=True)
+    with closing(_connect(path)) as conn:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            before = conn.total_changes
+            current = _read_tags(conn)
+            removed = [(tag_id,) for name, (tag_id, _position, _info) in current.items() if name not in validated]
+            conn.executemany("DELETE FROM tags WHERE id = ?", removed)
+
+            for position, (name, info) in enumerate(validated.items()):
+                metadata = _metadata_values(info)
+                keywords = list(info["keywords"])
+                existing = current.get(name)
+                if existing is None:
+                    tag_id = conn.execute(
+                        "INSERT INTO tags (name, position) VALUES (?, ?)",
+                        (name, position),
+                    ).lastrowid
+                    conn.execute(
+                        "INSERT INTO tag_metadata (tag_id, planned_amount, budget_type, parent_category, "
+                        "budget_period, expense_nature, financial_purpose, rules) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (tag_id, *metadata),
+                    )
+                    _insert_keywords(conn, tag_id, keywords)
+                    continue
+
+                tag_id, old_position, old_info = existing
+                if old_position != position:
+                    conn.execute("UPDATE tags SET position = ? WHERE id = ?", (position, tag_id))
+                if _metadata_values(old_info) != metadata:
+                    conn.execute(
+                        "UPDATE tag_metadata SET planned_amount = ?, budget_type = ?, parent_category = ?, "
+                        "budget_period = ?, expense_nature = ?, financial_purpose = ?, rules = ? WHERE tag_id = ?",
+                        (*metadata, tag_id),
+                    )
+                if old_info["keywords"] != keywords:
+                    # Solo se reescriben las posiciones desde el primer cambio.
+                    start = _common_prefix_length(old_info["keywords"], keywords)
+                    conn.execute("DELETE FROM keywords WHERE tag_id = ? AND position >= ?", (tag_id, start))
+                    _insert_keywords(conn, tag_id, keywords[start:], start)
+            return conn.total_changes - before
+
+
+def find_tags_by_keyword(keyword, path):
+    """
+    Devuelve las etiquetas que tienen la palabra clave, sin distinguir mayusculas.
+    """
+    with closing(_connect(path)) as conn:
+        rows = conn.execute(
+            "SELECT DISTINCT tags.name, tags.position FROM keywords "
+            "JOIN tags ON tags.id = keywords.tag_id "
+            "WHERE keywords.keyword = ? COLLATE NOCASE ORDER BY tags.position",
+            (keyword,),
+        ).fetchall()
+    return [name for name, _position in rows]
+
+
+def _connect(path):
+    conn = sqlite3.connect(str(path))
+    conn.execute("PRAGMA foreign_keys = ON")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < SCHEMA_VERSION:
+        with conn:
+            if version == 1:
+                conn.execute("ALTER TABLE tag_metadata ADD COLUMN rules TEXT")
+            conn.executescript(SCHEMA)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return conn
+
+
+def _read_tags(conn):
+    tags = {}
+    by_id = {}
+    rows = conn.execute(
+        "SELECT tags.id, tags.name, tags.position, planned_amount, budget_type, parent_category, "
+        "budget_period, expense_nature, financial_purpose, rules "
+        "FROM tags JOIN tag_metadata ON tag_metadata.tag_id = tags.id ORDER BY tags.position, tags.id"
+    )
+    for tag_id, name, position, planned_amount, budget_type, parent_category, period, nature, purpose, rules in rows:
+        info = {
+            "keywords": [],
+            "limit": planned_amount,
+            "budget_type": budget_type,
+            "parent_category": parent_category,
+            "budget_period": period,
+            "planned_amount": planned_amount,
+            "expense_nature": nature,
+            "financial_purpose": purpose,
+        }
+        if rules:
+            info["rules"] = json.loads(rules)
+        tags[name] = (tag_id, position, info)
+        by_id[tag_id] = info
+    for tag_id, keyword in conn.execute("SELECT tag_id, keyword FROM keywords ORDER BY tag_id, position"):
+        by_id[tag_id]["keywords"].append(keyword)
+    return tags
+
+
+def _metadata_values(info):
+    planned_amount = info["planned_amount"]
+    if isinstance(planned_amount, Decimal):
+        planned_amount = _json_default(planned_amount)
+    return (
+        planned_amount,
+        info["budget_type"],
+        info["parent_category"],
+        info["budget_period"],
+        info["expense_nature"],
+        info["financial_purpose"],
+        json.dumps(info["rules"], ensure_ascii=False, default=_json_default) if info.get("rules") else None,
+    )
+
+
+def _common_prefix_length(old, new):
+    length = 0
+    for old_item, new_item in zip(old, new):
+        if old_item != new_item:
+            break
+        length += 1
+    return length
+
+
+def _insert_keywords(conn, tag_id, keywords, start=0):
+    conn.executemany(
+        "INSERT INTO keywords (tag_id, position, keyword) VALUES (?, ?, ?)",
+        ((tag_id, position, keyword) for position, keyword in enumerate(keywords, start)),
+    )
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+import os
+import subprocess
+import sys
+import time
+
+from lazy_import import IMPORT_TIMINGS
+
+
+STARTUP_REPORT_FLAG = "--startup-report"
+DEFERRED_MODULES = (
+    "matplotlib",
+    "matplotlib.pyplot",
+    "matplotlib.backends.backend_tkagg",
+    "pypdf",
+)
+IMPORT_BREAKDOWN_LIMIT = 12
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_importtime(stderr_text, depth=0):
+    """
+    Convierte la salida de `python -X importtime` en {modulo: segundos acumulados}
+    para los modulos importados al nivel de anidamiento indicado.
+    """
+    timings = {}
+    for line in stderr_text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        _self_us, cumulative_us, package = parts
+        try:
+            cumulative = int(cumulative_us.strip()) / 1_000_000
+        except ValueError:
+            continue
+        name = package.rstrip()
+        indent = len(name) - len(name.lstrip())
+        if depth is not None and (indent - 1) // 2 != depth:
+            continue
+        timings[name.strip()] = cumulative
+    return timings
+
+
+def measure_import_breakdown(module_name="purchase_tagger_app", executable=None, timeout=60, cwd=APP_DIR):
+    """
+    Importa el modulo en un proceso aparte con `-X importtime` desde la
+    carpeta de la app. Lanza RuntimeError si ese proceso falla.
+    """
+    if getattr(sys, "frozen", False) and executable is None:
+        return []
+    result = subprocess.run(
+        [executable or sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+        cwd=cwd,
+    )
+    if result.returncode != 0:
+        error_lines = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        detail = error_lines[-1] if error_lines else f"exit code {result.returncode}"
+        raise RuntimeError(f"import {module_name} failed: {detail}")
+    timings = parse_importtime(result.stderr, depth=1)
+    return sorted(timings.items(), key=lambda item: (-item[1], item[0]))
+
+
+def collect_startup_report(app_factory, started, breakdown=None):
+    """
+    Mide la ventana hasta su primer cuadro y la cierra con `on_close`, como al
+    cerrarla a mano. El desglose de importaciones se toma despues, para que su
+    proceso aparte no se sume a los tiempos de la ventana.
+    """
+    imports_finished = time.perf_counter()
+    app = app_factory()
+    try:
+        app.update()
+        first_frame = time.perf_counter()
+    finally:
+        app.on_close()
+    deferred_loaded = [name for name in DEFERRED_MODULES if name in sys.modules]
+    breakdown_error = None
+    if breakdown is None:
+        try:
+            breakdown = measure_import_breakdown()
+        except (OSError, RuntimeError, subprocess.SubprocessError) as e:
+            breakdown, breakdown_error = [], str(e)
+    return {
+        "import_seconds": imports_finished - started,
+        "time_to_first_frame": first_frame - started,
+        "window_seconds": first_frame - imports_finished,
+        "deferred_loaded": deferred_loaded,
+        "lazy_imports": dict(IMPORT_TIMINGS),
+        "import_breakdown": list(breakdown),
+        "import_breakdown_error": breakdown_error,
+    }
+
+
+def format_startup_report(report, limit=IMPORT_BREAKDOWN_LIMIT):
+    lines = [
+        "Reporte de inicio",
+        f"  Importaciones: {report['import_seconds'] * 1000:.1f} ms",
+        f"  Ventana inicial: {report['window_seconds'] * 1000:.1f} ms",
+        f"  Tiempo al primer cuadro: {report['time_to_first_frame'] * 1000:.1f} ms",
+    ]
+    deferred = report["deferred_loaded"]
+    lines.append(f"  Modulos diferidos cargados: {', '.join(deferred) if deferred else 'ninguno'}")
+    for name, seconds in sorted(report["lazy_imports"].items()):
+        lines.append(f"  Carga diferida {name}: {seconds * 1000:.1f} ms")
+    if report.get("import_breakdown_error"):
+        lines.append(f"  Desglose de importaciones no disponible: {report['import_breakdown_error']}")
+    breakdown = report["import_breakdown"][:limit]
+    if breakdown:
+        lines.append("Desglose de importaciones (acumulado)")
+        for name, seconds in breakdown:
+            lines.append(f"  {name:<40} {seconds * 1000:8.1f} ms")
+    return "\n".join(lines)
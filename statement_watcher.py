@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from ledger import PurchaseLedger, default_ledger_path, file_sha256
+from money import format_amount
+from purchase_extractor import (
+    ACCOUNT_TYPE_CREDIT,
+    BANK_BAC,
+    PARSER_REGISTRY,
+    PARSER_VERSION,
+    process_purchases,
+)
+from tag_rules import tags_version
+from tag_store import load_tags
+
+
+WATCH_FOLDER_ENV = "PURCHASE_TAGGER_WATCH_FOLDER"
+WATCH_EXTENSIONS = (".pdf", ".html", ".htm", ".xls")
+WATCH_INTERVAL_SECONDS = 30
+WATCH_SETTLE_SECONDS = 2.0
+WATCH_MAX_WORKERS = 2
+
+
+def configured_watch_folder():
+    folder = os.environ.get(WATCH_FOLDER_ENV, "").strip()
+    return Path(folder) if folder else None
+
+
+def _extract_rows(path, bank, account_type):
+    started = time.perf_counter()
+    rows = [
+        [date, description, format_amount(amount), currency, tag]
+        for date, description, amount, currency, tag, _ in process_purchases(path, bank=bank, account_type=account_type)
+    ]
+    return rows, time.perf_counter() - started
+
+
+class StatementWatcher:
+    """
+    Vigila una carpeta de estados de cuenta y agrega al libro solo los archivos
+    nuevos o modificados. Los cambios se detectan por (mtime, tamano) sin leer
+    el contenido; un archivo se procesa cuando lleva `settle_seconds` sin
+    cambiar, para no leer descargas a medio escribir. El avance se guarda en el
+    libro, de modo que al reiniciar no se vuelve a procesar nada.
+
+    `ledger` solo se usa desde el hilo que llama a `poll`/`submit_ready`/
+    `collect`; la extraccion corre en un grupo acotado de hilos.
+    """
+
+    def __init__(
+        self,
+        folder,
+        ledger,
+        bank=BANK_BAC,
+        account_type=ACCOUNT_TYPE_CREDIT,
+        max_workers=WATCH_MAX_WORKERS,
+        settle_seconds=WATCH_SETTLE_SECONDS,
+        clock=time.time,
+    ):
+        if (bank, account_type) not in PARSER_REGISTRY:
+            raise ValueError(f"Unsupported bank/account type: {bank} {account_type}")
+        self.folder = Path(folder)
+        self.ledger = ledger
+        self.bank = bank
+        self.account_type = account_type
+        self.settle_seconds = settle_seconds
+        self.clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="statement-watch")
+        self._observed = {}
+        self._failed = {}
+        self._in_flight = {}
+        self._errors = []
+        self._progress = None
+
+    def scan(self):
+        """
+        Devuelve [(ruta, (mtime_ns, tamano))] de los archivos listos para
+        procesar: nuevos o modificados desde la ultima vez y ya estables.
+        """
+        if self._progress is None:
+            self._progress = self.ledger.watched_files()
+        now = self.clock()
+        ready = []
+        seen = set()
+        try:
+            entries = sorted(os.scandir(self.folder), key=lambda entry: entry.name)
+        except FileNotFoundError:
+            return ready
+        for entry in entries:
+            if not entry.is_file() or not entry.name.lower().endswith(WATCH_EXTENSIONS):
+                continue
+            path = entry.path
+            seen.add(path)
+            try:
+                stat = entry.stat()
+            except OSError:
+                # Se borro o movio entre el listado y la lectura.
+                continue
+            key = (stat.st_mtime_ns, stat.st_size)
+            if self._progress.get(path) == key or self._failed.get(path) == key or path in self._in_flight:
+                continue
+            previous = self._observed.get(path)
+            self._observed[path] = key
+            if previous not in (None, key) or now - stat.st_mtime_ns / 1e9 < self.settle_seconds:
+                continue
+            ready.append((path, key))
+        for path in set(self._observed) - seen:
+            del self._observed[path]
+        return ready
+
+    def submit_ready(self):
+        """
+        Envia los archivos listos a calcular su hash en el grupo de hilos;
+        `collect` decide despues si hay que extraerlos. Si no se puede leer la
+        carpeta o el libro, el error sale en el siguiente `collect`. Devuelve
+        cuantos archivos se enviaron.
+        """
+        try:
+            ready = self.scan()
+        except (OSError, sqlite3.Error) as e:
+            self._errors.append((self.folder.name or str(self.folder), str(e)))
+            return 0
+        for path, key in ready:
+            self._in_flight[path] = (key, None, self._executor.submit(file_sha256, path))
+        return len(ready)
+
+    def collect(self, wait=False):
+        """
+        Atiende los trabajos terminados. Un archivo que el libro ya conoce con
+        el mismo parser solo se marca como visto; uno nuevo pasa a extraccion
+        y, al terminar, se registra en el libro. Con `wait=True` espera a todos
+        los pendientes. Devuelve un resumen con archivos, compras nuevas,
+        duplicadas, archivos tomados del registro, errores [(archivo, mensaje)]
+        y las filas agregadas al libro en "new_rows" [(huella, fila)].
+
+        Un archivo que falla (borrado o bloqueado a medio descargar, ilegible,
+        etiquetas o libro con error) no se reintenta hasta que cambie.
+        """
+        summary = {"files": 0, "inserted": 0, "duplicates": 0, "served": 0, "errors": self._errors, "new_rows": []}
+        self._errors = []
+        while True:
+            for path, (key, source_hash, future) in list(self._in_flight.items()):
+                if not wait and not future.done():
+                    continue
+                del self._in_flight[path]
+                try:
+                    self._collect_file(path, key, source_hash, future, summary)
+                except Exception as e:
+                    self._failed[path] = key
+                    summary["errors"].append((os.path.basename(path), str(e)))
+            if not wait or not self._in_flight:
+                return summary
+
+    def _collect_file(self, path, key, source_hash, future, summary):
+        if source_hash is None:
+            source_hash = future.result()
+            if self.ledger.current_statement(source_hash, self.bank, self.account_type, PARSER_VERSION) is not None:
+                self._mark_done(path, key, source_hash)
+                summary["served"] += 1
+                return
+            future = self._executor.submit(_extract_rows, path, self.bank, self.account_type)
+            self._in_flight[path] = (key, source_hash, future)
+            return
+        rows, elapsed = future.result()
+        current_tags_version = tags_version(load_tags())
+        result = self.ledger.record_statement(
+            source_hash,
+            os.path.basename(path),
+            self.bank,
+            self.account_type,
+            rows,
+            parser_version=PARSER_VERSION,
+            tags_version=current_tags_version,
+            extraction_seconds=elapsed,
+        )
+        self._mark_done(path, key, source_hash)
+        summary["files"] += 1
+        summary["inserted"] += result["inserted"]
+        summary["duplicates"] += result["duplicates"]
+        summary["new_rows"].extend(result["new_rows"])
+
+    def poll(self):
+        self.submit_ready()
+        return self.collect(wait=True)
+
+    @property
+    def pending(self):
+        return len(self._in_flight)
+
+    def close(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        self._in_flight.clear()
+
+    def _mark_done(self, path, key, source_hash):
+        self.ledger.mark_watched(path, key[0], key[1], source_hash)
+        self._progress[path] = key
+        self._observed.pop(path, None)
+        self._failed.pop(path, None)
+
+
+def format_watch_summary(summary):
+    message = f"{summary['files']} archivo(s) nuevo(s): {summary['inserted']} compras agregadas"
+    if summary["duplicates"]:
+        message += f"; {summary['duplicates']} duplicada(s) omitida(s)"
+    if summary["served"]:
+        message += f"; {summary['served']} archivo(s) tomado(s) del registro"
+    if summary["errors"]:
+        message += f"; {len(summary['errors'])} con error"
+    return message
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vigila una carpeta de estados de cuenta y los agrega al historial.")
+    parser.add_argument("folder", nargs="?", default=configured_watch_folder())
+    parser.add_argument("--bank", default=BANK_BAC)
+    parser.add_argument("--account-type", default=ACCOUNT_TYPE_CREDIT)
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL_SECONDS)
+    parser.add_argument("--workers", type=int, default=WATCH_MAX_WORKERS)
+    parser.add_argument("--ledger", default=None)
+    parser.add_argument("--once", action="store_true", help="Procesa lo pendiente y termina.")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    if args.folder is None:
+        parser.error(f"indique la carpeta o defina {WATCH_FOLDER_ENV}")
+
+    ledger = PurchaseLedger(args.ledger or default_ledger_path())
+    watcher = StatementWatcher(
+        args.folder,
+        ledger,
+        bank=args.bank,
+        account_type=args.account_type,
+        max_workers=args.workers,
+    )
+    try:
+        while True:
+            summary = watcher.poll()
+            if summary["files"] or summary["served"] or summary["errors"]:
+                print(format_watch_summary(summary), flush=True)
+            for name, error in summary["errors"]:
+                print(f"  {name}: {error}", file=sys.stderr, flush=True)
+            if args.once:
+                return 1 if summary["errors"] else 0
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        watcher.close()
+        ledger.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
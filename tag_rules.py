@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import re
+import sys
+import time
+from collections import OrderedDict, deque
+from decimal import Decimal
+
+from money import parse_amount
+
+
+RULE_TYPES = ("keyword", "token", "regex")
+RULE_CONDITION_FIELDS = ("currency", "min_amount", "max_amount")
+MATCHER_CACHE_SIZE = 8
+
+_MATCHER_CACHE = OrderedDict()
+
+
+def rule_has_conditions(rule):
+    return any(rule.get(field) is not None for field in RULE_CONDITION_FIELDS)
+
+
+def compile_rule(rule):
+    """
+    Compila una regla para buscarla sobre la descripcion en mayusculas.
+    """
+    pattern = rule["pattern"]
+    if rule["type"] == "keyword":
+        return re.compile(re.escape(pattern.upper()))
+    if rule["type"] == "token":
+        return re.compile(rf"(?<!\w){re.escape(pattern.upper())}(?!\w)")
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def rule_conditions_match(rule, amount=None, currency=None):
+    expected_currency = rule.get("currency")
+    if expected_currency is not None:
+        if currency is None or str(currency).strip().upper() != expected_currency.strip().upper():
+            return False
+    min_amount = rule.get("min_amount")
+    max_amount = rule.get("max_amount")
+    if min_amount is None and max_amount is None:
+        return True
+    if amount is None:
+        return False
+    try:
+        value = abs(parse_amount(amount))
+    except ValueError:
+        return False
+    if min_amount is not None and value < Decimal(str(min_amount)):
+        return False
+    if max_amount is not None and value > Decimal(str(max_amount)):
+        return False
+    return True
+
+
+def rule_matches(rule, description, amount=None, currency=None):
+    return rule_conditions_match(rule, amount, currency) and compile_rule(rule).search(description.upper()) is not None
+
+
+class TagMatcher:
+    """
+    Matcher combinado para todas las etiquetas. Las palabras clave y los tokens
+    sin condiciones se buscan juntos con un automata Aho-Corasick, de modo que el
+    costo depende del largo de la descripcion y no de cuantas palabras clave
+    existan. Las expresiones regulares y las reglas con monto o moneda se
+    evaluan despues, solo para etiquetas con mayor prioridad que el mejor
+    resultado. La prioridad es el orden de las etiquetas, igual que en
+    `tag_purchase`.
+    """
+
+    def __init__(self, tags, natag="N/A"):
+        self.natag = natag
+        self.tag_names = list(tags)
+        self.has_conditions = False
+        self._goto = [{}]
+        self._keyword_priority = [None]
+        self._token_outputs = [()]
+        self._pattern_rules = []
+
+        for priority, info in enumerate(tags.values()):
+            for keyword in info.get("keywords", ()):
+                self._add_literal(keyword.upper(), priority)
+            for rule in info.get("rules", ()):
+                if rule_has_conditions(rule):
+                    self.has_conditions = True
+                elif rule["type"] == "keyword":
+                    self._add_literal(rule["pattern"].upper(), priority)
+                    continue
+                elif rule["type"] == "token":
+                    self._add_literal(rule["pattern"].upper(), priority, token=True)
+                    continue
+                self._pattern_rules.append((priority, compile_rule(rule), rule))
+        self._pattern_rules.sort(key=lambda entry: entry[0])
+        self._build_failure_links()
+
+    def match(self, description, amount=None, currency=None):
+        text = description.upper()
+        best = self._literal_priority(text)
+        for priority, regex, rule in self._pattern_rules:
+            if best is not None and priority >= best:
+                break
+            if rule_conditions_match(rule, amount, currency) and regex.search(text):
+                best = priority
+                break
+        return self.natag if best is None else self.tag_names[best]
+
+    def _add_literal(self, literal, priority, token=False):
+        state = 0
+        for char in literal:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._keyword_priority.append(None)
+                self._token_outputs.append(())
+            state = next_state
+        if token:
+            self._token_outputs[state] += ((len(literal), priority),)
+        elif self._keyword_priority[state] is None or priority < self._keyword_priority[state]:
+            self._keyword_priority[state] = priority
+
+    def _build_failure_links(self):
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                link = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = link if link != next_state else 0
+                # Cada estado hereda las salidas de su enlace de falla.
+                inherited = self._keyword_priority[self._fail[next_state]]
+                own = self._keyword_priority[next_state]
+                if inherited is not None and (own is None or inherited < own):
+                    self._keyword_priority[next_state] = inherited
+                self._token_outputs[next_state] += self._token_outputs[self._fail[next_state]]
+
+    def _literal_priority(self, text):
+        goto = self._goto
+        fail = self._fail
+        keyword_priority = self._keyword_priority
+        token_outputs = self._token_outputs
+        best = keyword_priority[0]
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            priority = keyword_priority[state]
+            if priority is not None and (best is None or priority < best):
+                best = priority
+                if best == 0:
+                    return best
+            for length, token_priority in token_outputs[state]:
+                if (best is None or token_priority < best) and _is_whole_word(text, end - length, end):
+                    best = token_priority
+        return best
+
+
+def compile_tag_rules(tags, natag="N/A"):
+    """
+    Devuelve el matcher combinado para esta version de las etiquetas,
+    reutilizandolo mientras su contenido no cambie.
+    """
+    key = (tags_version(tags), natag)
+    matcher = _MATCHER_CACHE.get(key)
+    if matcher is None:
+        matcher = TagMatcher(tags, natag)
+        _MATCHER_CACHE[key] = matcher
+        if len(_MATCHER_CACHE) > MATCHER_CACHE_SIZE:
+            _MATCHER_CACHE.popitem(last=False)
+    else:
+        _MATCHER_CACHE.move_to_end(key)
+    return matcher
+
+
+def tags_version(tags):
+    encoded = json.dumps(tags, ensure_ascii=False, default=str, separators=(",", ":"))
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+def benchmark_tag_matching(tags, descriptions, repeat=3):
+    """
+    Compara el recorrido de subcadenas de `tag_purchase` contra `TagMatcher`
+    sobre las mismas descripciones. Devuelve el mejor tiempo de cada uno.
+    """
+    from tag_store import tag_purchase
+
+    started = time.perf_counter()
+    matcher = TagMatcher(tags)
+    compile_seconds = time.perf_counter() - started
+
+    def best_of(run):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            results = run()
+            timings.append(time.perf_counter() - started)
+        return min(timings), results
+
+    loop_seconds, expected = best_of(lambda: [tag_purchase(description, tags) for description in descriptions])
+    matcher_seconds, actual = best_of(lambda: [matcher.match(description) for description in descriptions])
+    return {
+        "descriptions": len(descriptions),
+        "keywords": sum(len(info.get("keywords", ())) for info in tags.values()),
+        "compile_seconds": compile_seconds,
+        "loop_seconds": loop_seconds,
+        "matcher_seconds": matcher_seconds,
+        "same_results": expected == actual,
+    }
+
+
+def synthetic_tag_library(tag_count, keywords_per_tag):
+    return {
+        f"Tag {tag_index}": {
+            "keywords": [f"MERCHANT {tag_index:04d}-{keyword_index:02d}" for keyword_index in range(keywords_per_tag)],
+        }
+        for tag_index in range(tag_count)
+    }
+
+
+def _is_whole_word(text, start, end):
+    before = text[start - 1] if start > 0 else ""
+    after = text[end] if end < len(text) else ""
+    return not _is_word_char(before) and not _is_word_char(after)
+
+
+def _is_word_char(char):
+    return bool(char) and (char.isalnum() or char == "_")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    tag_count = int(argv[0]) if argv else 500
+    tags = synthetic_tag_library(tag_count, 20)
+    descriptions = [f"POS MERCHANT {index % (tag_count * 2):04d}-{index % 25:02d} SAN JOSE" for index in range(2000)]
+    report = benchmark_tag_matching(tags, descriptions)
+    print(f"Palabras clave: {report['keywords']}, descripciones: {report['descriptions']}")
+    print(f"  Compilacion: {report['compile_seconds'] * 1000:.1f} ms")
+    print(f"  Recorrido de subcadenas: {report['loop_seconds'] * 1000:.1f} ms")
+    print(f"  Matcher combinado: {report['matcher_seconds'] * 1000:.1f} ms")
+    print(f"  Mismos resultados: {'si' if report['same_results'] else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
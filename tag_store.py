@@ -1,14 +1,26 @@
 #!/usr/bin/env python3
+import atexit
+import hashlib
 import json
+import math
 import os
 import shutil
 import sys
 import tempfile
+import threading
+import time
+import re
 from decimal import Decimal
 from pathlib import Path
 
+from tag_rules import RULE_TYPES, rule_matches
+
 
 TAG_FILENAME = 'tags.json'
+TAG_DB_FILENAME = 'tags.sqlite3'
+TAG_BACKEND_ENV = 'PURCHASE_TAGGER_TAG_BACKEND'
+TAG_BACKENDS = ("json", "sqlite")
+SQLITE_SUFFIXES = (".sqlite3", ".sqlite", ".db")
 APP_NAME = 'PurchaseTagger'
 BUDGET_TYPES = ("Expense", "Savings", "Debt", "Donation", "Investment", "Income")
 BUDGET_PERIODS = ("monthly", "annual", "weekly", "one-time")
@@ -23,12 +35,31 @@ TAG_METADATA_FIELDS = (
     "expense_nature",
     "financial_purpose",
 )
+DEFAULT_SAVE_DELAY = 0.75
+JOURNAL_SUFFIX = ".journal"
+JOURNAL_COMPACT_BYTES = 64 * 1024
+IMPORT_CHUNK_SIZE = 64 * 1024
+MERGE_PROGRESS_EVERY = 250
+_LOAD_CACHE = {}
+_LOAD_CACHE_LOCK = threading.Lock()
 
 
 def default_tag_file_path():
+    filename = TAG_DB_FILENAME if tag_backend() == "sqlite" else TAG_FILENAME
     if getattr(sys, 'frozen', False):
-        return _user_config_dir() / TAG_FILENAME
-    return _source_tag_file_path()
+        return _user_config_dir() / filename
+    return _source_tag_file_path().with_name(filename)
+
+
+def tag_backend():
+    """
+    Backend de la biblioteca activa segun PURCHASE_TAGGER_TAG_BACKEND
+    ("json" por defecto o "sqlite").
+    """
+    backend = os.environ.get(TAG_BACKEND_ENV, "json").strip().lower() or "json"
+    if backend not in TAG_BACKENDS:
+        raise ValueError(f"{TAG_BACKEND_ENV} must be one of {', '.join(TAG_BACKENDS)}")
+    return backend
 
 def load_tags(path=None):
     """
@@ -37,18 +68,25 @@ def load_tags(path=None):
     """
     custom_path = path is not None
     path = _resolve_tag_file_path(path)
+    if _is_sqlite_path(path):
+        if not path.exists():
+            _migrate_json_tags_to_sqlite(path, copy_bundled=not custom_path)
+        tags, _journal_size, _journal_clean = _cached_journaled_tags(path)
+        return _copy_tags(tags)
     if not path.exists():
         if not custom_path:
             _copy_bundled_default_tags(path)
         if not path.exists():
             save_tags({}, path)
-    with open(path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    return _validate_and_migrate_tags(data, path=path)
+    tags, _journal_size, _journal_clean = _cached_journaled_tags(path)
+    return _copy_tags(tags)
 
 
 def save_tags(tags, path=None):
     path = _resolve_tag_file_path(path)
+    if _is_sqlite_path(path):
+        _save_sqlite_tags(tags, path)
+        return
     validated = _validate_and_migrate_tags(tags, path=path, allow_decimal=True)
     path.parent.mkdir(parents=True, exist_ok=True)
 
@@ -77,25 +115,209 @@ def save_tags(tags, path=None):
             tmp_path.unlink()
         raise
 
+    # El diario pertenecia a la instantanea anterior: viaja con el respaldo.
+    journal_path = _journal_path(path)
+    backup_journal_path = _journal_path(_backup_path(path))
+    if journal_path.exists():
+        os.replace(journal_path, backup_journal_path)
+    elif backup_journal_path.exists():
+        backup_journal_path.unlink()
+    clear_tag_cache(path)
+
+
+def save_tag_changes(tags, path=None, compact_bytes=JOURNAL_COMPACT_BYTES):
+    """
+    Guarda solo las diferencias respecto al estado actual como registros en el
+    diario junto a tags.json. Cuando el diario superaria `compact_bytes`, o el
+    cambio no se puede expresar como registros, se compacta en una instantanea
+    nueva con `save_tags`.
+    """
+    path = _resolve_tag_file_path(path)
+    if _is_sqlite_path(path):
+        _save_sqlite_tags(tags, path)
+        return
+    validated = _validate_and_migrate_tags(tags, path=path, allow_decimal=True)
+    # Se compara en forma JSON para que los Decimal no generen registros espurios.
+    target = json.loads(json.dumps(validated, default=_json_default))
+    if not path.exists():
+        save_tags(target, path)
+        return
+
+    current, journal_size, journal_clean = _cached_journaled_tags(path)
+    records = _tag_change_records(current, target)
+    if not records:
+        return
+    if not journal_clean or not _replays_to(current, records, target, path):
+        save_tags(target, path)
+        return
+
+    lines = [json.dumps(record, ensure_ascii=False, default=_json_default) + "\n" for record in records]
+    if (journal_size or 0) + sum(len(line.encode('utf-8')) for line in lines) > compact_bytes:
+        save_tags(target, path)
+        return
 
-def merge_tags(current_tags, imported_tags):
+    journal_path = _journal_path(path)
+    if journal_size is None:
+        header = {"op": "snapshot", "sha256": _file_digest(path)}
+        lines.insert(0, json.dumps(header) + "\n")
+        mode = 'w'
+    else:
+        mode = 'a'
+    with open(journal_path, mode, encoding='utf-8') as f:
+        f.writelines(lines)
+        f.flush()
+        os.fsync(f.fileno())
+    clear_tag_cache(path)
+
+
+def tag_file_signature(path=None):
+    """
+    Firma barata de la biblioteca en disco: (mtime_ns, tamano, inodo) del
+    archivo y de su diario. Cambia cada vez que se guarda una edicion.
+    """
+    return _tag_file_signature(_resolve_tag_file_path(path))
+
+
+def clear_tag_cache(path=None):
+    """
+    Descarta las etiquetas validadas en cache para `path`, o todas si no se indica.
+    """
+    with _LOAD_CACHE_LOCK:
+        if path is None:
+            _LOAD_CACHE.clear()
+        else:
+            _LOAD_CACHE.pop(_cache_key(path), None)
+
+
+class WriteBehindTagSaver:
+    """
+    Agrupa rafagas de cambios de etiquetas en una sola escritura con
+    `save_tags` despues de un periodo sin cambios. La validacion ocurre al
+    programar el guardado; la escritura conserva el reemplazo atomico y el
+    respaldo .bak de `save_tags`.
+    """
+
+    def __init__(self, path=None, delay=DEFAULT_SAVE_DELAY, writer=None):
+        self.path = path
+        self.delay = delay
+        self.writes = 0
+        self._writer = writer or save_tags
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._pending = None
+        self._deadline = 0.0
+        self._error = None
+        self._thread = None
+
+    @property
+    def pending(self):
+        with self._condition:
+            return self._pending is not None
+
+    def schedule(self, tags):
+        validated = _validate_and_migrate_tags(tags, path=_resolve_tag_file_path(self.path), allow_decimal=True)
+        snapshot = _copy_tags(validated)
+        with self._condition:
+            self._pending = snapshot
+            self._deadline = time.monotonic() + self.delay
+            self._ensure_worker()
+            self._condition.notify()
+
+    def flush(self):
+        """
+        Escribe de inmediato el cambio pendiente y relanza el ultimo error de
+        escritura en segundo plano, si lo hubo.
+        """
+        self._write_pending()
+        with self._condition:
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if self._thread is None:
+            atexit.register(self._flush_at_exit)
+        self._thread = threading.Thread(target=self._run, name="tag-write-behind", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None:
+                    self._condition.wait()
+                remaining = self._deadline - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(None if remaining == math.inf else remaining)
+                    continue
+            self._write_pending()
+
+    def _write_pending(self):
+        with self._write_lock:
+            with self._condition:
+                tags, self._pending = self._pending, None
+            if tags is None:
+                return
+            try:
+                if self.path is None:
+                    self._writer(tags)
+                else:
+                    self._writer(tags, self.path)
+            except Exception as exc:
+                with self._condition:
+                    self._error = exc
+                    if self._pending is None:
+                        # Se reintenta en el proximo flush o cambio, no en bucle.
+                        self._pending = tags
+                        self._deadline = math.inf
+                return
+            with self._condition:
+                self.writes += 1
+                self._error = None
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+
+def merge_tags(current_tags, imported_tags, progress=None):
+    """
+    Combina etiquetas importadas con las actuales. `imported_tags` puede ser un
+    dict o un iterable de pares (tag, valor), como el de `iter_tag_file_items`;
+    cada etiqueta se valida al llegar. `progress(procesadas)` se invoca cada
+    MERGE_PROGRESS_EVERY etiquetas y al terminar.
+    """
     current = _validate_and_migrate_tags(current_tags, allow_decimal=True)
-    imported = _validate_and_migrate_tags(imported_tags, allow_decimal=True)
-    merged = {tag: _copy_tag_info(info) for tag, info in current.items()}
+    merged = _copy_tags(current)
+    keyword_sets = {}
     counts = {"tags_added": 0, "keywords_added": 0, "limits_updated": 0, "metadata_updated": 0}
+    items = imported_tags.items() if hasattr(imported_tags, "items") else imported_tags
 
-    for tag, info in imported.items():
-        imported_keywords = list(info.get("keywords", []))
+    processed = 0
+    for tag, value in items:
+        info = _validate_and_migrate_tags({tag: value}, allow_decimal=True)[tag]
+        processed += 1
+        if progress is not None and processed % MERGE_PROGRESS_EVERY == 0:
+            progress(processed)
+
+        imported_keywords = info.get("keywords", [])
         if tag not in merged:
             merged[tag] = _copy_tag_info(info)
             counts["tags_added"] += 1
             counts["keywords_added"] += len(imported_keywords)
             continue
 
-        existing_keywords = merged[tag].setdefault("keywords", [])
+        existing_keywords = merged[tag]["keywords"]
+        known_keywords = keyword_sets.get(tag)
+        if known_keywords is None:
+            known_keywords = keyword_sets[tag] = set(existing_keywords)
         for keyword in imported_keywords:
-            if keyword not in existing_keywords:
+            if keyword not in known_keywords:
                 existing_keywords.append(keyword)
+                known_keywords.add(keyword)
                 counts["keywords_added"] += 1
 
         imported_limit = info.get("planned_amount", info.get("limit", 0))
@@ -111,9 +333,113 @@ def merge_tags(current_tags, imported_tags):
                 counts["metadata_updated"] += 1
                 merged[tag][field] = info.get(field)
 
+        existing_rules = merged[tag].get("rules", [])
+        new_rules = [rule for rule in info.get("rules", ()) if rule not in existing_rules]
+        if new_rules:
+            merged[tag]["rules"] = existing_rules + new_rules
+            counts["metadata_updated"] += 1
+
+    if progress is not None and processed % MERGE_PROGRESS_EVERY:
+        progress(processed)
     return merged, counts
 
 
+def iter_tag_file_items(path, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Lee un archivo JSON de etiquetas por bloques y produce pares (tag, valor)
+    validados sin cargar el documento completo en memoria.
+    """
+    path = Path(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = _IncrementalJsonReader(f, chunk_size)
+        if reader.next_char() != "{":
+            _raise_invalid(path, "expected an object mapping tag names to tag settings")
+        reader.advance()
+        if reader.next_char() == "}":
+            reader.advance()
+        else:
+            while True:
+                tag = reader.decode()
+                if not isinstance(tag, str):
+                    _raise_invalid(path, "tag names must be non-empty strings")
+                reader.expect(":")
+                value = reader.decode()
+                yield tag, _validate_and_migrate_tags({tag: value}, path=path)[tag]
+                separator = reader.next_char()
+                reader.advance()
+                if separator == "}":
+                    break
+                if separator != ",":
+                    raise json.JSONDecodeError("Expecting ',' delimiter", reader.buffer, reader.position - 1)
+        if reader.next_char() != "":
+            raise json.JSONDecodeError("Extra data", reader.buffer, reader.position)
+
+
+class _IncrementalJsonReader:
+    """
+    Decodifica valores JSON consecutivos de un archivo leyendo solo los bloques
+    necesarios.
+    """
+
+    def __init__(self, handle, chunk_size):
+        self.handle = handle
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+
+    def next_char(self):
+        """
+        Salta espacios y devuelve el siguiente caracter sin consumirlo, o "" al final.
+        """
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in " \t\n\r":
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._read_more():
+                return ""
+
+    def advance(self):
+        self.position += 1
+
+    def expect(self, char):
+        found = self.next_char()
+        if found != char:
+            raise json.JSONDecodeError(f"Expecting {char!r} delimiter", self.buffer, self.position)
+        self.advance()
+
+    def decode(self):
+        self.next_char()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if not self._read_more():
+                    raise
+                continue
+            # Un numero al final del bloque podria continuar en el siguiente.
+            if end == len(self.buffer) and self._read_more():
+                continue
+            self.position = end
+            return value
+
+    def _read_more(self):
+        if self.eof:
+            return False
+        if self.position > self.chunk_size:
+            self.buffer = self.buffer[self.position:]
+            self.position = 0
+        # Crece al menos al doble del valor pendiente para evitar relecturas cuadraticas.
+        chunk = self.handle.read(max(self.chunk_size, len(self.buffer) - self.position))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer += chunk
+        return True
+
+
 def default_tag_info(tag, keywords=None, planned_amount=0):
     return _default_tag_info(tag, keywords=keywords, planned_amount=planned_amount)
 
@@ -122,6 +448,214 @@ def _backup_path(path):
     return path.with_suffix(path.suffix + ".bak")
 
 
+def _is_sqlite_path(path):
+    return path.suffix.lower() in SQLITE_SUFFIXES
+
+
+def _save_sqlite_tags(tags, path):
+    import sqlite_tag_store
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        sqlite_tag_store.save_sqlite_tags(tags, path)
+    finally:
+        clear_tag_cache(path)
+
+
+def _migrate_json_tags_to_sqlite(path, copy_bundled=False):
+    """
+    Crea la base SQLite a partir del tags.json vecino, si existe.
+    """
+    json_path = path.with_name(TAG_FILENAME)
+    if copy_bundled and not json_path.exists():
+        _copy_bundled_default_tags(json_path)
+    tags = load_tags(json_path) if json_path.exists() else {}
+    _save_sqlite_tags(tags, path)
+
+
+def _journal_path(path):
+    return path.with_suffix(path.suffix + JOURNAL_SUFFIX)
+
+
+def _file_digest(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def _cache_key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _stat_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def _tag_file_signature(path):
+    return (_stat_signature(path), _stat_signature(_journal_path(path)))
+
+
+def _cached_journaled_tags(path):
+    """
+    Igual que `_read_journaled_tags`, pero reutiliza el resultado validado
+    mientras la instantanea y su diario conserven (mtime_ns, tamano, inodo).
+    El resultado es compartido y no debe modificarse.
+    """
+    key = _cache_key(path)
+    signature = _tag_file_signature(path)
+    with _LOAD_CACHE_LOCK:
+        cached = _LOAD_CACHE.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    loaded = _read_journaled_tags(path)
+    # Si otro proceso escribio durante la lectura, el resultado no se guarda.
+    if _tag_file_signature(path) == signature:
+        with _LOAD_CACHE_LOCK:
+            _LOAD_CACHE[key] = (signature, loaded)
+    return loaded
+
+
+def _read_journaled_tags(path):
+    """
+    Lee la instantanea y reaplica el diario si corresponde a ella. Devuelve
+    (tags, tamano del diario o None, si el diario termina en un registro completo).
+    """
+    if _is_sqlite_path(path):
+        import sqlite_tag_store
+
+        return sqlite_tag_store.load_sqlite_tags(path), None, True
+    snapshot = path.read_bytes()
+    tags = _validate_and_migrate_tags(json.loads(snapshot.decode('utf-8')), path=path)
+    journal_path = _journal_path(path)
+    if not journal_path.exists():
+        return tags, None, True
+
+    journal = journal_path.read_text(encoding='utf-8')
+    lines = journal.splitlines()
+    clean = journal.endswith("\n")
+    if not clean:
+        # Registro truncado por una escritura interrumpida.
+        lines = lines[:-1]
+    if not lines:
+        return tags, None, clean
+    try:
+        header = json.loads(lines[0])
+    except ValueError:
+        _raise_invalid(journal_path, "journal header is not valid JSON")
+    if not isinstance(header, dict) or header.get("sha256") != hashlib.sha256(snapshot).hexdigest():
+        # Diario de una instantanea anterior: ya esta integrado.
+        return tags, None, clean
+
+    for number, line in enumerate(lines[1:], start=2):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            _raise_invalid(journal_path, f"journal line {number} is not valid JSON")
+        _apply_tag_change(tags, record, journal_path)
+    return _validate_and_migrate_tags(tags, path=journal_path), len(journal.encode('utf-8')), clean
+
+
+def _apply_tag_change(tags, record, path):
+    if not isinstance(record, dict):
+        _raise_invalid(path, "journal records must be objects")
+    op = record.get("op")
+    if op == "rename_parent_category":
+        for info in tags.values():
+            if info.get("parent_category") == record.get("old"):
+                info["parent_category"] = record.get("new")
+        return
+    tag = record.get("tag")
+    if op == "put_tag":
+        tags.pop(tag, None)
+        tags[tag] = record.get("info")
+        return
+    if tag not in tags:
+        _raise_invalid(path, f"journal record {op!r} refers to unknown tag {tag!r}")
+    info = tags[tag]
+    if op == "delete_tag":
+        del tags[tag]
+    elif op == "add_keyword":
+        info["keywords"].append(record.get("keyword"))
+    elif op == "remove_keyword":
+        info["keywords"] = [keyword for keyword in info["keywords"] if keyword != record.get("keyword")]
+    elif op == "set_keywords":
+        info["keywords"] = record.get("keywords")
+    elif op == "set_field" and record.get("field") == "rules":
+        if record.get("value"):
+            info["rules"] = record["value"]
+        else:
+            info.pop("rules", None)
+    elif op == "set_field" and record.get("field") in ("limit", *TAG_METADATA_FIELDS):
+        info[record["field"]] = record.get("value")
+    else:
+        _raise_invalid(path, f"unknown journal record {op!r}")
+
+
+def _tag_change_records(current, target):
+    records = [{"op": "delete_tag", "tag": tag} for tag in current if tag not in target]
+    common = [tag for tag in target if tag in current]
+
+    renames = {}
+    for tag in common:
+        old = current[tag]["parent_category"]
+        new = target[tag]["parent_category"]
+        if old != new:
+            renames.setdefault((old, new), set()).add(tag)
+    renamed_tags = set()
+    for (old, new), tags in renames.items():
+        using_old = {tag for tag in common if current[tag]["parent_category"] == old}
+        if tags == using_old:
+            records.append({"op": "rename_parent_category", "old": old, "new": new})
+            renamed_tags |= tags
+
+    for tag in common:
+        old_info = current[tag]
+        new_info = target[tag]
+        records.extend(_keyword_change_records(tag, old_info["keywords"], new_info["keywords"]))
+        # `limit` se deriva de planned_amount al validar.
+        for field in TAG_METADATA_FIELDS:
+            if field == "parent_category" and tag in renamed_tags:
+                continue
+            if old_info[field] != new_info[field]:
+                records.append({"op": "set_field", "tag": tag, "field": field, "value": new_info[field]})
+        if old_info.get("rules") != new_info.get("rules"):
+            records.append({"op": "set_field", "tag": tag, "field": "rules", "value": new_info.get("rules")})
+
+    records.extend(
+        {"op": "put_tag", "tag": tag, "info": _copy_tag_info(target[tag])}
+        for tag in target
+        if tag not in current
+    )
+    return records
+
+
+def _keyword_change_records(tag, old_keywords, new_keywords):
+    if old_keywords == new_keywords:
+        return []
+    old_set = set(old_keywords)
+    new_set = set(new_keywords)
+    kept = [keyword for keyword in old_keywords if keyword in new_set]
+    added = [keyword for keyword in new_keywords if keyword not in old_set]
+    if kept + added != new_keywords:
+        return [{"op": "set_keywords", "tag": tag, "keywords": list(new_keywords)}]
+    removed = [keyword for keyword in dict.fromkeys(old_keywords) if keyword not in new_set]
+    return [
+        *({"op": "remove_keyword", "tag": tag, "keyword": keyword} for keyword in removed),
+        *({"op": "add_keyword", "tag": tag, "keyword": keyword} for keyword in added),
+    ]
+
+
+def _replays_to(current, records, target, path):
+    replayed = _copy_tags(current)
+    for record in records:
+        _apply_tag_change(replayed, record, path)
+    replayed = _validate_and_migrate_tags(replayed, path=path)
+    return list(replayed) == list(target) and replayed == target
+
+
 def _resolve_tag_file_path(path):
     return default_tag_file_path() if path is None else Path(path)
 
@@ -242,6 +776,9 @@ def _validate_and_migrate_tags(data, path=None, allow_decimal=False):
                 "financial_purpose",
             ),
         }
+        rules = _validate_rules(value.get("rules", []), path, tag, allow_decimal=allow_decimal)
+        if rules:
+            migrated[tag]["rules"] = rules
     return migrated
 
 
@@ -258,10 +795,14 @@ def _default_tag_info(tag, keywords=None, planned_amount=0):
     }
 
 
+def _copy_tags(tags):
+    return {tag: _copy_tag_info(info) for tag, info in tags.items()}
+
+
 def _copy_tag_info(info):
     copied = {field: info.get(field) for field in ("limit", *TAG_METADATA_FIELDS)}
     copied["keywords"] = list(info.get("keywords", []))
-    return {
+    result = {
         "keywords": copied["keywords"],
         "limit": copied["limit"],
         "budget_type": copied["budget_type"],
@@ -271,6 +812,9 @@ def _copy_tag_info(info):
         "expense_nature": copied["expense_nature"],
         "financial_purpose": copied["financial_purpose"],
     }
+    if info.get("rules"):
+        result["rules"] = [dict(rule) for rule in info["rules"]]
+    return result
 
 
 def _normalized_parent_category(value, tag):
@@ -290,6 +834,37 @@ def _validate_keywords(keywords, path, tag):
     return keywords
 
 
+def _validate_rules(rules, path, tag, allow_decimal=False):
+    if not isinstance(rules, list):
+        _raise_invalid(path, f"tag {tag!r} rules must be a list")
+    validated = []
+    for rule in rules:
+        if not isinstance(rule, dict):
+            _raise_invalid(path, f"tag {tag!r} rules must be objects")
+        rule_type = _validate_choice(rule.get("type", "keyword"), RULE_TYPES, path, tag, "rule type")
+        pattern = rule.get("pattern")
+        if not isinstance(pattern, str) or not pattern:
+            _raise_invalid(path, f"tag {tag!r} rule pattern must be a non-empty string")
+        if rule_type == "regex":
+            try:
+                re.compile(pattern)
+            except re.error as exc:
+                _raise_invalid(path, f"tag {tag!r} rule pattern {pattern!r} is not a valid regex: {exc}")
+        normalized = {"type": rule_type, "pattern": pattern}
+        currency = rule.get("currency")
+        if currency is not None:
+            normalized["currency"] = _validate_string(currency, path, tag, "rule currency")
+        for field in ("min_amount", "max_amount"):
+            amount = rule.get(field)
+            if amount is None:
+                continue
+            if not _is_number(amount, allow_decimal=allow_decimal):
+                _raise_invalid(path, f"tag {tag!r} rule {field} must be a number")
+            normalized[field] = amount
+        validated.append(normalized)
+    return validated
+
+
 def _is_number(value, allow_decimal=False):
     allowed = (int, float)
     if allow_decimal:
@@ -325,10 +900,17 @@ def _json_default(value):
     raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
 
 
-def tag_purchase(description, tags, natag='N/A'):
+def tag_purchase(description, tags, natag='N/A', amount=None, currency=None):
+    """
+    Recorrido de referencia: la primera etiqueta con una palabra clave o regla
+    que coincida. Para muchas descripciones use `tag_rules.compile_tag_rules`.
+    """
     desc_upper = description.upper()
     for tag, info in tags.items():
         for kw in info["keywords"]:
             if kw.upper() in desc_upper:
                 return tag
+        for rule in info.get("rules", ()):
+            if rule_matches(rule, description, amount, currency):
+                return tag
     return natag
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+import argparse
+import ipaddress
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+from decimal import Decimal
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from money import CENT, format_amount
+from purchase_extractor import ACCOUNT_TYPE_CREDIT, BANK_BAC, process_purchases, statement_parser
+from summary import budget_metadata_aggregates, summary_aggregates
+from tag_rules import compile_tag_rules, tags_version
+from tag_store import default_tag_file_path, load_tags, tag_file_signature
+
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+MAX_REQUEST_BYTES = 32 * 1024 * 1024
+UPLOAD_SUFFIXES = (".pdf", ".html", ".htm", ".xls")
+
+
+class TagSnapshot:
+    """
+    Copia en memoria de la biblioteca de etiquetas con su matcher compilado.
+    Antes de cada uso compara la firma del archivo (stat del archivo y su
+    diario) y solo vuelve a cargar cuando cambio.
+    """
+
+    def __init__(self, path=None, natag="N/A"):
+        self.path = Path(path) if path is not None else default_tag_file_path()
+        self.natag = natag
+        self._lock = threading.Lock()
+        self._signature = None
+        self._state = None
+
+    def current(self):
+        """
+        Devuelve (tags, matcher, version) vigentes. El resultado es compartido
+        entre solicitudes y no debe modificarse.
+        """
+        signature = tag_file_signature(self.path)
+        with self._lock:
+            if self._state is None or signature != self._signature:
+                tags = load_tags(self.path)
+                self._state = (tags, compile_tag_rules(tags, self.natag), tags_version(tags))
+                self._signature = signature
+            return self._state
+
+
+class TaggingServer(ThreadingHTTPServer):
+    """
+    Servicio HTTP local para reutilizar las reglas de etiquetado desde otras
+    herramientas. Cada solicitud se atiende en su propio hilo; solo acepta
+    direcciones de loopback.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host=SERVICE_HOST, port=SERVICE_PORT, tags_path=None, natag="N/A"):
+        if not _is_loopback(host):
+            raise ValueError(f"El servicio solo escucha en localhost, no en {host}")
+        self.snapshot = TagSnapshot(tags_path, natag)
+        super().__init__((host, port), TaggingRequestHandler)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class TaggingRequestHandler(BaseHTTPRequestHandler):
+    server_version = "PurchaseTagger"
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/health":
+            self._send_error(HTTPStatus.NOT_FOUND, "Ruta desconocida")
+            return
+        tags, _matcher, version = self.server.snapshot.current()
+        self._send_json({"status": "ok", "tags_version": version, "tag_count": len(tags)})
+
+    def do_POST(self):
+        route = urlparse(self.path)
+        handlers = {
+            "/tag": self._tag_batch,
+            "/statements": self._process_statement,
+            "/summary": self._summarize,
+        }
+        handler = handlers.get(route.path)
+        if handler is None:
+            self._send_error(HTTPStatus.NOT_FOUND, "Ruta desconocida")
+            return
+        try:
+            body = self._read_body()
+            self._send_json(handler(body, parse_qs(route.query)))
+        except RequestTooLarge as e:
+            self._send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, str(e))
+        except UnreadableStatement as e:
+            self._send_error(HTTPStatus.UNPROCESSABLE_ENTITY, str(e))
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_error(HTTPStatus.BAD_REQUEST, str(e))
+        except Exception as e:
+            self._send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error interno: {type(e).__name__}: {e}")
+
+    def log_message(self, format, *args):
+        pass
+
+    def _tag_batch(self, body, _query):
+        """
+        {"descriptions": [...]} o {"items": [{"description", "amount",
+        "currency"}]} -> {"tags": [...], "tags_version": ...}
+        """
+        payload = _json_object(body)
+        _tags, matcher, version = self.server.snapshot.current()
+        if "items" in payload:
+            results = [
+                matcher.match(str(item["description"]), item.get("amount"), item.get("currency"))
+                for item in _json_list(payload["items"], "items")
+            ]
+        else:
+            results = [matcher.match(str(description)) for description in _json_list(payload["descriptions"], "descriptions")]
+        return {"tags": results, "tags_version": version}
+
+    def _process_statement(self, body, query):
+        """
+        Cuerpo: el archivo del estado de cuenta. Parametros: bank,
+        account_type y filename (para la extension).
+        """
+        bank = _query_value(query, "bank", BANK_BAC)
+        account_type = _query_value(query, "account_type", ACCOUNT_TYPE_CREDIT)
+        suffix = Path(_query_value(query, "filename", "statement.pdf")).suffix.lower()
+        if suffix not in UPLOAD_SUFFIXES:
+            raise ValueError(f"Tipo de archivo no soportado: {suffix or 'sin extension'}")
+        statement_parser(bank, account_type)
+        _tags, matcher, version = self.server.snapshot.current()
+        fd, temp_path = tempfile.mkstemp(suffix=suffix)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(body)
+            purchases = process_purchases(temp_path, bank=bank, account_type=account_type)
+        except Exception as e:
+            # pypdf y los parsers lanzan sus propios errores ante un archivo
+            # danado o de otro banco.
+            raise UnreadableStatement(f"No se pudo leer el estado de cuenta: {type(e).__name__}: {e}") from e
+        finally:
+            os.unlink(temp_path)
+        # Se reetiqueta con la instantanea del servicio, que puede apuntar a
+        # una biblioteca distinta de la predeterminada.
+        rows = [
+            [date, description, format_amount(amount), currency, matcher.match(description, amount, currency)]
+            for date, description, amount, currency, _tag, _limit in purchases
+        ]
+        return {"rows": rows, "tags_version": version}
+
+    def _summarize(self, body, _query):
+        """
+        {"rows": [[fecha, descripcion, monto, moneda(, etiqueta)]], "currency"}
+        -> totales por etiqueta, por mes, acumulados y por metadatos.
+        """
+        payload = _json_object(body)
+        tags, matcher, version = self.server.snapshot.current()
+        rows = []
+        for row in _json_list(payload["rows"], "rows"):
+            row = list(row)
+            if len(row) < 4:
+                raise ValueError("Cada fila necesita fecha, descripcion, monto y moneda")
+            if len(row) < 5:
+                row.append(matcher.match(str(row[1]), row[2], row[3]))
+            rows.append(row)
+        currency = payload["currency"]
+        aggregates = summary_aggregates(rows, {currency})
+        return {
+            "currency": currency,
+            "tag_totals": dict(aggregates["tag_totals"]),
+            "monthly_totals": dict(sorted(aggregates["monthly_totals"].items())),
+            "cumulative_points": aggregates["cumulative_points"],
+            **budget_metadata_aggregates(rows, {currency}, tags),
+            "tags_version": version,
+        }
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_REQUEST_BYTES:
+            raise RequestTooLarge(f"La solicitud supera {MAX_REQUEST_BYTES} bytes")
+        return self.rfile.read(length)
+
+    def _send_json(self, payload, status=HTTPStatus.OK):
+        encoded = json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def _send_error(self, status, message):
+        self._send_json({"error": message}, status)
+
+
+class RequestTooLarge(ValueError):
+    pass
+
+
+class UnreadableStatement(ValueError):
+    pass
+
+
+def _is_loopback(host):
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+def _json_object(body):
+    payload = json.loads(body.decode("utf-8") or "{}")
+    if not isinstance(payload, dict):
+        raise ValueError("Se esperaba un objeto JSON")
+    return payload
+
+
+def _json_list(value, name):
+    if not isinstance(value, list):
+        raise ValueError(f'"{name}" debe ser una lista')
+    return value
+
+
+def _query_value(query, name, default):
+    values = query.get(name)
+    return values[0] if values else default
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value.quantize(CENT))
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP local de etiquetado de compras.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--tags", default=None, help="Biblioteca de etiquetas (por defecto la de la aplicacion).")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    try:
+        server = TaggingServer(args.host, args.port, tags_path=args.tags)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Escuchando en {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from decimal import Decimal
+from unittest.mock import patch
+import unittest
+
+from import_pipeline import ImportPipeline
+from purchase_extractor import extract_bac_debit_movements, read_statement
+from test_purchase_extractor import BAC_DEBIT_PAGES, write_text_pdf
+
+
+TAGS = {"Dining": {"keywords": ["CAFE"], "limit": 500}}
+
+
+class BreakingExecutor:
+    """
+    Acepta los trabajos pero todos terminan como si el proceso hubiera muerto.
+    """
+
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, function, *args):
+        self.submitted += 1
+        future = Future()
+        future.set_exception(BrokenProcessPool("A process in the process pool was terminated abruptly"))
+        return future
+
+
+class RecordingExecutor(ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(max_workers=4)
+        self.jobs = []
+
+    def submit(self, function, *args):
+        # Los trabajos llegan como run_traced(estado, funcion, *argumentos).
+        self.jobs.append((args[1].__name__, *args[3:]))
+        return super().submit(function, *args)
+
+
+class ImportPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.addCleanup(self.executor.shutdown)
+
+    def pipeline(self, files, **kwargs):
+        return ImportPipeline(files, "BAC", "Credito", TAGS, executor=self.executor, **kwargs)
+
+    def test_streams_tagged_and_formatted_rows_per_file(self):
+        def read_statement(path, bank, account_type, page_workers=None):
+            return [("05-ENE-25", f"CAFE {path}", Decimal("-1200.5"), "USD"), ("06-ENE-25", "TAXI", Decimal("-20"), "USD")]
+
+        with patch("import_pipeline.read_statement", side_effect=read_statement):
+            results = list(self.pipeline(["jan.pdf", "feb.pdf"]).start())
+
+        self.assertEqual(sorted(result["path"] for result in results), ["feb.pdf", "jan.pdf"])
+        jan = next(result for result in results if result["path"] == "jan.pdf")
+        self.assertIsNone(jan["error"])
+        self.assertEqual(jan["rows"], [
+            ["05-ENE-25", "CAFE jan.pdf", "-1,200.50", "USD", "Dining"],
+            ["06-ENE-25", "TAXI", "-20.00", "USD", "N/A"],
+        ])
+        self.assertGreaterEqual(jan["seconds"], 0)
+
+    def test_failed_file_is_reported_without_stopping_the_rest(self):
+        def read_statement(path, bank, account_type, page_workers=None):
+            if path == "broken.pdf":
+                raise OSError("Cannot read file")
+            return [("05-ENE-25", "CAFE", Decimal("-80"), "USD")]
+
+        with patch("import_pipeline.read_statement", side_effect=read_statement):
+            results = {result["path"]: result for result in self.pipeline(["broken.pdf", "jan.pdf"]).start()}
+
+        self.assertEqual(str(results["broken.pdf"]["error"]), "Cannot read file")
+        self.assertEqual(results["broken.pdf"]["rows"], [])
+        self.assertEqual(len(results["jan.pdf"]["rows"]), 1)
+
+    def test_broken_shared_pool_is_reset_and_files_are_read_in_process(self):
+        pool = ProcessPoolExecutor(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        with self.assertRaises(BrokenProcessPool):
+            pool.submit(os._exit, 1).result()
+
+        with patch("import_pipeline.extraction_pool", return_value=pool), \
+                patch("import_pipeline._shutdown_extraction_pool") as shutdown, \
+                patch("import_pipeline.read_statement", return_value=[("05-ENE-25", "CAFE", Decimal("-80"), "USD")]):
+            results = list(ImportPipeline(["jan.pdf", "feb.pdf"], "BAC", "Credito", TAGS).start())
+
+        shutdown.assert_called_once_with(pool)
+        self.assertEqual(sorted(result["path"] for result in results), ["feb.pdf", "jan.pdf"])
+        self.assertEqual([result["error"] for result in results], [None, None])
+        self.assertEqual([len(result["rows"]) for result in results], [1, 1])
+
+    def test_pool_that_breaks_mid_import_still_returns_every_file(self):
+        executor = BreakingExecutor()
+        files = [f"{index}.pdf" for index in range(6)]
+
+        with patch("import_pipeline._shutdown_extraction_pool") as shutdown, \
+                patch("import_pipeline.read_statement", return_value=[("05-ENE-25", "CAFE", Decimal("-80"), "USD")]):
+            results = list(ImportPipeline(files, "BAC", "Credito", TAGS, executor=executor, max_in_flight=2).start())
+
+        # El grupo inyectado no es el compartido: no se cierra.
+        shutdown.assert_not_called()
+        self.assertLessEqual(executor.submitted, 2)
+        self.assertEqual(sorted(result["path"] for result in results), sorted(files))
+        self.assertTrue(all(result["error"] is None and len(result["rows"]) == 1 for result in results))
+
+    def test_large_pdf_is_split_into_page_ranges_in_the_same_pool(self):
+        executor = RecordingExecutor()
+        self.addCleanup(executor.shutdown)
+        pages = BAC_DEBIT_PAGES + [f"Avisos pagina {index}" for index in range(30)]
+        with tempfile.TemporaryDirectory() as tmp:
+            large = os.path.join(tmp, "annual.pdf")
+            small = os.path.join(tmp, "month.pdf")
+            write_text_pdf(large, pages)
+            write_text_pdf(small, BAC_DEBIT_PAGES)
+            expected = extract_bac_debit_movements(read_statement(large, "BAC", "Debito", page_workers=1))
+
+            with patch("os.cpu_count", return_value=4), patch("purchase_extractor.chosen_backend", return_value=None):
+                results = {
+                    os.path.basename(result["path"]): result
+                    for result in ImportPipeline([large, small], "BAC", "Debito", TAGS, executor=executor).start()
+                }
+
+        self.assertEqual([results[name]["error"] for name in ("annual.pdf", "month.pdf")], [None, None])
+        self.assertEqual(len(results["annual.pdf"]["rows"]), len(expected))
+        self.assertEqual([row[2] for row in results["annual.pdf"]["rows"]], ["-4,150.00", "5,177.00", "-471.00"])
+        # Texto plano de todo el PDF en cuatro rangos, luego layout solo en
+        # las paginas de tabla; el PDF chico sigue en un solo trabajo.
+        self.assertEqual(
+            sorted(job for job in executor.jobs if job[0] == "extract_page_range"),
+            [
+                ("extract_page_range", 0, 9, "pypdf"),
+                ("extract_page_range", 2, 4, "pypdf_layout"),
+                ("extract_page_range", 9, 18, "pypdf"),
+                ("extract_page_range", 18, 27, "pypdf"),
+                ("extract_page_range", 27, 35, "pypdf"),
+            ],
+        )
+        self.assertEqual([job[0] for job in executor.jobs].count("_read_for_pipeline"), 1)
+
+    def test_rejects_unsupported_bank_before_starting(self):
+        with self.assertRaises(ValueError):
+            ImportPipeline(["jan.pdf"], "Otro", "Credito", TAGS)
+
+    def test_backpressure_bounds_files_read_ahead_of_the_consumer(self):
+        reads = []
+        lock = threading.Lock()
+
+        def read_statement(path, bank, account_type, page_workers=None):
+            with lock:
+                reads.append(path)
+            return [("05-ENE-25", "CAFE", Decimal("-80"), "USD")]
+
+        files = [f"{index}.pdf" for index in range(40)]
+        with patch("import_pipeline.read_statement", side_effect=read_statement):
+            pipeline = self.pipeline(files, max_in_flight=2, queue_size=1).start()
+            time.sleep(0.3)
+            read_before_draining = len(reads)
+            results = list(pipeline)
+
+        # Solo caben los archivos de las colas, los de cada hilo y los que se
+        # leen a la vez; el resto espera a que alguien consuma resultados.
+        self.assertLessEqual(read_before_draining, 8)
+        self.assertEqual(len(results), 40)
+        self.assertTrue(pipeline.finished)
+
+    def test_cancel_stops_all_stages(self):
+        with patch("import_pipeline.read_statement", return_value=[("05-ENE-25", "CAFE", Decimal("-80"), "USD")]):
+            pipeline = self.pipeline([f"{index}.pdf" for index in range(40)], queue_size=1).start()
+            time.sleep(0.05)
+            pipeline.cancel()
+            pipeline.join(timeout=5)
+
+        self.assertFalse(any(thread.is_alive() for thread in pipeline._threads))
+
+
+if __name__ == "__main__":
+    unittest.main()
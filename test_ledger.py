@@ -0,0 +1,181 @@
+import sqlite3
+import tempfile
+from pathlib import Path
+import unittest
+
+from ledger import PurchaseLedger, file_sha256, movement_fingerprint
+
+
+JANUARY = [
+    ["05/01/2025", "CAFE BRITT", "-2,500.00", "CRC", "Dining"],
+    ["05/01/2025", "CAFE BRITT", "-2,500.00", "CRC", "Dining"],
+    ["09/01/2025", "UBER TRIP", "-4,100.00", "CRC", "N/A"],
+]
+JANUARY_AND_FEBRUARY = JANUARY + [["02/02/2025", "AUTOMERCADO", "-30,000.00", "CRC", "Groceries"]]
+
+
+class PurchaseLedgerTest(unittest.TestCase):
+    def test_fingerprint_normalizes_description_amount_and_currency(self):
+        self.assertEqual(
+            movement_fingerprint("05/01/2025", "cafe  britt ", "-2500", "crc", "BAC", "Credito"),
+            movement_fingerprint("05/01/2025", "CAFE BRITT", "-2,500.00", "CRC", "BAC", "Credito"),
+        )
+        self.assertNotEqual(
+            movement_fingerprint("05/01/2025", "CAFE BRITT", "-2,500.00", "CRC", "BAC", "Credito"),
+            movement_fingerprint("05/01/2025", "CAFE BRITT", "-2,500.00", "CRC", "BAC", "Debito"),
+        )
+
+    def test_record_statement_keeps_repeats_within_file_and_skips_overlap_between_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger = PurchaseLedger(Path(tmp) / "ledger.sqlite3")
+            try:
+                first = ledger.record_statement("hash-jan", "jan.pdf", "BAC", "Credito", JANUARY)
+                second = ledger.record_statement("hash-jan-feb", "jan-feb.pdf", "BAC", "Credito", JANUARY_AND_FEBRUARY)
+
+                self.assertEqual((first["inserted"], first["duplicates"]), (3, 0))
+                self.assertEqual((second["inserted"], second["duplicates"]), (1, 3))
+                self.assertEqual([row for _fingerprint, row in second["new_rows"]], JANUARY_AND_FEBRUARY[3:])
+                self.assertTrue(ledger.has_statement("hash-jan"))
+                self.assertFalse(ledger.has_statement("hash-mar"))
+                self.assertEqual(
+                    [movement[1:6] for movement in ledger.movements()],
+                    [tuple(row) for row in JANUARY_AND_FEBRUARY],
+                )
+            finally:
+                ledger.close()
+
+    def test_manual_tags_survive_reopening(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "ledger.sqlite3"
+            ledger = PurchaseLedger(path)
+            ledger.record_statement("hash-jan", "jan.pdf", "BAC", "Credito", JANUARY)
+            fingerprint = ledger.movements()[2][0]
+            ledger.set_manual_tag(fingerprint, "Rides")
+            ledger.close()
+
+            reopened = PurchaseLedger(path)
+            try:
+                movement = reopened.movements()[2]
+            finally:
+                reopened.close()
+
+            self.assertEqual(movement[5:], ("Rides", True))
+
+    def test_rename_manual_tag_only_touches_manual_movements(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger = PurchaseLedger(Path(tmp) / "ledger.sqlite3")
+            try:
+                ledger.record_statement("hash-jan", "jan.pdf", "BAC", "Credito", JANUARY)
+                ledger.set_manual_tag(ledger.movements()[0][0], "Dining")
+
+                self.assertEqual(ledger.rename_manual_tag("Dining", "Food"), 1)
+                self.assertEqual(
+                    [movement[5:] for movement in ledger.movements()],
+                    [("Food", True), ("Dining", False), ("N/A", False)],
+                )
+            finally:
+                ledger.close()
+
+    def test_removing_a_statement_keeps_movements_another_statement_also_brings(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger = PurchaseLedger(Path(tmp) / "ledger.sqlite3")
+            try:
+                ledger.record_statement("hash-jan", "jan.pdf", "BAC", "Credito", JANUARY)
+                ledger.record_statement("hash-jan-feb", "jan-feb.pdf", "BAC", "Credito", JANUARY_AND_FEBRUARY)
+                ledger.record_statement("hash-mar", "mar.pdf", "BAC", "Credito", [["03/03/2025", "TAXI", "-900.00", "CRC", "N/A"]])
+                ledger.set_manual_tag(ledger.movements()[2][0], "Rides")
+
+                self.assertEqual(ledger.remove_statement("hash-jan"), 0)
+                self.assertEqual(
+                    [movement[2:7] for movement in ledger.movements()],
+                    [
+                        ("CAFE BRITT", "-2,500.00", "CRC", "Dining", False),
+                        ("CAFE BRITT", "-2,500.00", "CRC", "Dining", False),
+                        ("UBER TRIP", "-4,100.00", "CRC", "Rides", True),
+                        ("AUTOMERCADO", "-30,000.00", "CRC", "Groceries", False),
+                        ("TAXI", "-900.00", "CRC", "N/A", False),
+                    ],
+                )
+
+                # Ahora el de enero y febrero es el unico que los trae.
+                self.assertEqual(ledger.remove_statement("hash-jan-feb"), 4)
+                self.assertEqual([movement[2] for movement in ledger.movements()], ["TAXI"])
+                self.assertFalse(ledger.has_statement("hash-jan-feb"))
+            finally:
+                ledger.close()
+
+    def test_removing_the_later_statement_leaves_the_first_one_whole(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger = PurchaseLedger(Path(tmp) / "ledger.sqlite3")
+            try:
+                ledger.record_statement("hash-jan", "jan.pdf", "BAC", "Credito", JANUARY)
+                ledger.record_statement("hash-jan-feb", "jan-feb.pdf", "BAC", "Credito", JANUARY_AND_FEBRUARY)
+
+                self.assertEqual(ledger.remove_statement("hash-jan-feb"), 1)
+                self.assertEqual(ledger.remove_statement("hash-jan"), 3)
+                self.assertEqual(ledger.movements(), [])
+            finally:
+                ledger.close()
+
+    def test_registry_records_extraction_metadata_and_replaces_stale_rows(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger = PurchaseLedger(Path(tmp) / "ledger.sqlite3")
+            try:
+                ledger.record_statement(
+                    "hash-jan", "jan.pdf", "BAC", "Credito", JANUARY,
+                    parser_version=1, tags_version="tags-a", extraction_seconds=0.25,
+                )
+                ledger.set_manual_tag(ledger.movements()[0][0], "Coffee")
+                ledger.set_tags_version("hash-jan", "tags-b")
+
+                statement = ledger.statement("hash-jan")
+                self.assertEqual(
+                    {key: statement[key] for key in ("bank", "account_type", "parser_version", "tags_version", "row_count")},
+                    {"bank": "BAC", "account_type": "Credito", "parser_version": 1, "tags_version": "tags-b", "row_count": 3},
+                )
+                self.assertEqual(statement["extraction_seconds"], 0.25)
+
+                # Un parser corregido ya no produce el segundo cafe ni el viaje.
+                ledger.record_statement("hash-jan", "jan.pdf", "BAC", "Credito", JANUARY[1:2], parser_version=2)
+
+                self.assertEqual(ledger.statement("hash-jan")["parser_version"], 2)
+                self.assertEqual([movement[2] for movement in ledger.movements()], ["CAFE BRITT"])
+                self.assertIsNone(ledger.statement("hash-feb"))
+            finally:
+                ledger.close()
+
+    def test_version_one_ledger_is_migrated_in_place(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "ledger.sqlite3"
+            with sqlite3.connect(path) as conn:
+                conn.executescript(
+                    "CREATE TABLE statements (source_hash TEXT PRIMARY KEY, file_name TEXT NOT NULL, "
+                    "bank TEXT NOT NULL, account_type TEXT NOT NULL, imported_at TEXT NOT NULL, "
+                    "row_count INTEGER NOT NULL);"
+                    "INSERT INTO statements VALUES ('hash-jan', 'jan.pdf', 'BAC', 'Credito', '2025-02-01T10:00:00', 3);"
+                    "PRAGMA user_version = 1;"
+                )
+            conn.close()
+
+            ledger = PurchaseLedger(path)
+            try:
+                statement = ledger.statement("hash-jan")
+            finally:
+                ledger.close()
+
+            self.assertEqual((statement["parser_version"], statement["tags_version"]), (0, ""))
+
+    def test_file_sha256_hashes_content(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            first = Path(tmp) / "a.pdf"
+            second = Path(tmp) / "b.pdf"
+            first.write_bytes(b"%PDF statement")
+            second.write_bytes(b"%PDF statement")
+
+            self.assertEqual(file_sha256(first), file_sha256(second))
+            second.write_bytes(b"%PDF other")
+            self.assertNotEqual(file_sha256(first), file_sha256(second))
+
+
+if __name__ == "__main__":
+    unittest.main()
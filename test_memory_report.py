@@ -0,0 +1,74 @@
+import tracemalloc
+from types import SimpleNamespace
+import unittest
+
+from memory_report import (
+    MB,
+    MemoryProbe,
+    PROCESS_POOL_NOTE,
+    budget_overruns,
+    collect_memory_report,
+    format_memory_report,
+    memory_by_subsystem,
+    subsystem_for,
+)
+
+
+def frames(*filenames):
+    # tracemalloc guarda la pila del marco mas externo al mas interno.
+    return [SimpleNamespace(filename=filename, lineno=1) for filename in filenames]
+
+
+class MemoryReportTest(unittest.TestCase):
+    def test_allocations_go_to_the_innermost_known_subsystem(self):
+        self.assertEqual(subsystem_for(frames("/app/purchase_tagger_app.py", "/app/ui_state.py", "/usr/lib/python3/re.py")), "Filtros y orden")
+        self.assertEqual(subsystem_for(frames("/app/purchase_tagger_app.py", "/site-packages/pypdf/_page.py")), "Extracción PDF")
+        self.assertEqual(subsystem_for(frames("/usr/lib/python3/json/decoder.py")), "Otros")
+
+    def test_snapshot_totals_are_grouped_and_sorted_by_size(self):
+        snapshot = SimpleNamespace(traces=[
+            SimpleNamespace(size=300, traceback=frames("/app/summary.py")),
+            SimpleNamespace(size=500, traceback=frames("/app/purchase_tagger_app.py")),
+            SimpleNamespace(size=400, traceback=frames("/app/summary.py")),
+        ])
+
+        self.assertEqual(memory_by_subsystem(snapshot), [("Resumen", 700, 2), ("Filas de la app", 500, 1)])
+
+    def test_probe_measures_peak_and_retained_allocations(self):
+        kept = []
+        with MemoryProbe() as probe:
+            bytearray(4 * MB)
+            kept.append(bytearray(MB))
+
+        self.assertGreaterEqual(probe.peak, 4 * MB)
+        self.assertGreaterEqual(probe.retained, MB)
+        self.assertLess(probe.retained, 2 * MB)
+        self.assertEqual(probe.per_rows(50_000)["retained"], probe.retained * 2)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_budget_overruns_name_the_exceeded_limit(self):
+        self.assertEqual(budget_overruns("apply_filter", {"peak": MB, "retained": MB}), [])
+        [overrun] = budget_overruns("draw_summary", {"peak": MB, "retained": 50 * MB})
+        self.assertTrue(overrun.startswith("draw_summary retained: 50.0 MB"))
+
+    def test_report_breaks_down_live_memory_and_app_structures(self):
+        app = SimpleNamespace(all_rows=[["01-ENE-25", "CAFE", "-1.00", "USD", "N/A", "-"]] * 3, filtered_rows=[], tree_item_rows={})
+        self.assertEqual(format_memory_report(collect_memory_report(app)), "Reporte de memoria: tracemalloc no esta activo")
+
+        tracemalloc.start(5)
+        try:
+            app.filtered_rows = [list(row) for row in app.all_rows]
+            report = collect_memory_report(app)
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(report["structures"]["all_rows"], 3)
+        self.assertGreater(report["current"], 0)
+        text = format_memory_report(report)
+        self.assertIn("Filas: 3, filtradas: 3, en la tabla: 0", text)
+        self.assertIn("Por subsistema:", text)
+        self.assertTrue(text.endswith(PROCESS_POOL_NOTE))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+import unittest
+
+import pdf_backends
+import purchase_extractor
+from pdf_backends import (
+    PdfTextBackend,
+    chosen_backend,
+    load_backend_choices,
+    save_backend_choices,
+    text_backend,
+)
+from purchase_extractor import calibrate_text_backends, extract_text, read_statement
+
+
+class FakeBackend(PdfTextBackend):
+    module = "json"
+
+    def __init__(self, name, pages, delay=0.0):
+        self.name = name
+        self.span_name = f"pdf_text_{name}"
+        self.pages = pages
+        self.delay = delay
+
+    def open(self, pdf_path):
+        return self.pages[os.path.basename(pdf_path)]
+
+    def page_count(self, document):
+        return len(document)
+
+    def page_text(self, document, index):
+        time.sleep(self.delay)
+        return document[index]
+
+
+def column_rows(text):
+    return [tuple(line.split("  ")) for line in text.splitlines() if "  " in line]
+
+
+class PdfBackendsTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+
+    def test_unknown_or_missing_backends_are_rejected(self):
+        self.assertEqual(text_backend("pypdf_layout").span_name, "pdf_text_layout")
+        with self.assertRaises(ValueError):
+            text_backend("ocr")
+        with patch.object(pdf_backends.PyMuPDFBackend, "module", "missing_pdf_module"):
+            with self.assertRaisesRegex(ValueError, "missing_pdf_module"):
+                text_backend("pymupdf")
+
+    def test_backend_without_open_or_page_text_cannot_be_created(self):
+        class PageCountOnly(PdfTextBackend):
+            name = "page_count_only"
+
+        with self.assertRaisesRegex(TypeError, "open, page_text"):
+            PageCountOnly()
+
+    def test_extract_text_uses_the_selected_backend(self):
+        (self.tmp / "jan.pdf").write_bytes(b"")
+        backend = FakeBackend("fake", {"jan.pdf": ["pagina 1", "", "pagina 3"]})
+
+        with patch.dict(pdf_backends.PDF_TEXT_BACKENDS, {"fake": backend}):
+            text = extract_text(self.tmp / "jan.pdf", backend="fake", workers=1)
+
+        self.assertEqual(text, "pagina 1\npagina 3")
+
+    def test_calibration_picks_fastest_backend_with_identical_rows(self):
+        layout_pages = {"bac.pdf": ["CAFE  -80.00\nTAXI  -20.00"], "other.pdf": ["sin movimientos"]}
+        plain_pages = {"bac.pdf": ["CAFE -80.00\nTAXI  -20.00"], "other.pdf": ["sin movimientos"]}
+        for name in layout_pages:
+            (self.tmp / name).write_bytes(b"")
+        (self.tmp / "notes.txt").write_text("ignorado", encoding="utf-8")
+        backends = {
+            "pypdf": FakeBackend("pypdf", plain_pages),
+            "pypdf_layout": FakeBackend("pypdf_layout", layout_pages, delay=0.02),
+            "fast_layout": FakeBackend("fast_layout", layout_pages),
+        }
+        registry = {
+            ("BAC", "Debito"): (column_rows, purchase_extractor.SOURCE_PDF_TEXT, True),
+            ("BCR", "Debito"): (lambda path: [], purchase_extractor.SOURCE_FILE, None),
+        }
+
+        with patch.dict(pdf_backends.PDF_TEXT_BACKENDS, backends, clear=True), \
+                patch.dict(purchase_extractor.PARSER_REGISTRY, registry, clear=True), \
+                patch.dict(purchase_extractor.LAYOUT_PAGE_SELECTORS, clear=True):
+            calibration = calibrate_text_backends(self.tmp, backends=["fast_layout"])
+
+        self.assertEqual(list(calibration), [("BAC", "Debito")])
+        entry = calibration["BAC", "Debito"]
+        self.assertEqual((entry["backend"], entry["reference"], entry["files"], entry["rows"]), ("fast_layout", "pypdf_layout", 1, 2))
+        self.assertEqual(entry["measurements"]["pypdf"]["identical_files"], 0)
+        self.assertEqual(entry["measurements"]["pypdf"]["row_agreement"], 0.5)
+        self.assertLess(entry["measurements"]["fast_layout"]["seconds"], entry["measurements"]["pypdf_layout"]["seconds"])
+
+    def test_saved_choices_steer_read_statement(self):
+        path = self.tmp / "pdf_backends.json"
+        save_backend_choices({
+            ("BAC", "Debito"): {"backend": "pypdf", "measurements": {}},
+            ("Promerica", "Credito"): {"backend": None, "measurements": {}},
+        }, path)
+
+        self.assertEqual(load_backend_choices(path), {("BAC", "Debito"): "pypdf"})
+        self.assertIn("BAC/Debito", json.loads(path.read_text(encoding="utf-8")))
+        with patch("purchase_extractor.chosen_backend", side_effect=lambda bank, account: chosen_backend(bank, account, path)), \
+                patch("purchase_extractor.extract_text", return_value="") as extract:
+            read_statement("debit.pdf", "BAC", "Debito")
+            read_statement("credit.pdf", "BAC", "Credito")
+
+        self.assertEqual(extract.call_args_list[0].kwargs, {"layout": True, "backend": "pypdf"})
+        self.assertEqual(
+            extract.call_args_list[1].kwargs,
+            {"layout": True, "layout_pages": purchase_extractor.bac_credit_layout_pages},
+        )
+
+    def test_unreadable_choices_file_means_no_choice(self):
+        path = self.tmp / "pdf_backends.json"
+        path.write_text("{no es json", encoding="utf-8")
+
+        self.assertEqual(load_backend_choices(path), {})
+        self.assertIsNone(chosen_backend("BAC", "Debito", path))
+
+
+if __name__ == "__main__":
+    unittest.main()
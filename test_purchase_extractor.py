@@ -3,7 +3,55 @@ import os
 import tempfile
 from unittest.mock import patch
 
-from purchase_extractor import process_purchases, extract_purchases
+import tracing
+from purchase_extractor import (
+    bac_credit_layout_pages,
+    bac_debit_layout_pages,
+    benchmark_page_sharding,
+    calibrate_text_backends,
+    extract_bac_credit_movements,
+    extract_bac_debit_movements,
+    extract_purchases,
+    extract_text,
+    page_shard_workers,
+    page_shards,
+    process_purchases,
+)
+from tracing import Tracer
+
+
+def write_text_pdf(path, page_texts):
+    from pypdf import PdfWriter
+    from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+        NameObject("/Encoding"): NameObject("/WinAnsiEncoding"),
+    }))
+    for text in page_texts:
+        page = writer.add_blank_page(width=612, height=792)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font}),
+        })
+        content = DecodedStreamObject()
+        # Las celdas separadas por tabulador quedan en columnas de 110 puntos.
+        cells = " ".join(
+            f"1 0 0 1 {20 + column * 110} {760 - row * 14} Tm ({_pdf_string(cell)}) Tj"
+            for row, line in enumerate(text.split("\n"))
+            for column, cell in enumerate(line.split("\t"))
+            if cell
+        )
+        content.set_data(f"BT /F1 8 Tf {cells} ET".encode("latin-1"))
+        page[NameObject("/Contents")] = writer._add_object(content)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def _pdf_string(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
 
 
 class PurchaseExtractorParsingTest(unittest.TestCase):
@@ -314,7 +362,7 @@ C) Detalle de intereses
                 patch("purchase_extractor.load_tags", return_value={}):
             purchases = process_purchases("statement.pdf", bank="BAC", account_type="Credito")
 
-        extract_text.assert_called_once_with("statement.pdf", layout=True)
+        extract_text.assert_called_once_with("statement.pdf", layout=True, layout_pages=bac_credit_layout_pages)
         self.assertEqual(
             purchases,
             [
@@ -343,7 +391,7 @@ Moneda: COLONES
                 patch("purchase_extractor.load_tags", return_value={}):
             purchases = process_purchases("statement.pdf", bank="BAC", account_type="Debito")
 
-        extract_text.assert_called_once_with("statement.pdf", layout=True)
+        extract_text.assert_called_once_with("statement.pdf", layout=True, layout_pages=bac_debit_layout_pages)
         self.assertEqual(
             purchases,
             [
@@ -462,5 +510,160 @@ MONTO POR INTERESES MORATORIOS
             process_purchases("statement.pdf", bank="BAC", account_type="Other")
 
 
+
+class PageShardingTest(unittest.TestCase):
+    def test_shard_plan_follows_threshold_and_cpu_count(self):
+        self.assertEqual(page_shard_workers(10, cpu_count=8), 1)
+        self.assertEqual(page_shard_workers(30, cpu_count=8), 3)
+        self.assertEqual(page_shard_workers(64, cpu_count=8), 4)
+        self.assertEqual(page_shard_workers(64, cpu_count=1), 1)
+        self.assertEqual(page_shards(10, 3), [(0, 4), (4, 8), (8, 10)])
+        self.assertEqual(page_shards(3, 4), [(0, 1), (1, 2), (2, 3)])
+
+    def test_sharded_extraction_keeps_page_order(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "annual.pdf")
+            write_text_pdf(path, [f"PAGE {index:02d} CAFE BRITT" for index in range(10)])
+
+            sequential = extract_text(path, workers=1)
+            sharded = extract_text(path, workers=3)
+
+        self.assertEqual(sharded, sequential)
+        self.assertEqual(sharded.splitlines()[:2], ["PAGE 00 CAFE BRITT", "PAGE 01 CAFE BRITT"])
+        self.assertEqual(len(sharded.splitlines()), 10)
+
+    def test_falls_back_to_sequential_when_process_pool_is_unavailable(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "annual.pdf")
+            write_text_pdf(path, ["FIRST", "SECOND"])
+
+            with patch("purchase_extractor.extraction_pool", side_effect=OSError("no processes")):
+                text = extract_text(path, workers=2)
+
+        self.assertEqual(text, "FIRST\nSECOND")
+
+    def test_benchmark_reports_both_timings_per_page_count(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "source.pdf")
+            write_text_pdf(path, ["PAGE A", "PAGE B"])
+
+            results = benchmark_page_sharding(path, page_counts=(2, 6), workers=2)
+
+        self.assertEqual([result["pages"] for result in results], [2, 6])
+        self.assertTrue(all(result["same_text"] for result in results))
+        self.assertTrue(all(result["sharded_seconds"] > 0 for result in results))
+
+
+BAC_DEBIT_PAGES = [
+    "Moneda: COLONES\n3101012009 30/ABR/26",
+    "Resumen de la cuenta",
+    "NO. REFERENCIA\tFECHA\tCONCEPTO\tDÉBITOS\tCRÉDITOS\n"
+    "966882466\tMAR/31\tSINPE MOVIL\t4,150.00\n"
+    "406417547\tABR/01\tTEF DE:REGINALDO\t\t5,177.00",
+    "NO. REFERENCIA\tFECHA\tCONCEPTO\tDÉBITOS\tCRÉDITOS\n"
+    "950507539\tABR/06\tCOMISION CD SINPE\t471.00\n"
+    "ÚLTIMA LÍNEA\tSALDO AL CORTE\t\t\t283,218.70",
+    "Avisos importantes",
+]
+
+BAC_CREDIT_PAGES = [
+    "Estado de cuenta\nTarjeta de crédito",
+    "A) Detalle de pago del periodo\n"
+    "N. Referencia\tFecha de pago\tConcepto/Descripción\tTransacción\tInterés en\tTransacción\tInterés en\n"
+    "0319136009494\t19-MAR-26\tPAGO RECIBIDO\t\t\t386.51-\t3.44-\n"
+    "0323136009497\t23-MAR-26\tPAGO RECIBIDO\t   776,714.88-\t   13,209.05-",
+    "B) Detalle de compras del periodo\n"
+    "N. Referencia\tFecha de pago\tConcepto/Descripción\tLugar\tMoneda\tMonto en\n"
+    "031580013595\t15-MAR-26\tPAGUELO 84169890\t\tCRC\t10,560.03\n"
+    "011499100801\t13-MAR-26\tSHEIN.COM\t\tUSD\t38.94",
+    "121524873885\t20-MAR-26\tTURRUCARES SHOP\t\tCRC\t16,000.00\n"
+    "C) Detalle de intereses",
+]
+
+
+class TargetedLayoutTest(unittest.TestCase):
+    def test_section_pages_span_from_header_to_end_marker(self):
+        pages = ["portada", "x DÉBITOS y CRÉDITOS NO. REFERENCIA", "sigue", "ÚLTIMA LÍNEA", "avisos"]
+
+        self.assertEqual(bac_debit_layout_pages(pages), {1, 2, 3})
+        self.assertEqual(bac_debit_layout_pages(pages[:3]), {1, 2})
+        self.assertIsNone(bac_debit_layout_pages(["portada"]))
+        self.assertEqual(
+            bac_credit_layout_pages(["A) Detalle de pago del periodo", "B) Detalle de compras del periodo", "compras"]),
+            {0, 1},
+        )
+
+    def test_two_pass_extraction_parses_like_full_layout_and_lays_out_only_table_pages(self):
+        tracer = Tracer(enabled=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "debit.pdf")
+            write_text_pdf(path, BAC_DEBIT_PAGES)
+
+            full_layout = extract_bac_debit_movements(extract_text(path, layout=True, workers=1))
+            plain = extract_bac_debit_movements(extract_text(path, workers=1))
+            with patch.object(tracing, "TRACER", tracer):
+                targeted = extract_bac_debit_movements(
+                    extract_text(path, layout=True, workers=1, layout_pages=bac_debit_layout_pages)
+                )
+
+        self.assertEqual(targeted, full_layout)
+        self.assertEqual([amount for _date, _desc, amount, _currency in targeted], ["-4150.00", "5177.00", "-471.00"])
+        self.assertNotEqual(plain, full_layout)
+        stages = tracer.stage_totals()
+        self.assertEqual((stages["pdf_text"]["items"], stages["pdf_text_layout"]["items"]), (5, 2))
+
+    def test_bac_credit_two_pass_reads_payments_and_purchases_like_full_layout(self):
+        tracer = Tracer(enabled=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "credit.pdf")
+            write_text_pdf(path, BAC_CREDIT_PAGES)
+
+            full_layout = extract_bac_credit_movements(extract_text(path, layout=True, workers=1))
+            plain = extract_bac_credit_movements(extract_text(path, workers=1))
+            with patch.object(tracing, "TRACER", tracer):
+                targeted = extract_bac_credit_movements(
+                    extract_text(path, layout=True, workers=1, layout_pages=bac_credit_layout_pages)
+                )
+
+        self.assertEqual(targeted, full_layout)
+        self.assertEqual(
+            [(description, amount, currency) for _date, description, amount, currency in targeted],
+            [
+                ("PAGO RECIBIDO", "386.51", "USD"),
+                ("PAGO RECIBIDO", "776714.88", "CRC"),
+                ("PAGUELO 84169890", "-10560.03", "CRC"),
+                ("SHEIN.COM", "-38.94", "USD"),
+                ("TURRUCARES SHOP", "-16000.00", "CRC"),
+            ],
+        )
+        # Sin layout la tabla de pagos pierde sus columnas.
+        self.assertNotEqual(plain, full_layout)
+        stages = tracer.stage_totals()
+        self.assertEqual((stages["pdf_text"]["items"], stages["pdf_text_layout"]["items"]), (4, 2))
+
+    def test_calibration_checks_two_pass_extraction_against_full_layout(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            write_text_pdf(os.path.join(tmp, "debit.pdf"), BAC_DEBIT_PAGES)
+
+            entry = calibrate_text_backends(tmp, backends=["pypdf", "pypdf_layout"])["BAC", "Debito"]
+
+        self.assertEqual((entry["files"], entry["rows"]), (1, 3))
+        self.assertEqual(entry["measurements"]["pypdf_targeted"]["identical_files"], 1)
+        self.assertEqual(entry["measurements"]["pypdf"]["identical_files"], 0)
+        self.assertIn(entry["backend"], ("pypdf_layout", "pypdf_targeted"))
+
+    def test_two_pass_falls_back_to_full_layout_when_no_table_is_found(self):
+        tracer = Tracer(enabled=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "debit.pdf")
+            write_text_pdf(path, ["portada", "sin tabla"])
+
+            with patch.object(tracing, "TRACER", tracer):
+                text = extract_text(path, layout=True, workers=1, layout_pages=bac_debit_layout_pages)
+
+        self.assertEqual(text.splitlines(), ["portada", "sin tabla"])
+        self.assertEqual(tracer.stage_totals()["pdf_text_layout"]["items"], 2)
+
+
 if __name__ == "__main__":
     unittest.main()
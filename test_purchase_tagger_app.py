@@ -3,6 +3,9 @@ import json
 from decimal import Decimal
 import os
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import Mock, patch
 
 from purchase_tagger_app import (
@@ -12,6 +15,11 @@ from purchase_tagger_app import (
     PurchaseTaggerUI,
     display_purchase_row,
 )
+from ledger import PurchaseLedger, file_sha256
+from memory_report import MemoryProbe, budget_overruns
+from purchase_extractor import PARSER_VERSION
+from tag_rules import tags_version
+from ui_state import FacetIndex, FilteredRows
 from views import tags as tags_view
 
 
@@ -35,11 +43,12 @@ class FakeTree:
     def get_children(self, parent=""):
         return list(self.visible_order)
 
-    def delete(self, item_iid):
-        self.deleted.append(item_iid)
-        self.items.pop(item_iid, None)
-        if item_iid in self.visible_order:
-            self.visible_order.remove(item_iid)
+    def delete(self, *item_iids):
+        for item_iid in item_iids:
+            self.deleted.append(item_iid)
+            self.items.pop(item_iid, None)
+            if item_iid in self.visible_order:
+                self.visible_order.remove(item_iid)
 
     def insert(self, parent, index, values=None, tags=()):
         iid = f"item-{len(self.items) + 1}"
@@ -74,6 +83,10 @@ class FakeMenu:
     def __init__(self):
         self.values = []
         self.state = "normal"
+        self.shown = None
+
+    def set(self, value):
+        self.shown = value
 
     def configure(self, **kwargs):
         if "values" in kwargs:
@@ -796,43 +809,568 @@ class PurchaseTaggerBrowseTest(unittest.TestCase):
         self.assertEqual(option_menu.call_args.kwargs["values"], ["CRC", "USD"])
         self.assertIs(option_menu.call_args.kwargs["variable"], app.import_currency_var)
 
-    def test_load_refreshes_imports_overview_after_processing_pdfs(self):
+
+class PurchaseTaggerLedgerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def make_ledger_app(self, tags=None):
         app = object.__new__(PurchaseTaggerUI)
-        app.pdf_files = ["statement.pdf"]
+        app.tags = tags or {"Dining": {"keywords": ["CAFE"], "limit": 0}}
+        app.natag = "N/A"
+        app.ledger = PurchaseLedger(os.path.join(self.tmp.name, "ledger.sqlite3"))
+        self.addCleanup(app.ledger.close)
+        app.ledger_loaded = False
+        app.row_fingerprints = {}
         app.all_rows = []
+        app.pdf_files = []
         app.status_var = SimpleVar("")
         app.bank_var = SimpleVar("BAC")
-        app.account_type_var = SimpleVar("Debito")
+        app.account_type_var = SimpleVar("Credito")
         app.apply_filter = Mock()
         app.update_idletasks = Mock()
+        app.after = Mock(return_value="after-id")
+        app.after_cancel = Mock()
+        app.import_executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(app.import_executor.shutdown)
+        return app
+
+    def load_and_drain(self, app):
+        app.load()
+        pipeline = app.__dict__.get("import_pipeline")
+        if pipeline is not None:
+            pipeline.join(timeout=5)
+            app._drain_import_pipeline()
+        self.assertIsNone(app.import_pipeline)
+
+    def statement(self, name, content):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_load_refreshes_imports_overview_after_processing_pdfs(self):
+        app = self.make_ledger_app()
+        app.pdf_files = [self.statement("statement.pdf", b"statement")]
+        app.account_type_var = SimpleVar("Debito")
         app.active_view = "Imports"
         app.show_view = Mock()
 
-        with patch("purchase_tagger_app.process_purchases", return_value=[
-            ("01-ENE-25", "CAFE", Decimal("-80.00"), "USD", "Dining", Decimal("0")),
-        ]) as process_purchases:
-            app.load()
+        with patch("import_pipeline.read_statement", return_value=[
+            ("01-ENE-25", "CAFE", Decimal("-80.00"), "USD"),
+        ]) as read_statement:
+            self.load_and_drain(app)
 
-        process_purchases.assert_called_once_with("statement.pdf", bank="BAC", account_type="Debito")
+        read_statement.assert_called_once_with(app.pdf_files[0], "BAC", "Debito", page_workers=1)
         self.assertEqual(app.all_rows, [["01-ENE-25", "CAFE", "-80.00", "USD", "Dining", "-"]])
         app.show_view.assert_called_once_with("Imports")
 
     def test_load_displays_error_message_when_statement_processing_fails(self):
+        app = self.make_ledger_app()
+        app.pdf_files = [self.statement("broken.pdf", b"broken")]
+
+        with patch("import_pipeline.read_statement", side_effect=RuntimeError("Cannot read file")), \
+                patch("purchase_tagger_app.messagebox.showerror") as showerror:
+            self.load_and_drain(app)
+
+        showerror.assert_called_once_with("Error", "broken.pdf: Cannot read file")
+        app.apply_filter.assert_called_once_with()
+        self.assertEqual(app.all_rows, [])
+
+    def test_load_skips_known_files_and_deduplicates_overlapping_statements(self):
+        app = self.make_ledger_app()
+        january = self.statement("jan.pdf", b"january")
+        overlap = self.statement("jan-feb.pdf", b"january and february")
+        cafe = ("05-ENE-25", "CAFE", Decimal("-80.00"), "USD")
+        taxi = ("07-FEB-25", "TAXI", Decimal("-20.00"), "USD")
+
+        app.pdf_files = [january]
+        with patch("import_pipeline.read_statement", return_value=[cafe, cafe]):
+            self.load_and_drain(app)
+        app.pdf_files = [january, overlap]
+        with patch("import_pipeline.read_statement", return_value=[cafe, cafe, taxi]) as read_statement, \
+                patch.object(app.ledger, "movements", side_effect=AssertionError("history re-read")):
+            self.load_and_drain(app)
+
+        read_statement.assert_called_once_with(overlap, "BAC", "Credito", page_workers=1)
+        self.assertEqual([row[1] for row in app.all_rows], ["CAFE", "CAFE", "TAXI"])
+        self.assertEqual(app.all_rows[2], ["07-FEB-25", "TAXI", "-20.00", "USD", "N/A", "-"])
+        self.assertEqual(
+            app.status_var.get(),
+            "Se cargaron y etiquetaron 1 compras nuevas; 2 duplicada(s) omitida(s); "
+            "1 archivo(s) tomado(s) del registro. Historial: 3 compras",
+        )
+
+    def test_load_streams_each_finished_file_into_the_table(self):
+        app = self.make_ledger_app()
+        app.pdf_files = [self.statement("jan.pdf", b"january"), self.statement("feb.pdf", b"february")]
+        february_ready = threading.Event()
+
+        def read_statement(path, bank, account_type, page_workers=None):
+            if path.endswith("feb.pdf"):
+                february_ready.wait(5)
+                return [("07-FEB-25", "TAXI", Decimal("-20.00"), "USD")]
+            return [("05-ENE-25", "CAFE", Decimal("-80.00"), "USD")]
+
+        with patch("import_pipeline.read_statement", side_effect=read_statement):
+            app.load()
+            for _ in range(200):
+                if app.all_rows:
+                    break
+                time.sleep(0.01)
+                app._drain_import_pipeline()
+            streamed = [row[1] for row in app.all_rows]
+            progress = app.status_var.get()
+            february_ready.set()
+            app.import_pipeline.join(timeout=5)
+            app._drain_import_pipeline()
+
+        self.assertEqual(streamed, ["CAFE"])
+        self.assertEqual(progress, "Procesando archivos... 1/2. Historial: 1 compras")
+        self.assertEqual([row[1] for row in app.all_rows], ["CAFE", "TAXI"])
+        self.assertEqual(app._rows_with_description("TAXI"), [app.all_rows[1]])
+        self.assertEqual(len(app.row_fingerprints), 2)
+        app.after.assert_called_with(100, app._drain_import_pipeline)
+
+    def test_load_reextracts_registered_files_only_when_parser_or_account_changes(self):
+        app = self.make_ledger_app()
+        january = self.statement("jan.pdf", b"january")
+        cafe = ("05-ENE-25", "CAFE", Decimal("-80.00"), "USD")
+        app.pdf_files = [january]
+        with patch("import_pipeline.read_statement", return_value=[cafe]):
+            self.load_and_drain(app)
+        app.tags["Dining"]["keywords"].append("SODA")
+
+        with patch("import_pipeline.read_statement", return_value=[cafe]) as read_statement:
+            self.load_and_drain(app)
+            read_statement.assert_not_called()
+            self.assertIn("1 archivo(s) tomado(s) del registro", app.status_var.get())
+            self.assertEqual(app.ledger.statement(file_sha256(january))["tags_version"], tags_version(app.tags))
+
+            with patch("purchase_tagger_app.PARSER_VERSION", PARSER_VERSION + 1):
+                self.load_and_drain(app)
+            read_statement.assert_called_once_with(january, "BAC", "Credito", page_workers=1)
+
+        statement = app.ledger.statement(file_sha256(january))
+        self.assertEqual(statement["parser_version"], PARSER_VERSION + 1)
+        self.assertEqual(statement["row_count"], 1)
+        self.assertEqual(len(app.all_rows), 1)
+
+    def test_folder_watch_appends_new_statements_to_history_without_blocking(self):
+        app = self.make_ledger_app()
+        app.after = Mock(return_value="after-id")
+        app.after_cancel = Mock()
+        folder = os.path.join(self.tmp.name, "inbox")
+        os.mkdir(folder)
+        statement = self.statement(os.path.join("inbox", "jan.pdf"), b"january")
+        os.utime(statement, (0, 0))
+        cafe = ("05-ENE-25", "CAFE", Decimal("-80.00"), "USD", "Dining", 0)
+
+        app.ledger_loaded = True
+        with patch("statement_watcher.process_purchases", return_value=[cafe]), \
+                patch.object(app.ledger, "movements", side_effect=AssertionError("history re-read")):
+            app.start_folder_watch(folder)
+            watcher = app.statement_watcher
+            for _ in range(100):
+                if not app.all_rows:
+                    time.sleep(0.01)
+                    app._poll_folder_watch()
+
+        self.assertEqual(app.all_rows, [["05-ENE-25", "CAFE", "-80.00", "USD", "Dining", "-"]])
+        self.assertEqual(app.status_var.get(), "1 archivo(s) nuevo(s): 1 compras agregadas. Historial: 1 compras")
+        app.after.assert_called_with(5000, app._poll_folder_watch)
+
+        app.stop_folder_watch()
+        app.after_cancel.assert_called_once_with("after-id")
+        self.assertIsNone(app.statement_watcher)
+        self.assertEqual(watcher.pending, 0)
+
+    def test_folder_watch_keeps_polling_after_an_unexpected_error(self):
+        app = self.make_ledger_app()
+        app.statement_watcher = Mock(pending=0)
+        app.statement_watcher.collect.side_effect = RuntimeError("unexpected")
+
+        with self.assertRaises(RuntimeError):
+            app._poll_folder_watch()
+
+        app.after.assert_called_once_with(5000, app._poll_folder_watch)
+        self.assertEqual(app.watch_after_id, "after-id")
+
+    def test_history_reloads_with_current_keywords_and_keeps_manual_tags(self):
+        app = self.make_ledger_app()
+        app.pdf_files = [self.statement("jan.pdf", b"january")]
+        with patch("import_pipeline.read_statement", return_value=[
+            ("05-ENE-25", "CAFE", Decimal("-80.00"), "USD"),
+            ("06-ENE-25", "SODA", Decimal("-15.00"), "USD"),
+        ]):
+            self.load_and_drain(app)
+        app.tree_item_rows = {"soda": app.all_rows[1]}
+        app.kpi_counters = None
+        app.tree = Mock()
+        with patch("purchase_tagger_app.save_tags") as save_tags:
+            app.assign_tag("soda", "Dining")
+        save_tags.assert_called_once_with(app.tags)
+        app.ledger.close()
+
+        reopened = self.make_ledger_app(tags={"Coffee": {"keywords": ["CAFE"], "limit": 0}, "Dining": {"keywords": [], "limit": 0}})
+        reopened.load_ledger_history()
+
+        self.assertEqual(
+            reopened.all_rows,
+            [
+                ["05-ENE-25", "CAFE", "-80.00", "USD", "Coffee", "-"],
+                ["06-ENE-25", "SODA", "-15.00", "USD", "Dining", "-"],
+            ],
+        )
+        self.assertTrue(reopened.ledger_loaded)
+        reopened.apply_filter.assert_called_once_with()
+
+    def test_bulk_assignment_writes_manual_tags_in_one_ledger_call(self):
+        app = self.make_ledger_app(tags={"Dining": {"keywords": [], "limit": 0}, "Treats": {"keywords": [], "limit": 0}})
+        app.pdf_files = [self.statement("jan.pdf", b"january")]
+        with patch("import_pipeline.read_statement", return_value=[
+            ("05-ENE-25", "SODA", Decimal("-15.00"), "USD"),
+            ("06-ENE-25", "CAFE", Decimal("-80.00"), "USD"),
+            ("07-ENE-25", "SODA", Decimal("-12.00"), "USD"),
+        ]):
+            self.load_and_drain(app)
+        app.tree_item_rows = {"soda": app.all_rows[0]}
+
+        with patch("purchase_tagger_app.save_tags"), \
+                patch.object(app.ledger, "set_manual_tags", wraps=app.ledger.set_manual_tags) as set_manual_tags:
+            self.assertEqual(app.assign_tag_to_description("soda", "Treats"), 2)
+
+        set_manual_tags.assert_called_once()
+        self.assertEqual(len(set_manual_tags.call_args.args[0]), 2)
+        self.assertEqual(
+            [movement[2:] for movement in app.ledger.movements()],
+            [
+                ("SODA", "-15.00", "USD", "Treats", True),
+                ("CAFE", "-80.00", "USD", "N/A", False),
+                ("SODA", "-12.00", "USD", "Treats", True),
+            ],
+        )
+
+    def test_clear_keeps_history_unless_the_selected_statements_are_removed(self):
+        app = self.make_session_app()
+        app.session_path = None
+        app.import_currency_var = SimpleVar("USD")
+        app.account_type_menu = FakeMenu()
+        app.tree_item_rows = {}
+        january = self.statement("jan.pdf", b"january")
+        february = self.statement("feb.pdf", b"february")
+        taxi = ("07-FEB-25", "TAXI", Decimal("-20.00"), "USD")
+        app.pdf_files = [january]
+        with patch("import_pipeline.read_statement", return_value=[("05-ENE-25", "CAFE", Decimal("-80.00"), "USD")]):
+            self.load_and_drain(app)
+        app.pdf_files = [january, february]
+        with patch("import_pipeline.read_statement", return_value=[taxi]):
+            self.load_and_drain(app)
+        app.search_var.set("taxi")
+
+        with patch("purchase_tagger_app.messagebox.askyesno", return_value=False) as askyesno:
+            app.clear_pdfs()
+
+        askyesno.assert_called_once_with(
+            "Limpiar", "¿Quitar también del historial las compras de 2 archivo(s) seleccionado(s)?"
+        )
+        self.assertEqual(app.pdf_files, [])
+        self.assertEqual(app.search_var.get(), "")
+        self.assertEqual([row[1] for row in app.all_rows], ["CAFE", "TAXI"])
+        self.assertEqual(app.status_var.get(), "No hay archivos seleccionados. Historial: 2 compras")
+
+        app.pdf_files = [february]
+        with patch("purchase_tagger_app.messagebox.askyesno", return_value=True):
+            app.clear_pdfs()
+
+        self.assertEqual([row[1] for row in app.all_rows], ["CAFE"])
+        self.assertEqual([movement[2] for movement in app.ledger.movements()], ["CAFE"])
+        self.assertFalse(app.ledger.has_statement(file_sha256(february)))
+        self.assertEqual(app.status_var.get(), "Se quitaron 1 archivo(s) del historial. Historial: 1 compras")
+
+        app.pdf_files = [february]
+        with patch("import_pipeline.read_statement", return_value=[taxi]) as read_statement:
+            self.load_and_drain(app)
+        read_statement.assert_called_once_with(february, "BAC", "Credito", page_workers=1)
+        self.assertEqual([row[1] for row in app.all_rows], ["CAFE", "TAXI"])
+
+    def test_renamed_and_removed_tags_stay_applied_to_manual_rows_after_reload(self):
+        tags = {"Snacks": {"keywords": [], "limit": 0}, "Rides": {"keywords": [], "limit": 0}}
+        app = self.make_ledger_app(tags=tags)
+        app.pdf_files = [self.statement("jan.pdf", b"january")]
+        with patch("import_pipeline.read_statement", return_value=[
+            ("05-ENE-25", "SODA", Decimal("-15.00"), "USD"),
+            ("06-ENE-25", "TAXI", Decimal("-20.00"), "USD"),
+        ]):
+            self.load_and_drain(app)
+        app.tree_item_rows = {"soda": app.all_rows[0], "taxi": app.all_rows[1]}
+        app.kpi_counters = None
+        app.tree = Mock()
+        app.tag_listbox = FakeListbox()
+        app.tag_listbox.items = ["Rides", "Snacks"]
+        app.keyword_listbox = FakeListbox()
+        app.limit_var = SimpleVar("0")
+        with patch("purchase_tagger_app.save_tags"), \
+                patch("purchase_tagger_app.simple_input", return_value="Treats"), \
+                patch("purchase_tagger_app.messagebox.askyesno", return_value=True):
+            app.assign_tag("soda", "Snacks")
+            app.assign_tag("taxi", "Rides")
+            app.tag_listbox.selection_set(1)
+            app.edit_tag()
+            app.tag_listbox.selection_set(0)
+            app.remove_tag()
+        app.ledger.close()
+
+        reopened = self.make_ledger_app(tags=app.tags)
+        reopened.load_ledger_history()
+
+        self.assertEqual([row[4] for row in reopened.all_rows], ["Treats", "N/A"])
+        self.assertEqual([movement[5:] for movement in reopened.ledger.movements()], [("Treats", True), ("N/A", True)])
+
+    def make_session_app(self, tags=None):
+        app = self.make_ledger_app(tags=tags)
+        app.session_path = os.path.join(self.tmp.name, "session.snapshot")
+        app.session_after_id = None
+        app.search_var = SimpleVar("")
+        app.currency_var = SimpleVar("Todas las monedas")
+        app.month_var = SimpleVar("Todos")
+        app.tag_filter_var = SimpleVar("Todos")
+        app.file_label_var = SimpleVar("")
+        app.active_view = "Imports"
+        app.nav_buttons = {"Imports": None, "Purchases": None}
+        app.show_view = Mock()
+        return app
+
+    def saved_session_app(self):
+        app = self.make_session_app()
+        app.pdf_files = [self.statement("jan.pdf", b"january")]
+        with patch("import_pipeline.read_statement", return_value=[
+            ("05-ENE-25", "CAFE", Decimal("-80.00"), "USD"),
+            ("06-ENE-25", "SODA", Decimal("-15.00"), "USD"),
+        ]):
+            self.load_and_drain(app)
+        app.tree_item_rows = {"soda": app.all_rows[1]}
+        app.kpi_counters = None
+        app.tree = Mock()
+        with patch("purchase_tagger_app.save_tags"):
+            app.assign_tag("soda", "Dining")
+        app.search_var.set("soda")
+        app.tag_filter_var.set("Dining")
+        app.sort_spec = [("amount", True)]
+        app.active_view = "Purchases"
+        self.assertTrue(app.save_session())
+        return app
+
+    def test_session_snapshot_restores_workspace_without_reading_the_ledger(self):
+        app = self.saved_session_app()
+        reopened = self.make_session_app(tags=json.loads(json.dumps(app.tags)))
+
+        with patch.object(reopened.ledger, "movements", side_effect=AssertionError("ledger read")):
+            reopened.load_ledger_history()
+
+        self.assertEqual(reopened.all_rows, app.all_rows)
+        self.assertEqual(sorted(reopened.row_fingerprints.values()), sorted(app.row_fingerprints.values()))
+        self.assertEqual(reopened.retag_engine.manual, {id(reopened.all_rows[1])})
+        self.assertEqual(reopened.pdf_files, app.pdf_files)
+        self.assertEqual((reopened.search_var.get(), reopened.tag_filter_var.get()), ("soda", "Dining"))
+        self.assertEqual(reopened.sort_spec, [("amount", True)])
+        self.assertTrue(reopened.ledger_loaded)
+        self.assertEqual(reopened.status_var.get(), "Sesión restaurada. Historial: 2 compras")
+        reopened.apply_filter.assert_called_once_with()
+        reopened.show_view.assert_called_once_with("Purchases")
+
+    def test_stale_or_damaged_session_falls_back_to_the_ledger(self):
+        app = self.saved_session_app()
+        tags = json.loads(json.dumps(app.tags))
+        with open(app.session_path, "rb") as f:
+            saved = f.read()
+
+        with patch("import_pipeline.read_statement", return_value=[("07-ENE-25", "TAXI", Decimal("-9.00"), "USD")]):
+            app.pdf_files = [self.statement("feb.pdf", b"february")]
+            self.load_and_drain(app)
+        app.ledger.close()
+        stale = self.make_session_app(tags=tags)
+        stale.load_ledger_history()
+        self.assertEqual(len(stale.all_rows), 3)
+        self.assertEqual(stale.status_var.get(), "Historial: 3 compras")
+        stale.ledger.close()
+
+        with open(app.session_path, "wb") as f:
+            f.write(saved[:-3] + b"xyz")
+        damaged = self.make_session_app(tags=tags)
+        damaged.load_ledger_history()
+        self.assertEqual(len(damaged.all_rows), 3)
+        self.assertEqual(damaged.status_var.get(), "Historial: 3 compras")
+
+    def test_session_saves_are_debounced_and_skipped_before_history_loads(self):
+        app = self.make_session_app()
+
+        app._schedule_session_save()
+        app._schedule_session_save()
+
+        app.after_cancel.assert_called_once_with("after-id")
+        app.after.assert_called_with(2000, app.save_session)
+        self.assertFalse(app.save_session())
+        self.assertFalse(os.path.exists(app.session_path))
+
+
+class CountingTree:
+    def __init__(self):
+        self.count = 0
+
+    def get_children(self, parent=""):
+        return ()
+
+    def delete(self, *item_iids):
+        pass
+
+    def insert(self, parent, index, values=None, tags=()):
+        self.count += 1
+        return f"I{self.count:05X}"
+
+    def tag_configure(self, tag_name, **options):
+        pass
+
+    def winfo_exists(self):
+        return 1
+
+
+class PurchaseTaggerMemoryBudgetTest(unittest.TestCase):
+    ROWS = 10_000
+    FILES = 4
+    MONTHS = ("ENE", "FEB", "MAR", "ABR", "MAY", "JUN", "JUL", "AGO", "SEP", "OCT", "NOV", "DIC")
+    TAGS = ("Dining", "Groceries", "Fuel", "Rides", "Health", "Home", "Kids")
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def statement_purchases(self, start, count):
+        return [
+            (
+                f"{1 + index % 28:02d}-{self.MONTHS[index % 12]}-{24 + index % 2}",
+                f"MERCHANT {index % 700} SAN JOSE",
+                Decimal(-(index % 5000)) - Decimal("0.75"),
+                "USD" if index % 3 == 0 else "CRC",
+            )
+            for index in range(start, start + count)
+        ]
+
+    def make_app(self, files=FILES):
         app = object.__new__(PurchaseTaggerUI)
-        app.pdf_files = [r"C:\tmp\broken.pdf"]
+        app.tags = {
+            tag: {"keywords": [f"MERCHANT {index + 1}"], "limit": 100}
+            for index, tag in enumerate(self.TAGS)
+        }
+        app.natag = "N/A"
+        app.ledger = PurchaseLedger(os.path.join(self.tmp.name, "ledger.sqlite3"))
+        self.addCleanup(app.ledger.close)
+        app.ledger_loaded = False
+        app.row_fingerprints = {}
+        app.pdf_files = []
+        for index in range(files):
+            path = os.path.join(self.tmp.name, f"{index}.pdf")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(str(index))
+            app.pdf_files.append(path)
         app.all_rows = []
+        app.filtered_rows = []
+        app.tree_item_rows = {}
         app.status_var = SimpleVar("")
-        app.bank_var = SimpleVar("BAC")
-        app.account_type_var = SimpleVar("Debito")
-        app.apply_filter = Mock()
         app.update_idletasks = Mock()
+        app.after = Mock(return_value="after-id")
+        app.after_cancel = Mock()
+        app.import_executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(app.import_executor.shutdown)
+        app.search_var = SimpleVar("")
+        app.currency_var = SimpleVar("Todas las monedas")
+        app.month_var = SimpleVar("Todos")
+        app.tag_filter_var = SimpleVar("Todos")
+        app.total_var = SimpleVar("")
+        app.visible_count_var = SimpleVar("")
+        app.currency_menu = FakeMenu()
+        app.month_menu = FakeMenu()
+        app.tag_menu = FakeMenu()
+        return app
 
-        with patch("purchase_tagger_app.process_purchases", side_effect=RuntimeError("Cannot read file")), \
-                patch("purchase_tagger_app.messagebox.showerror") as showerror:
+    def load(self, app, per_file):
+        # Cada estado se arma al leerlo, como al extraer un PDF, para que sus
+        # textos cuenten en la memoria de la carga.
+        def read_statement(path, bank, account_type, page_workers=None):
+            index = int(os.path.splitext(os.path.basename(path))[0])
+            return self.statement_purchases(index * per_file, per_file)
+
+        with patch("import_pipeline.read_statement", side_effect=read_statement), \
+                patch("purchase_tagger_app.TAG_SAVER"):
             app.load()
+            for _ in range(3000):
+                if app.__dict__.get("import_pipeline") is None:
+                    break
+                time.sleep(0.01)
+                app._drain_import_pipeline()
+        self.assertIsNone(app.import_pipeline)
 
-        showerror.assert_called_once_with("Error", "broken.pdf: Cannot read file")
-        app.apply_filter.assert_called_once_with()
+    def assert_within_budget(self, operation, probe):
+        self.assertEqual(budget_overruns(operation, probe.per_rows(self.ROWS)), [])
+
+    def test_load_filter_and_summary_stay_within_memory_budgets_per_100k_rows(self):
+        app = self.make_app()
+
+        with patch.object(PurchaseTaggerUI, "apply_filter"):
+            with MemoryProbe() as load:
+                self.load(app, self.ROWS // self.FILES)
+        app.tree = CountingTree()
+        with MemoryProbe() as apply_filter:
+            app.apply_filter()
+        app.summary_frame = FakeFrame()
+        app.summary_currency_vars = {"USD": SimpleVar(True), "CRC": SimpleVar(False)}
+        app.summary_month_var = SimpleVar("Todos")
+        app.summary_choice_var = SimpleVar("Gasto por etiqueta")
+        with patch("purchase_tagger_app.plt.subplots", return_value=(FakeFigure(), FakeAxes())), \
+                patch("purchase_tagger_app.FigureCanvasTkAgg", return_value=FakeCanvas()):
+            with MemoryProbe() as draw_summary:
+                app.draw_summary()
+
+        self.assertEqual(len(app.all_rows), self.ROWS)
+        self.assertEqual(len(app.tree_item_rows), self.ROWS)
+        self.assert_within_budget("load", load)
+        self.assert_within_budget("apply_filter", apply_filter)
+        self.assert_within_budget("draw_summary", draw_summary)
+
+    def test_loaded_rows_share_repeated_strings_and_filter_by_index(self):
+        app = self.make_app(files=1)
+        with patch.object(PurchaseTaggerUI, "apply_filter"):
+            self.load(app, 1400)
+
+        first, repeated = app.all_rows[0], app.all_rows[700]
+        self.assertEqual(first[1], repeated[1])
+        self.assertIs(first[1], repeated[1])
+        self.assertIs(first[4], repeated[4])
+        self.assertEqual(len(app.string_pool), len({value for row in app.all_rows for value in row}))
+
+        app.tag_filter_var.set("Fuel")
+        PurchaseTaggerUI.apply_filter(app)
+
+        self.assertIsInstance(app.filtered_rows, FilteredRows)
+        self.assertIs(app.filtered_rows.rows, app.all_rows)
+        self.assertTrue(app.filtered_rows)
+        self.assertEqual(list(app.filtered_rows.indexes), [index for index, row in enumerate(app.all_rows) if row[4] == "Fuel"])
+
+    def test_memory_report_prints_after_load_only_in_report_mode(self):
+        app = self.make_app(files=2)
+        app.apply_filter = Mock()
+        with patch("purchase_tagger_app.collect_memory_report", return_value=None) as collect, \
+                patch("builtins.print") as printed:
+            app.pdf_files, later = app.pdf_files[:1], app.pdf_files[1:]
+            self.load(app, 3)
+            collect.assert_not_called()
+            app.memory_report = True
+            app.pdf_files = later
+            self.load(app, 3)
+
+        collect.assert_called_once_with(app)
+        printed.assert_called_once_with("Reporte de memoria: tracemalloc no esta activo", flush=True)
 
 
 class PurchaseTaggerDisplayRowTest(unittest.TestCase):
@@ -882,6 +1420,7 @@ class PurchaseTaggerRowMappingTest(unittest.TestCase):
 
         with patch("purchase_tagger_app.save_tags") as save_tags:
             app.assign_tag("item-b", "Groceries")
+            self.assertTrue(app.flush_tag_saves())
 
         self.assertEqual(app.tags["Groceries"]["keywords"], ["BANANA MARKET"])
         save_tags.assert_called_once_with(app.tags)
@@ -984,9 +1523,10 @@ class PurchaseTaggerRowMappingTest(unittest.TestCase):
         self.assertEqual(app.tree.items["item-1"][5], "Groceries")
         self.assertEqual(app.kpi_vars["total_rows"].get(), "2")
         self.assertEqual(app.kpi_vars["visible_rows"].get(), "1")
-        self.assertEqual(app.currency_menu.values, ["Todas las monedas", "CRC", "USD"])
-        self.assertEqual(app.month_menu.values, ["Todos", "2025-01", "2025-02"])
-        self.assertEqual(app.tag_menu.values, ["Todos", "Groceries", "Shopping"])
+        self.assertEqual(app.currency_menu.values, ["Todas las monedas", "CRC (1)", "USD (1)"])
+        self.assertEqual(app.month_menu.values, ["Todos", "2025-01 (1)", "2025-02 (1)"])
+        self.assertEqual(app.tag_menu.values, ["Todos", "Groceries (1)", "Shopping (1)"])
+        self.assertEqual(app.tag_menu.shown, "Groceries (1)")
 
     def test_purchase_table_declares_visible_tag_column_order(self):
         app = object.__new__(PurchaseTaggerUI)
@@ -1091,6 +1631,168 @@ class PurchaseTaggerRowMappingTest(unittest.TestCase):
         self.assertEqual(app.total_var.get(), "Totales: USD 20.00")
         self.assertEqual(app.kpi_vars["untagged_rows"].get(), "1")
 
+    def make_filtered_app(self, rows, tags, tag_filter="Todos"):
+        app = object.__new__(PurchaseTaggerUI)
+        app.tags = tags
+        app.all_rows = rows
+        app.filtered_rows = []
+        app.tree_item_rows = {}
+        app.tree = FakeTree()
+        app.search_var = SimpleVar("")
+        app.currency_var = SimpleVar("Todas las monedas")
+        app.month_var = SimpleVar("Todos")
+        app.tag_filter_var = SimpleVar(tag_filter)
+        app.total_var = SimpleVar("")
+        app.visible_count_var = SimpleVar("")
+        app.status_var = SimpleVar("")
+        app.kpi_vars = {
+            "total_rows": SimpleVar("0"),
+            "visible_rows": SimpleVar("0"),
+            "untagged_rows": SimpleVar("0"),
+            "currency_count": SimpleVar("0"),
+            "over_limit_tags": SimpleVar("0"),
+        }
+        app.currency_menu = FakeMenu()
+        app.month_menu = FakeMenu()
+        app.tag_menu = FakeMenu()
+        app.natag = "N/A"
+        app.apply_filter()
+        return app
+
+    def test_assign_tag_updates_only_the_affected_row_and_kpis_by_delta(self):
+        rows = [
+            ["01-ENE-25", "APPLE STORE", "-10.00", "USD", "N/A", "-"],
+            ["02-ENE-25", "BANANA MARKET", "-20.00", "USD", "N/A", "-"],
+        ]
+        app = self.make_filtered_app(rows, {"Groceries": {"keywords": [], "limit": 5, "planned_amount": 5}})
+        item_iid = app.tree.visible_order[1]
+
+        with patch("purchase_tagger_app.save_tags") as save_tags, \
+                patch.object(app, "apply_filter") as apply_filter:
+            app.assign_tag(item_iid, "Groceries")
+            app.flush_tag_saves()
+
+        apply_filter.assert_not_called()
+        save_tags.assert_called_once_with(app.tags)
+        self.assertEqual(app.tree.deleted, [])
+        self.assertEqual(app.tree.items[item_iid][5], "Groceries")
+        self.assertEqual(app.kpi_vars["untagged_rows"].get(), "1")
+        self.assertEqual(app.kpi_vars["visible_rows"].get(), "2")
+        self.assertEqual(app.kpi_vars["over_limit_tags"].get(), "1")
+        self.assertEqual(app.total_var.get(), "Totales: USD -30.00")
+        self.assertEqual(app.tag_menu.values, ["Todos", "Groceries (1)", "N/A (1)"])
+
+    def test_assign_tag_removes_row_that_leaves_active_tag_filter(self):
+        rows = [
+            ["01-ENE-25", "APPLE STORE", "10.00", "USD", "N/A"],
+            ["02-ENE-25", "BANANA MARKET", "20.00", "CRC", "N/A"],
+        ]
+        app = self.make_filtered_app(rows, {"Groceries": {"keywords": ["BANANA"], "limit": 0}}, tag_filter="N/A")
+        item_iid = app.tree.visible_order[1]
+
+        with patch("purchase_tagger_app.save_tags") as save_tags:
+            app.assign_tag(item_iid, "Groceries")
+            app.flush_tag_saves()
+
+        save_tags.assert_called_once()
+        self.assertEqual(app.tree.deleted, [item_iid])
+        self.assertEqual(app.filtered_rows, [rows[0]])
+        self.assertEqual(list(app.tree_item_rows.values()), [rows[0]])
+        self.assertEqual(app.visible_count_var.get(), "Mostrando 1 compras")
+        self.assertEqual(app.total_var.get(), "Totales: USD 10.00")
+        self.assertEqual(app.kpi_vars["currency_count"].get(), "1")
+
+    def test_filter_menus_are_reconfigured_only_when_their_options_change(self):
+        rows = [
+            ["01-ENE-25", "SUPER MARKET", "-10.00", "USD", "N/A", "-"],
+            ["02-FEB-25", "CAFE", "-3.00", "CRC", "N/A", "-"],
+        ]
+        app = self.make_filtered_app(rows, {"Dining": {"keywords": [], "limit": 0}})
+        for menu in (app.currency_menu, app.month_menu, app.tag_menu):
+            menu.configure = Mock(wraps=menu.configure)
+
+        app.search_var.set("cafe")
+        app.apply_filter()
+        with patch("purchase_tagger_app.save_tags"):
+            app.assign_tag(app.tree.visible_order[0], "Dining")
+
+        app.currency_menu.configure.assert_not_called()
+        app.month_menu.configure.assert_not_called()
+        app.tag_menu.configure.assert_called_once_with(values=["Todos", "Dining (1)", "N/A (1)"])
+
+        app.currency_menu = FakeMenu()
+        app.apply_filter()
+        self.assertEqual(app.currency_menu.values, ["Todas las monedas", "CRC (1)", "USD (1)"])
+        app.month_menu.configure.assert_not_called()
+
+    def test_filter_menu_labels_show_row_counts_and_filter_by_value(self):
+        rows = [
+            ["01-ENE-25", "SUPER MARKET", "-10.00", "USD", "N/A", "-"],
+            ["02-ENE-25", "CAFE", "-3.00", "CRC", "N/A", "-"],
+            ["03-FEB-25", "TAXI", "-4.00", "CRC", "N/A", "-"],
+        ]
+        app = self.make_filtered_app(rows, {})
+
+        app._select_filter_option("currency_menu", "currency_var", "CRC (2)")
+
+        self.assertEqual(app.currency_var.get(), "CRC")
+        self.assertEqual(app.currency_menu.shown, "CRC (2)")
+        self.assertEqual(app.month_menu.values, ["Todos", "2025-01 (2)", "2025-02 (1)"])
+        self.assertEqual(app.filtered_rows, rows[1:])
+
+        app.reset_filters()
+
+        self.assertEqual(app.currency_menu.shown, "Todas las monedas")
+        self.assertEqual(len(app.filtered_rows), 3)
+
+    def test_tag_changes_keep_facet_index_in_sync_with_rows(self):
+        rows = [
+            ["01-ENE-25", "SUPER MARKET", "-10.00", "USD", "N/A", "-"],
+            ["02-ENE-25", "CAFE", "-3.00", "USD", "N/A", "-"],
+            ["03-FEB-25", "SUPER MARKET", "-20.00", "CRC", "N/A", "-"],
+            ["04-FEB-25", "SUPER STORE", "-4.00", "USD", "N/A", "-"],
+        ]
+        app = self.make_filtered_app(rows, {"Groceries": {"keywords": [], "limit": 0}, "Dining": {"keywords": [], "limit": 0}})
+        facets = app.facet_index
+
+        with patch("purchase_tagger_app.save_tags"):
+            app.assign_tag(app.tree.visible_order[1], "Dining")
+            self.assertEqual(facets.bits, FacetIndex(rows).bits)
+            app.assign_tag_to_description(app.tree.visible_order[0], "Groceries")
+            self.assertEqual(facets.bits, FacetIndex(rows).bits)
+            app.tags["Dining"]["keywords"] = ["SUPER"]
+            app.retag_rows_for_keywords(added=["SUPER"])
+
+        self.assertIs(app.facet_index, facets)
+        self.assertEqual(facets.bits, FacetIndex(rows).bits)
+        self.assertEqual(rows[3][4], "Dining")
+        self.assertEqual(facets.counts("tag"), {"Dining": 2, "Groceries": 2})
+        app.tag_filter_var.set("Groceries")
+        app.apply_filter()
+        self.assertEqual(app.filtered_rows, [rows[0], rows[2]])
+
+    def test_assign_tag_to_description_retags_all_matching_rows_once(self):
+        rows = [
+            ["01-ENE-25", "SUPER MARKET", "-10.00", "USD", "N/A", "-"],
+            ["02-ENE-25", "CAFE", "-3.00", "USD", "N/A", "-"],
+            ["03-ENE-25", "SUPER MARKET", "-20.00", "USD", "N/A", "-"],
+            ["04-FEB-25", "SUPER MARKET", "-5.00", "USD", "Misc", "-"],
+        ]
+        app = self.make_filtered_app(rows, {"Groceries": {"keywords": [], "limit": 0}, "Misc": {"keywords": []}})
+        item_iid = app.tree.visible_order[0]
+
+        with patch("purchase_tagger_app.save_tags") as save_tags, \
+                patch.object(app, "apply_filter") as apply_filter:
+            changed = app.assign_tag_to_description(item_iid, "Groceries")
+            app.flush_tag_saves()
+
+        self.assertEqual(changed, 3)
+        self.assertEqual([row[4] for row in rows], ["Groceries", "N/A", "Groceries", "Groceries"])
+        self.assertEqual(app.tags["Groceries"]["keywords"], ["SUPER MARKET"])
+        save_tags.assert_called_once_with(app.tags)
+        apply_filter.assert_called_once_with()
+        self.assertEqual(app.status_var.get(), 'Se asignó "Groceries" a 3 compra(s) con la descripción "SUPER MARKET"')
+
     def test_clear_workspace_widget_refs_preserves_app_state_vars(self):
         app = object.__new__(PurchaseTaggerUI)
         app.tree = object()
@@ -2143,6 +2845,39 @@ class PurchaseTaggerRowMappingTest(unittest.TestCase):
         self.assertEqual(app.keyword_listbox.items, [])
         save_tags.assert_called_once_with(app.tags)
 
+    def test_keyword_changes_retag_loaded_rows_and_keep_manual_assignments(self):
+        app = object.__new__(PurchaseTaggerUI)
+        app.tags = {"Dining": {"keywords": [], "limit": 0}}
+        app.natag = "N/A"
+        app.all_rows = [
+            ["01-ENE-25", "CAFE CENTRAL", "-5.00", "USD", "N/A", "-"],
+            ["02-ENE-25", "CAFE CENTRAL", "-6.00", "USD", "N/A", "-"],
+            ["03-ENE-25", "BOOK STORE", "-7.00", "USD", "N/A", "-"],
+        ]
+        app.tag_listbox = FakeListbox()
+        app.tag_listbox.items = ["Dining"]
+        app.tag_listbox.selection_set(0)
+        app.keyword_listbox = FakeListbox()
+        app.limit_var = SimpleVar("0")
+        app.status_var = SimpleVar("")
+        app.apply_filter = Mock()
+        app._retag_engine().mark_manual(app.all_rows[1])
+
+        with patch("purchase_tagger_app.simple_input", return_value="cafe"), \
+                patch("purchase_tagger_app.save_tags"):
+            app.add_keyword()
+
+        self.assertEqual([row[4] for row in app.all_rows], ["Dining", "N/A", "N/A"])
+        app.apply_filter.assert_called_once_with()
+        self.assertIn("1 compra re-etiquetada", app.status_var.get())
+
+        app.keyword_listbox.selection_set(0)
+        with patch("purchase_tagger_app.messagebox.askyesno", return_value=True), \
+                patch("purchase_tagger_app.save_tags"):
+            app.remove_keyword()
+
+        self.assertEqual([row[4] for row in app.all_rows], ["N/A", "N/A", "N/A"])
+
     def test_draw_summary_shows_empty_state_before_currency_state(self):
         app = object.__new__(PurchaseTaggerUI)
         app.all_rows = []
@@ -2373,18 +3108,72 @@ class PurchaseTaggerRowMappingTest(unittest.TestCase):
         self.assertEqual(len(ax.pie_calls), 1)
         self.assertEqual(len(ax.bar_calls), 0)
 
-    def test_sort_column_uses_decimal_for_amounts(self):
+    def make_sort_app(self, rows):
         app = object.__new__(PurchaseTaggerUI)
-        app.tree = FakeTree(["row-a", "row-b", "row-c"])
-        app.tree.items = {
-            "row-a": ["01-ENE-25", "A", "10.00", "USD", "Misc"],
-            "row-b": ["02-ENE-25", "B", "2.00", "USD", "Misc"],
-            "row-c": ["03-ENE-25", "C", "1,000.00", "USD", "Misc"],
-        }
+        app.filtered_rows = list(rows)
+        app.tree_item_rows = {}
+        app.tree = FakeTree()
+        return app
+
+    def rendered_values(self, app, column_index):
+        return [app.tree.items[iid][column_index] for iid in app.tree.visible_order]
+
+    def test_sort_column_uses_decimal_for_amounts(self):
+        app = self.make_sort_app([
+            ["01-ENE-25", "A", "10.00", "USD", "Misc"],
+            ["02-ENE-25", "B", "2.00", "USD", "Misc"],
+            ["03-ENE-25", "C", "1,000.00", "USD", "Misc"],
+        ])
 
         app.sort_column("amount", False)
 
-        self.assertEqual(app.tree.visible_order, ["row-b", "row-a", "row-c"])
+        self.assertEqual(self.rendered_values(app, 1), ["B", "A", "C"])
+        self.assertEqual([row[1] for row in app.filtered_rows], ["B", "A", "C"])
+        self.assertEqual(list(app.tree_item_rows.values()), app.filtered_rows)
+
+    def test_sort_column_orders_spanish_dates_chronologically(self):
+        app = self.make_sort_app([
+            ["02-ENE-24", "B", "1.00", "USD", "Misc"],
+            ["01-ABR-24", "D", "1.00", "USD", "Misc"],
+            ["15-DIC-23", "A", "1.00", "USD", "Misc"],
+            ["28-FEB-24", "C", "1.00", "USD", "Misc"],
+        ])
+
+        app.sort_column("date", False)
+        self.assertEqual(self.rendered_values(app, 1), ["A", "B", "C", "D"])
+
+        app.sort_column("date", True)
+        self.assertEqual(self.rendered_values(app, 1), ["D", "C", "B", "A"])
+
+    def test_sort_column_keeps_previous_column_as_stable_secondary_order(self):
+        app = self.make_sort_app([
+            ["02-ENE-25", "CAFE", "5.00", "USD", "Dining"],
+            ["01-ENE-25", "MARKET", "9.00", "USD", "Groceries"],
+            ["01-ENE-25", "BAKERY", "3.00", "USD", "Dining"],
+        ])
+
+        app.sort_column("date", False)
+        app.sort_column("tag", False)
+
+        self.assertEqual(self.rendered_values(app, 1), ["BAKERY", "CAFE", "MARKET"])
+        self.assertEqual(app.sort_spec, [("tag", False), ("date", False)])
+
+    def test_apply_filter_keeps_active_sort_order(self):
+        rows = [
+            ["02-ENE-25", "CAFE", "5.00", "USD", "Dining"],
+            ["01-ENE-25", "MARKET", "9.00", "USD", "Groceries"],
+        ]
+        app = self.make_sort_app(rows)
+        app.all_rows = rows
+        app.tags = {}
+        app.natag = "N/A"
+        app.total_var = SimpleVar("")
+        app.sort_spec = [("date", False)]
+
+        app.apply_filter()
+
+        self.assertEqual(self.rendered_values(app, 1), ["MARKET", "CAFE"])
+        self.assertEqual([row[1] for row in rows], ["CAFE", "MARKET"])
 
     def test_export_csv_writes_visible_sign_column_order(self):
         app = object.__new__(PurchaseTaggerUI)
@@ -0,0 +1,62 @@
+from retag_engine import RetagEngine
+
+
+def make_rows():
+    return [
+        ["01-ENE-25", "Super Market Escazu", "-10.00", "CRC", "N/A", "-"],
+        ["02-ENE-25", "UBER TRIP", "-3.00", "USD", "Transport", "-"],
+        ["03-ENE-25", "SUPER MARKET ESCAZU", "-20.00", "CRC", "N/A", "-"],
+        ["04-ENE-25", "CAFE", "-4.00", "USD", "N/A", "-"],
+    ]
+
+
+def test_added_keyword_retags_only_rows_containing_it():
+    rows = make_rows()
+    engine = RetagEngine(rows)
+    tags = {"Groceries": {"keywords": ["market"]}, "Transport": {"keywords": ["UBER"]}}
+
+    result = engine.apply_keyword_changes(tags, added=["market"])
+
+    assert [row[4] for row in rows] == ["Groceries", "Transport", "Groceries", "N/A"]
+    assert result["changed"] == 2
+    assert result["examined"] == 2
+    assert result["seconds"] >= 0
+
+
+def test_removed_keyword_falls_back_to_next_matching_tag_or_natag():
+    rows = make_rows()
+    engine = RetagEngine(rows)
+    tags = {"Groceries": {"keywords": ["MARKET"]}, "Shops": {"keywords": ["ESCAZU"]}}
+    engine.apply_keyword_changes(tags, added=["MARKET"])
+
+    tags["Groceries"]["keywords"].remove("MARKET")
+    result = engine.apply_keyword_changes(tags, removed=["MARKET"])
+
+    assert [row[4] for row in rows] == ["Shops", "Transport", "Shops", "N/A"]
+    assert result["changed"] == 2
+
+
+def test_manual_assignments_are_preserved():
+    rows = make_rows()
+    engine = RetagEngine(rows)
+    engine.mark_manual(rows[2])
+    rows[2][4] = "Household"
+
+    result = engine.apply_keyword_changes({"Groceries": {"keywords": ["MARKET"]}}, added=["MARKET"])
+
+    assert rows[0][4] == "Groceries"
+    assert rows[2][4] == "Household"
+    assert result["changed"] == 1
+
+
+def test_rebuilt_engine_keeps_manual_marks_for_live_rows_only():
+    rows = make_rows()
+    engine = RetagEngine(rows)
+    engine.mark_manual(rows[0])
+    rows.append(["05-ENE-25", "CAFE", "-1.00", "USD", "N/A", "-"])
+
+    assert not engine.is_current(rows)
+    rebuilt = RetagEngine(rows, manual=engine.manual | {12345})
+
+    assert rebuilt.manual == {id(rows[0])}
+    assert rebuilt.is_current(rows)
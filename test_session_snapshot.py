@@ -0,0 +1,72 @@
+import hashlib
+import os
+import struct
+import tempfile
+import unittest
+
+from session_snapshot import (
+    SESSION_MAGIC,
+    SessionSnapshotError,
+    decode_session,
+    encode_rows,
+    encode_session,
+    read_session,
+    write_session,
+)
+
+
+ROWS = [
+    ["05-ENE-25", "CAFÉ CENTRAL", "-80.00", "USD", "Dining", "-"],
+    ["06-ENE-25", "SODA", "-15.00", "CRC", "N/A", "-"],
+    ["05-ENE-25", "CAFÉ CENTRAL", "-80.00", "USD", "Dining", "-"],
+]
+STATE = {"search": "café", "pdf_files": ["jan.pdf"], "ledger": [3, 3, 4096, 1]}
+
+
+def fingerprint(index):
+    return hashlib.sha256(str(index).encode()).hexdigest()
+
+
+class SessionSnapshotTest(unittest.TestCase):
+    def snapshot(self, fingerprints=None):
+        fingerprints = fingerprints or [fingerprint(index) for index in range(len(ROWS))]
+        return encode_session(STATE, encode_rows(ROWS, fingerprints, [1]))
+
+    def test_round_trip_restores_rows_fingerprints_manual_rows_and_state(self):
+        session = decode_session(self.snapshot())
+
+        self.assertEqual(session["rows"], ROWS)
+        self.assertEqual(session["fingerprints"], [fingerprint(index) for index in range(3)])
+        self.assertEqual(session["manual"], [1])
+        self.assertEqual(session["state"], STATE)
+        # Los textos repetidos salen de una sola tabla.
+        self.assertIs(session["rows"][0][1], session["rows"][2][1])
+
+    def test_fingerprints_that_are_not_sha256_are_stored_as_text(self):
+        session = decode_session(self.snapshot(["fp-1", "fp-2", "FP-3"]))
+
+        self.assertEqual(session["fingerprints"], ["fp-1", "fp-2", "FP-3"])
+
+    def test_damaged_or_foreign_snapshots_are_rejected(self):
+        data = self.snapshot()
+        flipped = bytearray(data)
+        flipped[-5] ^= 0xFF
+        newer = data[:8] + struct.pack("<H", 99) + data[10:]
+
+        for damaged in (bytes(flipped), newer, data[:20], b"PK\x03\x04" + data[4:], SESSION_MAGIC):
+            with self.assertRaises(SessionSnapshotError):
+                decode_session(damaged)
+
+    def test_write_replaces_the_file_and_missing_file_reads_as_none(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "session.snapshot")
+            self.assertIsNone(read_session(path))
+
+            write_session(self.snapshot(), path)
+
+            self.assertEqual(os.listdir(tmp), ["session.snapshot"])
+            self.assertEqual(read_session(path)["rows"], ROWS)
+
+
+if __name__ == "__main__":
+    unittest.main()
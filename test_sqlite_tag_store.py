@@ -0,0 +1,146 @@
+import json
+import os
+import sqlite3
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+import unittest
+
+import tag_store
+from sqlite_tag_store import find_tags_by_keyword, save_sqlite_tags
+from tag_store import load_tags, merge_tags, save_tags
+
+
+LIBRARY = {
+    "Dining": {
+        "keywords": ["CAFE", "BISTRO"],
+        "limit": 1000,
+        "parent_category": "Comida",
+        "expense_nature": "variable",
+        "financial_purpose": "Deseo",
+    },
+    "Rent": {"keywords": ["CASA"], "planned_amount": 250000.5, "budget_period": "monthly", "expense_nature": "fixed"},
+    "Savings": {"keywords": [], "budget_type": "Savings", "budget_period": "annual"},
+}
+
+
+class SqliteTagStoreTest(unittest.TestCase):
+    def test_sqlite_round_trip_matches_json_backend(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = Path(tmp) / "tags.json"
+            db_path = Path(tmp) / "tags.sqlite3"
+            save_tags(LIBRARY, json_path)
+            save_tags(LIBRARY, db_path)
+
+            from_json = load_tags(json_path)
+            from_sqlite = load_tags(db_path)
+
+            self.assertEqual(from_sqlite, from_json)
+            self.assertEqual(list(from_sqlite), list(from_json))
+            self.assertIsInstance(from_sqlite["Dining"]["planned_amount"], int)
+
+            export_path = Path(tmp) / "export.json"
+            save_tags(from_sqlite, export_path)
+            self.assertEqual(json.loads(export_path.read_text(encoding="utf-8")), json.loads(json_path.read_text(encoding="utf-8")))
+
+    def test_save_writes_only_changed_rows_in_one_transaction(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "tags.sqlite3"
+            save_tags(LIBRARY, db_path)
+            tags = load_tags(db_path)
+
+            self.assertEqual(save_sqlite_tags(tags, db_path), 0)
+
+            tags["Dining"]["keywords"].append("SODA")
+            tags["Rent"]["planned_amount"] = Decimal("260000")
+            # 1 palabra clave agregada + 1 fila de metadatos.
+            self.assertEqual(save_sqlite_tags(tags, db_path), 2)
+
+            del tags["Savings"]
+            tags["Travel"] = tag_store.default_tag_info("Travel", ["UBER"])
+            save_tags(tags, db_path)
+
+            loaded = load_tags(db_path)
+            self.assertEqual(list(loaded), ["Dining", "Rent", "Travel"])
+            self.assertEqual(loaded["Dining"]["keywords"], ["CAFE", "BISTRO", "SODA"])
+            self.assertEqual(loaded["Rent"]["planned_amount"], 260000)
+            with sqlite3.connect(db_path) as conn:
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM tag_metadata").fetchone()[0], 3)
+
+    def test_failed_save_rolls_back_every_change(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "tags.sqlite3"
+            save_tags(LIBRARY, db_path)
+            before = load_tags(db_path)
+            tags = load_tags(db_path)
+            tags["Dining"]["keywords"].append("SODA")
+            tags["Travel"] = tag_store.default_tag_info("Travel", ["UBER"])
+
+            with mock.patch("sqlite_tag_store._insert_keywords", side_effect=[None, sqlite3.OperationalError("disk I/O error")]):
+                with self.assertRaises(sqlite3.OperationalError):
+                    save_tags(tags, db_path)
+
+            self.assertEqual(load_tags(db_path), before)
+
+    def test_find_tags_by_keyword_uses_case_insensitive_index(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "tags.sqlite3"
+            save_tags(LIBRARY, db_path)
+
+            self.assertEqual(find_tags_by_keyword("cafe", db_path), ["Dining"])
+            self.assertEqual(find_tags_by_keyword("UNKNOWN", db_path), [])
+
+    def test_sqlite_backend_selected_by_config_migrates_existing_tags_json(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = Path(tmp) / "tags.json"
+            json_path.write_text(json.dumps(LIBRARY), encoding="utf-8")
+
+            with mock.patch.dict(os.environ, {tag_store.TAG_BACKEND_ENV: "sqlite"}), \
+                    mock.patch("tag_store._source_tag_file_path", return_value=json_path):
+                self.assertEqual(tag_store.default_tag_file_path(), Path(tmp) / "tags.sqlite3")
+                tags = load_tags()
+                tags["Dining"]["keywords"].append("SODA")
+                save_tags(tags)
+                reloaded = load_tags()
+
+            self.assertTrue((Path(tmp) / "tags.sqlite3").exists())
+            self.assertEqual(reloaded["Dining"]["keywords"], ["CAFE", "BISTRO", "SODA"])
+            self.assertEqual(load_tags(json_path)["Dining"]["keywords"], ["CAFE", "BISTRO"])
+
+    def test_merge_tags_works_on_sqlite_loaded_tags(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "tags.sqlite3"
+            save_tags(LIBRARY, db_path)
+
+            merged, counts = merge_tags(load_tags(db_path), {"Dining": {"keywords": ["BAR"], "limit": 1000}})
+            save_tags(merged, db_path)
+
+            self.assertEqual(counts["keywords_added"], 1)
+            self.assertEqual(load_tags(db_path)["Dining"]["keywords"], ["CAFE", "BISTRO", "BAR"])
+
+    def test_rules_round_trip_through_sqlite_and_journal(self):
+        rules = [{"type": "regex", "pattern": "^UBER", "currency": "USD", "max_amount": 40}]
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("tags.sqlite3", "tags.json"):
+                with self.subTest(backend=name):
+                    path = Path(tmp) / name
+                    save_tags(LIBRARY, path)
+                    tags = load_tags(path)
+                    tags["Dining"]["rules"] = rules
+                    tag_store.save_tag_changes(tags, path)
+
+                    self.assertEqual(load_tags(path)["Dining"]["rules"], rules)
+
+                    del tags["Dining"]["rules"]
+                    tag_store.save_tag_changes(tags, path)
+                    self.assertNotIn("rules", load_tags(path)["Dining"])
+
+    def test_unknown_backend_is_rejected(self):
+        with mock.patch.dict(os.environ, {tag_store.TAG_BACKEND_ENV: "yaml"}):
+            with self.assertRaises(ValueError):
+                tag_store.tag_backend()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import Mock
+
+from startup_report import collect_startup_report, format_startup_report, measure_import_breakdown, parse_importtime
+
+
+ROOT = Path(__file__).resolve().parent
+STARTUP_IMPORT_BUDGET_SECONDS = 1.5
+
+
+def test_parse_importtime_keeps_modules_at_requested_depth():
+    stderr_text = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        120 |   tkinter",
+        "import time:        40 |         40 |     _tkinter",
+        "import time:      3000 |       5160 | purchase_tagger_app",
+        "import time:       900 |       2000 |   customtkinter",
+    ])
+
+    assert parse_importtime(stderr_text, depth=1) == {"tkinter": 0.00012, "customtkinter": 0.002}
+    assert parse_importtime(stderr_text) == {"purchase_tagger_app": 0.00516}
+
+
+def test_collect_startup_report_measures_first_frame_and_closes_window():
+    app = Mock()
+
+    report = collect_startup_report(lambda: app, started=0.0, breakdown=[("customtkinter", 0.1)])
+
+    app.update.assert_called_once_with()
+    app.on_close.assert_called_once_with()
+    assert report["time_to_first_frame"] >= report["window_seconds"] >= 0
+    assert report["import_breakdown"] == [("customtkinter", 0.1)]
+    assert "Tiempo al primer cuadro" in format_startup_report(report)
+
+
+def test_import_breakdown_runs_from_the_app_folder_and_reports_failures(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    assert "customtkinter" in dict(measure_import_breakdown())
+    try:
+        measure_import_breakdown("missing_purchase_tagger_module")
+    except RuntimeError as e:
+        assert "ModuleNotFoundError" in str(e)
+    else:
+        raise AssertionError("a failing import should be reported")
+
+    calls = []
+    app = Mock()
+    app.on_close.side_effect = lambda: calls.append("on_close")
+
+    def failing_breakdown():
+        calls.append("breakdown")
+        raise RuntimeError("import failed")
+
+    with monkeypatch.context() as patched:
+        patched.setattr("startup_report.measure_import_breakdown", failing_breakdown)
+        report = collect_startup_report(lambda: app, started=0.0)
+    # El proceso del desglose corre con la ventana ya cerrada.
+    assert calls == ["on_close", "breakdown"]
+    assert report["import_breakdown"] == []
+    assert "no disponible: import failed" in format_startup_report(report)
+
+
+def test_importing_app_defers_heavy_modules_within_startup_budget():
+    script = (
+        "import json, sys, time\n"
+        "started = time.perf_counter()\n"
+        "import purchase_tagger_app\n"
+        "elapsed = time.perf_counter() - started\n"
+        "heavy = [name for name in ('matplotlib', 'pypdf') if name in sys.modules]\n"
+        "print(json.dumps({'elapsed': elapsed, 'heavy': heavy}))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        timeout=60,
+        check=True,
+    )
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert measured["heavy"] == []
+    assert measured["elapsed"] < STARTUP_IMPORT_BUDGET_SECONDS
@@ -0,0 +1,163 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+from unittest.mock import patch
+import unittest
+
+from ledger import PurchaseLedger, file_sha256
+from statement_watcher import StatementWatcher, format_watch_summary, main
+
+
+CAFE = ("05-ENE-25", "CAFE", Decimal("-80.00"), "USD", "Dining", 0)
+TAXI = ("07-ENE-25", "TAXI", Decimal("-20.00"), "USD", "N/A", 0)
+
+
+class StatementWatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.folder = Path(self.tmp.name) / "inbox"
+        self.folder.mkdir()
+        self.ledger_path = Path(self.tmp.name) / "ledger.sqlite3"
+
+    def write_statement(self, name, content, age=60):
+        path = self.folder / name
+        path.write_bytes(content)
+        stamp = time.time() - age
+        os.utime(path, (stamp, stamp))
+        return path
+
+    def make_watcher(self, **kwargs):
+        ledger = PurchaseLedger(self.ledger_path)
+        self.addCleanup(ledger.close)
+        watcher = StatementWatcher(self.folder, ledger, **kwargs)
+        self.addCleanup(watcher.close)
+        return watcher
+
+    def test_processes_new_files_once_and_resumes_after_restart(self):
+        self.write_statement("jan.pdf", b"january")
+        self.write_statement("notes.txt", b"ignored")
+        watcher = self.make_watcher()
+
+        with patch("statement_watcher.process_purchases", return_value=[CAFE, TAXI]) as process_purchases:
+            first = watcher.poll()
+            second = watcher.poll()
+            watcher.close()
+            watcher.ledger.close()
+            restarted = self.make_watcher().poll()
+
+        process_purchases.assert_called_once_with(str(self.folder / "jan.pdf"), bank="BAC", account_type="Credito")
+        self.assertEqual((first["files"], first["inserted"]), (1, 2))
+        self.assertEqual((second["files"], restarted["files"], restarted["served"]), (0, 0, 0))
+        self.assertEqual(format_watch_summary(first), "1 archivo(s) nuevo(s): 2 compras agregadas")
+
+    def test_waits_for_half_written_files_to_settle(self):
+        path = self.write_statement("feb.pdf", b"february, partial", age=0)
+        now = [time.time()]
+        watcher = self.make_watcher(settle_seconds=5, clock=lambda: now[0])
+
+        self.assertEqual(watcher.scan(), [])
+        with open(path, "ab") as f:
+            f.write(b" and the rest")
+        now[0] += 10
+        self.assertEqual(watcher.scan(), [])
+        now[0] += 10
+        self.assertEqual([ready for ready, _ in watcher.scan()], [str(path)])
+
+    def test_changed_file_is_reprocessed_and_renamed_copy_is_served_from_registry(self):
+        path = self.write_statement("jan.pdf", b"january")
+        watcher = self.make_watcher()
+        with patch("statement_watcher.process_purchases", side_effect=[[CAFE], [CAFE, TAXI]]) as process_purchases:
+            watcher.poll()
+            self.write_statement("jan.pdf", b"january, corrected", age=30)
+            changed = watcher.poll()
+            self.write_statement("jan-copy.pdf", path.read_bytes())
+            copied = watcher.poll()
+
+        self.assertEqual(process_purchases.call_count, 2)
+        self.assertEqual((changed["files"], changed["inserted"], changed["duplicates"]), (1, 1, 1))
+        self.assertEqual((copied["files"], copied["served"]), (0, 1))
+
+    def test_failed_files_are_reported_and_retried_only_after_they_change(self):
+        self.write_statement("broken.pdf", b"not a statement")
+        watcher = self.make_watcher()
+
+        with patch("statement_watcher.process_purchases", side_effect=ValueError("Cannot read file")) as process_purchases:
+            failed = watcher.poll()
+            watcher.poll()
+
+        self.assertEqual(failed["errors"], [("broken.pdf", "Cannot read file")])
+        self.assertEqual(process_purchases.call_count, 1)
+        self.assertEqual(watcher.ledger.watched_files(), {})
+
+    def test_vanished_locked_and_unrecordable_files_are_reported_without_stopping(self):
+        for name in ("gone.pdf", "locked.pdf", "jan.pdf", "feb.pdf"):
+            self.write_statement(name, name.encode())
+        watcher = self.make_watcher()
+        hash_threads = []
+
+        def hash_file(path):
+            hash_threads.append(threading.current_thread())
+            if path.endswith("gone.pdf"):
+                os.unlink(path)
+            if path.endswith("locked.pdf"):
+                raise PermissionError("File is locked")
+            return file_sha256(path)
+
+        def record_statement(source_hash, file_name, *args, **kwargs):
+            if file_name == "feb.pdf":
+                raise sqlite3.OperationalError("database is locked")
+            return PurchaseLedger.record_statement(watcher.ledger, source_hash, file_name, *args, **kwargs)
+
+        with patch("statement_watcher.file_sha256", side_effect=hash_file), \
+                patch.object(watcher.ledger, "record_statement", side_effect=record_statement), \
+                patch("statement_watcher.process_purchases", return_value=[CAFE]):
+            summary = watcher.poll()
+
+        self.assertEqual(sorted(name for name, _error in summary["errors"]), ["feb.pdf", "gone.pdf", "locked.pdf"])
+        self.assertIn(("locked.pdf", "File is locked"), summary["errors"])
+        self.assertEqual((summary["files"], summary["inserted"]), (1, 1))
+        self.assertNotIn(threading.main_thread(), hash_threads)
+        self.assertEqual(len(hash_threads), 4)
+
+    def test_broken_tags_file_or_unreadable_ledger_keeps_polling(self):
+        self.write_statement("jan.pdf", b"january")
+        watcher = self.make_watcher()
+
+        with patch("statement_watcher.process_purchases", return_value=[CAFE]), \
+                patch("statement_watcher.load_tags", side_effect=ValueError("Invalid tags file")):
+            broken_tags = watcher.poll()
+        with patch.object(watcher.ledger, "watched_files", side_effect=sqlite3.OperationalError("disk I/O error")):
+            watcher._progress = None
+            broken_ledger = watcher.poll()
+        self.write_statement("jan.pdf", b"january, fixed", age=30)
+        with patch("statement_watcher.process_purchases", return_value=[CAFE]):
+            # La primera revision ve el cambio; la segunda, el archivo ya estable.
+            watcher.poll()
+            recovered = watcher.poll()
+
+        self.assertEqual(broken_tags["errors"], [("jan.pdf", "Invalid tags file")])
+        self.assertEqual(broken_ledger["errors"], [("inbox", "disk I/O error")])
+        self.assertEqual((recovered["files"], recovered["inserted"], recovered["errors"]), (1, 1, []))
+
+    def test_headless_once_mode_processes_folder_and_exits(self):
+        self.write_statement("jan.pdf", b"january")
+
+        with patch("statement_watcher.process_purchases", return_value=[CAFE]), \
+                patch("builtins.print") as printed:
+            status = main([str(self.folder), "--once", "--ledger", str(self.ledger_path)])
+
+        self.assertEqual(status, 0)
+        printed.assert_called_once_with("1 archivo(s) nuevo(s): 1 compras agregadas", flush=True)
+
+    def test_unsupported_bank_account_pair_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.make_watcher(bank="BCR", account_type="Credito")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import random
+import unittest
+
+import tag_store
+from tag_rules import TagMatcher, benchmark_tag_matching, compile_tag_rules, synthetic_tag_library
+from tag_store import tag_purchase
+
+
+RULE_TAGS = tag_store._validate_and_migrate_tags(
+    {
+        "Rides": {
+            "keywords": [],
+            "rules": [
+                {"type": "regex", "pattern": r"^UBER\s+\*?TRIP"},
+                {"type": "token", "pattern": "didi"},
+            ],
+        },
+        "Food delivery": {"keywords": ["UBER", "RAPPI"]},
+        "Big groceries": {
+            "keywords": [],
+            "rules": [{"type": "keyword", "pattern": "AUTOMERCADO", "currency": "CRC", "min_amount": 50000}],
+        },
+        "Groceries": {"keywords": ["AUTOMERCADO", "MAS X MENOS"]},
+        "Dollar subscriptions": {
+            "keywords": [],
+            "rules": [{"type": "token", "pattern": "NETFLIX", "currency": "USD", "max_amount": 30}],
+        },
+    }
+)
+
+
+class TagRulesTest(unittest.TestCase):
+    def test_plain_keyword_lists_match_like_substring_loop(self):
+        tags = tag_store._validate_and_migrate_tags({"Dining": ["cafe", "SODA"], "Travel": ["UBER"], "Any": ["A"]})
+        matcher = TagMatcher(tags)
+
+        for description in ("Cafe Britt", "uber trip", "SODA LA ESQUINA UBER", "BANCO", "xyz"):
+            with self.subTest(description=description):
+                self.assertEqual(matcher.match(description), tag_purchase(description, tags))
+
+    def test_tag_order_sets_priority_over_position_in_description(self):
+        tags = tag_store._validate_and_migrate_tags({"Late": ["TRIP"], "Early": ["TRI"], "Other": ["UBER"]})
+
+        self.assertEqual(TagMatcher(tags).match("UBER TRIP"), "Late")
+        self.assertEqual(TagMatcher(tags).match("UBER TRIANGLE"), "Early")
+
+    def test_regex_token_and_amount_rules(self):
+        matcher = TagMatcher(RULE_TAGS)
+
+        self.assertEqual(matcher.match("UBER *TRIP HELP.UBER.COM"), "Rides")
+        self.assertEqual(matcher.match("PAYPAL UBER *TRIP"), "Food delivery")
+        self.assertEqual(matcher.match("DIDI RIDES CR"), "Rides")
+        self.assertEqual(matcher.match("DIDIFOOD CR"), "N/A")
+        self.assertEqual(matcher.match("AUTOMERCADO ESCAZU", "-75,000.00", "CRC"), "Big groceries")
+        self.assertEqual(matcher.match("AUTOMERCADO ESCAZU", "-7,500.00", "CRC"), "Groceries")
+        self.assertEqual(matcher.match("AUTOMERCADO ESCAZU", "-75,000.00", "USD"), "Groceries")
+        self.assertEqual(matcher.match("AUTOMERCADO ESCAZU"), "Groceries")
+        self.assertEqual(matcher.match("NETFLIX.COM", "15.99", "USD"), "Dollar subscriptions")
+        self.assertEqual(matcher.match("NETFLIX.COM", "45.00", "USD"), "N/A")
+        self.assertTrue(matcher.has_conditions)
+
+    def test_matcher_agrees_with_reference_loop_on_random_descriptions(self):
+        rng = random.Random(36)
+        words = ["UBER", "TRIP", "*", "DIDI", "DIDIFOOD", "RAPPI", "AUTOMERCADO", "MAS", "X", "MENOS", "NETFLIX", "CR"]
+        matcher = compile_tag_rules(RULE_TAGS)
+
+        for _ in range(500):
+            description = " ".join(rng.choice(words) for _ in range(rng.randint(1, 5)))
+            amount = f"{rng.choice([-1, 1]) * rng.randint(1, 100000)}.00"
+            currency = rng.choice(["CRC", "USD"])
+            self.assertEqual(
+                matcher.match(description, amount, currency),
+                tag_purchase(description, RULE_TAGS, amount=amount, currency=currency),
+                description,
+            )
+
+    def test_compiled_matcher_is_reused_per_tags_version(self):
+        tags = tag_store._validate_and_migrate_tags({"Dining": ["CAFE"]})
+
+        first = compile_tag_rules(tags)
+        self.assertIs(compile_tag_rules(tag_store._copy_tags(tags)), first)
+
+        tags["Dining"]["keywords"].append("SODA")
+        second = compile_tag_rules(tags)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.match("SODA TICA"), "Dining")
+
+    def test_invalid_rules_are_rejected(self):
+        for rules in ([{"type": "regex", "pattern": "("}], [{"type": "glob", "pattern": "*"}], [{"pattern": ""}], "UBER"):
+            with self.subTest(rules=rules):
+                with self.assertRaises(ValueError):
+                    tag_store._validate_and_migrate_tags({"Rides": {"keywords": [], "rules": rules}})
+
+    def test_benchmark_combined_matcher_beats_substring_loop_on_large_library(self):
+        tags = synthetic_tag_library(300, 20)
+        descriptions = [f"POS MERCHANT {index % 600:04d}-{index % 25:02d} SAN JOSE" for index in range(300)]
+
+        report = benchmark_tag_matching(tags, descriptions, repeat=1)
+
+        self.assertTrue(report["same_results"])
+        self.assertEqual(report["keywords"], 6000)
+        self.assertLess(report["matcher_seconds"], report["loop_seconds"])
+
+
+if __name__ == "__main__":
+    unittest.main()
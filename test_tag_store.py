@@ -1,8 +1,10 @@
 import json
 import os
+import subprocess
 import sys
 from unittest import mock
 import tempfile
+import time
 from decimal import Decimal
 from pathlib import Path
 import unittest
@@ -222,6 +224,225 @@ class TagStoreTest(unittest.TestCase):
 
             self.assertEqual(json.loads(path.read_text(encoding="utf-8")), original)
 
+    def test_write_behind_saver_coalesces_burst_into_one_durable_write(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "tags.json"
+            original = {"Dining": {"keywords": ["CAFE"], "limit": 1000}}
+            path.write_text(json.dumps(original), encoding="utf-8")
+            saver = tag_store.WriteBehindTagSaver(path, delay=60)
+            tags = {"Dining": {"keywords": ["CAFE"], "limit": 1000}}
+
+            for keyword in ("BAR", "BISTRO", "SODA"):
+                tags["Dining"]["keywords"].append(keyword)
+                saver.schedule(tags)
+            tags["Dining"]["keywords"].append("NOT SCHEDULED")
+
+            self.assertTrue(saver.pending)
+            self.assertEqual(json.loads(path.read_text(encoding="utf-8")), original)
+
+            saver.flush()
+
+            self.assertFalse(saver.pending)
+            self.assertEqual(saver.writes, 1)
+            self.assertEqual(
+                json.loads(path.read_text(encoding="utf-8")),
+                {"Dining": self.enriched("Dining", ["CAFE", "BAR", "BISTRO", "SODA"], 1000)},
+            )
+            self.assertEqual(json.loads(path.with_suffix(".json.bak").read_text(encoding="utf-8")), original)
+            self.assertEqual(list(Path(tmp).glob("*.tmp")), [])
+
+    def test_write_behind_saver_writes_after_quiet_period(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "tags.json"
+            saver = tag_store.WriteBehindTagSaver(path, delay=0.01)
+
+            saver.schedule({"Travel": ["UBER"]})
+            deadline = time.monotonic() + 5
+            while saver.pending or saver.writes == 0:
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.01)
+
+            self.assertEqual(load_tags(path), {"Travel": self.enriched("Travel", ["UBER"])})
+
+    def test_write_behind_saver_validates_when_scheduling(self):
+        saver = tag_store.WriteBehindTagSaver(Path("unused.json"), delay=60)
+
+        with self.assertRaises(ValueError):
+            saver.schedule({"Dining": {"keywords": "CAFE"}})
+        self.assertFalse(saver.pending)
+
+    def test_write_behind_saver_reports_failed_write_on_flush_and_keeps_change(self):
+        writer = mock.Mock(side_effect=[OSError("disk full"), None])
+        saver = tag_store.WriteBehindTagSaver(delay=60, writer=writer)
+
+        saver.schedule({"Dining": ["CAFE"]})
+        with self.assertRaises(OSError):
+            saver.flush()
+        self.assertTrue(saver.pending)
+
+        saver.flush()
+
+        self.assertFalse(saver.pending)
+        self.assertEqual(writer.call_count, 2)
+        self.assertEqual(writer.call_args.args[0], {"Dining": self.enriched("Dining", ["CAFE"])})
+
+    def test_save_tag_changes_appends_records_without_rewriting_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "tags.json"
+            save_tags({"Dining": ["CAFE"], "Travel": ["UBER"]}, path)
+            snapshot = path.read_bytes()
+            tags = load_tags(path)
+
+            tags["Dining"]["keywords"].append("BISTRO")
+            tags["Travel"]["planned_amount"] = Decimal("2500")
+            tag_store.save_tag_changes(tags, path)
+
+            self.assertEqual(path.read_bytes(), snapshot)
+            records = [json.loads(line) for line in path.with_suffix(".json.journal").read_text(encoding="utf-8").splitlines()]
+            self.assertEqual(records[0]["op"], "snapshot")
+            self.assertEqual(
+                records[1:],
+                [
+                    {"op": "add_keyword", "tag": "Dining", "keyword": "BISTRO"},
+                    {"op": "set_field", "tag": "Travel", "field": "planned_amount", "value": 2500},
+                ],
+            )
+            loaded = load_tags(path)
+            self.assertEqual(loaded["Dining"]["keywords"], ["CAFE", "BISTRO"])
+            self.assertEqual(loaded["Travel"]["planned_amount"], 2500)
+
+    def test_save_tag_changes_records_parent_category_rename_once(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "tags.json"
+            save_tags(
+                {
+                    "Dining": {"keywords": ["CAFE"], "parent_category": "Comida"},
+                    "Market": {"keywords": ["SUPER"], "parent_category": "Comida"},
+                    "Travel": {"keywords": ["UBER"]},
+                },
+                path,
+            )
+            tags = load_tags(path)
+            tags["Dining"]["parent_category"] = "Alimentos"
+            tags["Market"]["parent_category"] = "Alimentos"
+
+            tag_store.save_tag_changes(tags, path)
+
+            lines = path.with_suffix(".json.journal").read_text(encoding="utf-8").splitlines()
+            self.assertEqual(json.loads(lines[-1]), {"op": "rename_parent_category", "old": "Comida", "new": "Alimentos"})
+            self.assertEqual(len(lines), 2)
+            self.assertEqual(load_tags(path), tags)
+
+    def test_save_tag_changes_keeps_tag_and_keyword_order(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "tags.json"
+            save_tags({"Dining": ["CAFE", "BAR"], "Travel": ["UBER"]}, path)
+            tags = load_tags(path)
+            tags["Dining"]["keywords"][0] = "BISTRO"
+            tags["Trips"] = tags.pop("Travel")
+
+            tag_store.save_tag_changes(tags, path)
+
+            loaded = load_tags(path)
+            self.assertEqual(list(loaded), ["Dining", "Trips"])
+            self.assertEqual(loaded["Dining"]["keywords"], ["BISTRO", "BAR"])
+
+    def test_save_tag_changes_compacts_journal_past_threshold(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "tags.json"
+            save_tags({"Dining": ["CAFE"]}, path)
+            tags = load_tags(path)
+            tags["Dining"]["keywords"].append("BAR")
+            tag_store.save_tag_changes(tags, path, compact_bytes=10_000)
+            journal = path.with_suffix(".json.journal")
+            self.assertTrue(journal.exists())
+
+            tags["Dining"]["keywords"].append("X" * 200)
+            tag_store.save_tag_changes(tags, path, compact_bytes=200)
+
+            self.assertFalse(journal.exists())
+            self.assertEqual(json.loads(path.read_text(encoding="utf-8")), tags)
+            backup = path.with_suffix(".json.bak")
+            self.assertEqual(load_tags(backup)["Dining"]["keywords"], ["CAFE", "BAR"])
+
+    def test_load_tags_ignores_stale_journal_and_truncated_record(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "tags.json"
+            save_tags({"Dining": ["CAFE"]}, path)
+            tags = load_tags(path)
+            tags["Dining"]["keywords"].append("BAR")
+            tag_store.save_tag_changes(tags, path)
+            journal = path.with_suffix(".json.journal")
+
+            with open(journal, "a", encoding="utf-8") as f:
+                f.write('{"op": "add_keyword", "tag": "Din')
+            self.assertEqual(load_tags(path)["Dining"]["keywords"], ["CAFE", "BAR"])
+
+            tags["Dining"]["keywords"].append("SODA")
+            tag_store.save_tag_changes(tags, path)
+            self.assertFalse(journal.exists())
+            self.assertEqual(load_tags(path)["Dining"]["keywords"], ["CAFE", "BAR", "SODA"])
+
+            path.write_text(json.dumps({"Travel": ["UBER"]}), encoding="utf-8")
+            journal.write_text(
+                json.dumps({"op": "snapshot", "sha256": "stale"}) + "\n"
+                + json.dumps({"op": "delete_tag", "tag": "Travel"}) + "\n",
+                encoding="utf-8",
+            )
+            self.assertEqual(list(load_tags(path)), ["Travel"])
+
+    def test_load_tags_validates_once_and_returns_independent_snapshots(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "tags.json"
+            save_tags({"Dining": ["CAFE"]}, path)
+
+            with mock.patch("tag_store._validate_and_migrate_tags", wraps=tag_store._validate_and_migrate_tags) as validate:
+                first = load_tags(path)
+                first["Dining"]["keywords"].append("MUTATED")
+                first["Extra"] = self.enriched("Extra")
+                second = load_tags(path)
+
+            self.assertEqual(validate.call_count, 1)
+            self.assertEqual(second, {"Dining": self.enriched("Dining", ["CAFE"])})
+
+    def test_save_tags_invalidates_load_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "tags.json"
+            save_tags({"Dining": ["CAFE"]}, path)
+            load_tags(path)
+
+            save_tags({"Travel": ["UBER"]}, path)
+
+            self.assertEqual(load_tags(path), {"Travel": self.enriched("Travel", ["UBER"])})
+
+    def test_load_cache_sees_edits_from_another_process(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "tags.json"
+            save_tags({"Dining": ["CAFE"]}, path)
+            self.assertEqual(load_tags(path)["Dining"]["keywords"], ["CAFE"])
+
+            def run_in_child(code):
+                subprocess.run(
+                    [sys.executable, "-c", f"import sys; sys.path.insert(0, {str(Path(tag_store.__file__).parent)!r})\n{code}"],
+                    check=True,
+                    timeout=60,
+                )
+
+            run_in_child(
+                "import tag_store\n"
+                f"tags = tag_store.load_tags({str(path)!r})\n"
+                "tags['Dining']['keywords'].append('BAR')\n"
+                f"tag_store.save_tag_changes(tags, {str(path)!r})\n"
+            )
+            self.assertEqual(load_tags(path)["Dining"]["keywords"], ["CAFE", "BAR"])
+
+            run_in_child(f"import tag_store\ntag_store.save_tags({{'Travel': ['UBER']}}, {str(path)!r})\n")
+            self.assertEqual(list(load_tags(path)), ["Travel"])
+
+            same_size = path.read_text(encoding="utf-8").replace("UBER", "LYFT")
+            run_in_child(f"open({str(path)!r}, 'w', encoding='utf-8').write({same_size!r})\n")
+            self.assertEqual(load_tags(path)["Travel"]["keywords"], ["LYFT"])
+
     def test_merge_tags_adds_new_tag_from_import(self):
         current = {"Dining": {"keywords": ["CAFE"], "limit": 1000}}
         imported = {"tag_name": {"keywords": ["STORE"], "limit": 2000}}
@@ -295,6 +516,54 @@ class TagStoreTest(unittest.TestCase):
         self.assertEqual(merged["Dining"]["keywords"], ["CAFE"])
         self.assertEqual(counts, {"tags_added": 0, "keywords_added": 0, "limits_updated": 0, "metadata_updated": 0})
 
+    def test_merge_tags_accepts_streamed_items_and_reports_progress(self):
+        current = {"Dining": {"keywords": ["CAFE"], "limit": 1000}}
+        imported = {"Dining": {"keywords": ["CAFE", "LUNCH"], "limit": 2500}, "Travel": ["UBER"]}
+        progress = mock.Mock()
+
+        with mock.patch("tag_store.MERGE_PROGRESS_EVERY", 1):
+            streamed = tag_store.merge_tags(current, iter(imported.items()), progress=progress)
+
+        self.assertEqual(streamed, tag_store.merge_tags(current, imported))
+        self.assertEqual([call.args[0] for call in progress.call_args_list], [1, 2])
+
+    def test_merge_tags_handles_large_keyword_packs_in_linear_time(self):
+        current = {"Dining": {"keywords": [f"KW{index}" for index in range(0, 50_000, 2)], "limit": 0}}
+        imported = {"Dining": {"keywords": [f"KW{index}" for index in range(50_000)], "limit": 0}}
+
+        started = time.perf_counter()
+        merged, counts = tag_store.merge_tags(current, imported)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(counts["keywords_added"], 25_000)
+        self.assertEqual(merged["Dining"]["keywords"][:3], ["KW0", "KW2", "KW4"])
+        self.assertEqual(merged["Dining"]["keywords"][25_000:25_002], ["KW1", "KW3"])
+        self.assertLess(elapsed, 1.0)
+
+    def test_iter_tag_file_items_streams_small_chunks_like_json_load(self):
+        data = {
+            "Café": {"keywords": ["PANADERÍA", "SODA \"LA 1\""], "limit": 1234567.25, "expense_nature": "variable"},
+            "Travel": ["UBER", "DIDI"],
+            "Empty": {"keywords": []},
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "import.json"
+            path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+
+            streamed = list(tag_store.iter_tag_file_items(path, chunk_size=5))
+
+            self.assertEqual(dict(streamed), load_tags(path))
+            self.assertEqual([tag for tag, _info in streamed], ["Café", "Travel", "Empty"])
+
+    def test_iter_tag_file_items_rejects_invalid_documents(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "import.json"
+            for content in ("[]", '{"Dining": ["CAFE"]} []', '{"Dining": ["CAFE"] "Travel": []}', '{"Dining": "CAFE"}'):
+                with self.subTest(content=content):
+                    path.write_text(content, encoding="utf-8")
+                    with self.assertRaises(ValueError):
+                        list(tag_store.iter_tag_file_items(path, chunk_size=4))
+
     def test_default_tag_file_path_keeps_source_tags_json_in_dev_mode(self):
         expected = Path(tag_store.__file__).resolve().parent / "tags.json"
 
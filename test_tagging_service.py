@@ -0,0 +1,118 @@
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+import unittest
+
+import tag_store
+from tag_store import save_tags
+from tagging_service import TaggingServer
+
+
+LIBRARY = {
+    "Dining": {"keywords": ["CAFE"], "limit": 1000, "parent_category": "Comida"},
+    "Rides": {"keywords": [], "rules": [{"type": "token", "pattern": "UBER", "currency": "USD"}]},
+}
+
+
+class TaggingServiceTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tags_path = Path(tmp.name) / "tags.json"
+        save_tags(LIBRARY, self.tags_path)
+        self.server = TaggingServer(port=0, tags_path=self.tags_path)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def request(self, path, payload=None, data=None):
+        if payload is not None:
+            data = json.dumps(payload).encode("utf-8")
+        with urlopen(Request(self.server.url + path, data=data), timeout=5) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    def test_tags_batches_with_hot_snapshot_reloaded_on_file_change(self):
+        first = self.request("/tag", {"descriptions": ["CAFE BRITT", "SODA TICA"]})
+        items = self.request("/tag", {"items": [
+            {"description": "UBER TRIP", "amount": "-10.00", "currency": "USD"},
+            {"description": "UBER TRIP", "amount": "-5000.00", "currency": "CRC"},
+        ]})
+        tags = json.loads(self.tags_path.read_text(encoding="utf-8"))
+        tags["Dining"]["keywords"].append("SODA")
+        save_tags(tags, self.tags_path)
+        reloaded = self.request("/tag", {"descriptions": ["CAFE BRITT", "SODA TICA"]})
+
+        self.assertEqual(first["tags"], ["Dining", "N/A"])
+        self.assertEqual(items["tags"], ["Rides", "N/A"])
+        self.assertEqual(reloaded["tags"], ["Dining", "Dining"])
+        self.assertNotEqual(reloaded["tags_version"], first["tags_version"])
+        self.assertEqual(self.request("/health")["tag_count"], 2)
+
+    def test_concurrent_batches_share_one_snapshot(self):
+        with patch("tagging_service.load_tags", wraps=tag_store.load_tags) as load_tags:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                results = list(pool.map(
+                    lambda index: self.request("/tag", {"descriptions": [f"CAFE {index}"] * 50})["tags"],
+                    range(16),
+                ))
+
+        self.assertEqual(results, [["Dining"] * 50] * 16)
+        self.assertEqual(load_tags.call_count, 1)
+
+    def test_processes_uploaded_statement_and_summarizes_rows(self):
+        purchases = [("05-ENE-25", "CAFE BRITT", "-1,200.50", "USD", "N/A", 0)]
+        with patch("tagging_service.process_purchases", return_value=purchases) as process_purchases:
+            statement = self.request("/statements?bank=BAC&account_type=Debito&filename=jan.pdf", data=b"%PDF")
+        summary = self.request("/summary", {
+            "currency": "USD",
+            "rows": statement["rows"] + [["20-FEB-25", "UBER TRIP", "-30.00", "USD"]],
+        })
+
+        self.assertEqual(process_purchases.call_args.kwargs, {"bank": "BAC", "account_type": "Debito"})
+        self.assertEqual(statement["rows"], [["05-ENE-25", "CAFE BRITT", "-1,200.50", "USD", "Dining"]])
+        self.assertEqual(summary["tag_totals"], {"Dining": "1200.50", "Rides": "30.00"})
+        self.assertEqual(summary["monthly_totals"], {"2025-01": "1200.50", "2025-02": "30.00"})
+        self.assertEqual(summary["by_parent_category"]["Comida"], "1200.50")
+
+    def test_bad_requests_get_json_errors(self):
+        for path, data, status in (
+            ("/tag", b"[1, 2]", 400),
+            ("/tag", b'{"descriptions": "CAFE"}', 400),
+            ("/statements?filename=jan.exe", b"MZ", 400),
+            ("/unknown", b"{}", 404),
+        ):
+            with self.subTest(path=path):
+                with self.assertRaises(HTTPError) as raised:
+                    self.request(path, data=data)
+                self.assertEqual(raised.exception.code, status)
+                self.assertIn("error", json.loads(raised.exception.read().decode("utf-8")))
+                raised.exception.close()
+
+    def test_unreadable_uploads_and_unexpected_failures_get_json_errors(self):
+        for path, status, side_effect in (
+            ("/statements?bank=BAC&account_type=Credito&filename=broken.pdf", 422, None),
+            ("/statements?bank=BCR&account_type=Credito&filename=jan.pdf", 400, None),
+            ("/tag", 500, RuntimeError("snapshot failed")),
+        ):
+            with self.subTest(path=path):
+                with patch.object(self.server.snapshot, "current", side_effect=side_effect, wraps=self.server.snapshot.current), \
+                        self.assertRaises(HTTPError) as raised:
+                    self.request(path, data=b"not a statement" if path.startswith("/statements") else b'{"descriptions": []}')
+                self.assertEqual(raised.exception.code, status)
+                self.assertIn("error", json.loads(raised.exception.read().decode("utf-8")))
+                raised.exception.close()
+
+    def test_refuses_non_loopback_addresses(self):
+        with self.assertRaises(ValueError):
+            TaggingServer(host="0.0.0.0", port=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
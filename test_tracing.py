@@ -0,0 +1,123 @@
+from concurrent.futures import ProcessPoolExecutor
+import json
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+import unittest
+
+from pypdf import PdfWriter
+from pypdf.generic import ContentStream
+
+from import_pipeline import ImportPipeline
+import purchase_extractor
+import tracing
+from tracing import NULL_SPAN, Tracer
+from views.diagnostics import diagnostics_rows
+
+
+class TracingTest(unittest.TestCase):
+    def test_disabled_tracer_returns_shared_null_span(self):
+        tracer = Tracer()
+
+        with tracer.span("parse", file="jan.pdf") as stage:
+            stage.add(3)
+
+        self.assertIs(tracer.span("parse"), NULL_SPAN)
+        self.assertEqual(tracer.events(), [])
+
+    def test_nested_spans_inherit_file_and_aggregate_per_stage_and_file(self):
+        tracer = Tracer(enabled=True)
+        for name in ("jan.pdf", "feb.pdf"):
+            with tracer.span("statement", file=name):
+                with tracer.span("parse") as stage:
+                    stage.add(10)
+                with tracer.span("tag_purchase", count=10):
+                    pass
+        with tracer.span("treeview_rebuild", count=20):
+            pass
+
+        stages = tracer.stage_totals()
+        files = tracer.file_totals()
+
+        self.assertEqual({name: totals["calls"] for name, totals in stages.items()}, {
+            "statement": 2, "parse": 2, "tag_purchase": 2, "treeview_rebuild": 1,
+        })
+        self.assertEqual(stages["parse"]["items"], 20)
+        self.assertEqual(sorted(files), ["feb.pdf", "jan.pdf"])
+        self.assertEqual(files["jan.pdf"]["parse"]["items"], 10)
+        self.assertEqual([group for group, _rows in diagnostics_rows(stages, files)], ["Todas las etapas", "feb.pdf", "jan.pdf"])
+
+    def test_exports_chrome_trace_event_json(self):
+        tracer = Tracer(enabled=True)
+        with tracer.span("pdf_text", file="jan.pdf", count=4):
+            time.sleep(0.001)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "trace.json"
+            tracer.export_chrome_trace(path)
+            trace = json.loads(path.read_text(encoding="utf-8"))
+
+        [event] = trace["traceEvents"]
+        self.assertEqual((event["name"], event["ph"], event["cat"]), ("pdf_text", "X", "import"))
+        self.assertEqual(event["args"], {"file": "jan.pdf", "items": 4})
+        self.assertGreaterEqual(event["dur"], 1000)
+        self.assertGreaterEqual(event["ts"], 0)
+
+    def test_process_purchases_records_extraction_parse_and_tag_stages(self):
+        rows = [("05-ENE-25", "CAFE", "-80.00", "USD")]
+        tracer = Tracer(enabled=True)
+        registry = {("BAC", "Credito"): (lambda text: rows, purchase_extractor.SOURCE_PDF_TEXT, True)}
+
+        with patch.object(tracing, "TRACER", tracer), \
+                patch.dict(purchase_extractor.PARSER_REGISTRY, registry), \
+                patch("purchase_extractor.extract_text", return_value="CAFE"), \
+                patch("purchase_extractor.load_tags", return_value={"Dining": {"keywords": ["CAFE"], "limit": 0}}):
+            with tracer.span("statement", file="jan.pdf"):
+                purchase_extractor.process_purchases("jan.pdf")
+
+        self.assertEqual(
+            sorted(tracer.file_totals()["jan.pdf"]),
+            ["load_tags", "parse", "statement", "tag_purchase"],
+        )
+        self.assertEqual(tracer.stage_totals()["tag_purchase"]["items"], 1)
+
+    def test_extraction_spans_from_worker_processes_reach_the_diagnostics(self):
+        tracer = Tracer(enabled=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "blank.pdf"
+            writer = PdfWriter()
+            contents = ContentStream(None, writer)
+            contents.set_data(b"")
+            writer.add_blank_page(width=200, height=200).replace_contents(contents)
+            with open(path, "wb") as f:
+                writer.write(f)
+
+            with ProcessPoolExecutor(max_workers=1) as executor, patch.object(tracing, "TRACER", tracer):
+                [result] = ImportPipeline([str(path)], "BAC", "Debito", {}, executor=executor).start()
+
+        self.assertIsNone(result["error"])
+        files = tracer.file_totals()
+        self.assertIn("pdf_open", files["blank.pdf"])
+        self.assertIn("statement", files["blank.pdf"])
+        groups = dict(diagnostics_rows(tracer.stage_totals(), files))
+        self.assertIn("pdf_open", [row[0] for row in groups["Todas las etapas"]])
+
+    def test_worker_spans_are_dropped_when_tracing_is_off(self):
+        tracer = Tracer()
+        with patch.object(tracing, "TRACER", tracer):
+            tracing.merge_events([("pdf_open", None, 0, 10, 1, 0)], file="jan.pdf")
+
+        self.assertEqual(tracer.events(), [])
+
+    def test_disabled_spans_cost_little(self):
+        tracer = Tracer()
+        started = time.perf_counter()
+        for _ in range(100_000):
+            with tracer.span("tag_purchase"):
+                pass
+        self.assertLess(time.perf_counter() - started, 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
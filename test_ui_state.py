@@ -1,10 +1,17 @@
 import os
+import time
 from decimal import Decimal
 
 from ui_state import (
+    FacetIndex,
+    FilteredRows,
+    PurchaseSortKeys,
+    StringPool,
     available_currencies,
     available_tags,
+    build_description_index,
     build_file_label,
+    filter_purchase_indexes,
     filter_purchase_rows,
     format_totals,
     kpi_stats,
@@ -103,3 +110,118 @@ def test_build_file_label_handles_empty_single_and_multiple_files():
     assert build_file_label([]) == "No hay archivos seleccionados"
     assert build_file_label([os.path.join("tmp", "statement.pdf")]) == "statement.pdf"
     assert build_file_label([os.path.join("tmp", "a.pdf"), os.path.join("tmp", "b.html")]) == "2 archivos seleccionados"
+
+
+def test_purchase_sort_keys_use_typed_date_amount_and_folded_text():
+    rows = [
+        ["01-ABR-24", "zeta", "-1,000.00", "USD", "b", "-"],
+        ["02-ENE-24", "Álamo", "20.00", "CRC", "A", "+"],
+        ["bad date", "alpha", "3.00", "USD", "c", "+"],
+    ]
+    sort_keys = PurchaseSortKeys()
+
+    assert [row[0] for row in sort_keys.sort(list(rows), [("date", False)])] == ["bad date", "02-ENE-24", "01-ABR-24"]
+    assert [row[2] for row in sort_keys.sort(list(rows), [("amount", True)])] == ["-1,000.00", "20.00", "3.00"]
+    assert [row[4] for row in sort_keys.sort(list(rows), [("tag", False)])] == ["A", "b", "c"]
+
+
+def test_purchase_sort_keys_sort_100k_rows_quickly():
+    rows = [
+        [f"{day % 28 + 1:02d}-{month}-25", f"VENDOR {day % 977}", f"{day % 5000}.{day % 100:02d}", "CRC", "N/A"]
+        for day, month in zip(range(100_000), ["ENE", "FEB", "MAR", "ABR"] * 25_000)
+    ]
+    sort_keys = PurchaseSortKeys()
+
+    started = time.perf_counter()
+    sort_keys.sort(rows, [("date", False), ("amount", True)])
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 3.0
+    assert rows[0][0] == "01-ENE-25"
+
+
+def test_build_description_index_maps_descriptions_to_row_positions():
+    rows = ROWS + [["04-MAY-26", "UBER TRIP", "3.10", "USD", "Transport"]]
+
+    assert build_description_index(rows) == {
+        "AUTOMERCADO ESCAZU": [0],
+        "UBER TRIP": [1, 3],
+        "UNMATCHED VENDOR": [2],
+    }
+
+
+def test_filter_purchase_indexes_point_into_the_master_rows():
+    indexes = filter_purchase_indexes(ROWS, currencies={"USD"})
+
+    assert list(indexes) == [1, 2]
+    assert filter_purchase_rows(ROWS, currencies={"USD"}) == [ROWS[1], ROWS[2]]
+
+
+def test_filtered_rows_sort_and_delete_without_copying_rows():
+    rows = [list(row) for row in ROWS]
+    view = FilteredRows(rows, filter_purchase_indexes(rows))
+
+    PurchaseSortKeys().sort(view, [("amount", True)])
+    assert view == [rows[0], rows[2], rows[1]]
+    assert view[0] is rows[0]
+
+    del view[1]
+    rows.append(["04-MAY-26", "NEW", "1.00", "USD", "N/A"])
+    assert list(view.indexes) == [0, 1]
+    assert list(view) == [rows[0], rows[1]]
+
+
+def test_string_pool_shares_equal_strings():
+    pool = StringPool()
+    first = pool.row(["01-MAY-26", "".join(["UBER", " TRIP"]), "USD"])
+    second = pool.row(["01-MAY-26", "".join(["UBER ", "TRIP"]), "USD"])
+
+    assert first == second
+    assert all(a is b for a, b in zip(first, second))
+    assert len(pool) == 3
+
+
+def test_facet_index_filters_like_the_row_scan_and_counts_rows():
+    rows = [list(row) for row in ROWS] + [["04-MAY-26", "UBER EATS", "12.00", "USD", "N/A"]]
+    facets = FacetIndex(rows)
+
+    for filters in (
+        {"currencies": {"USD"}},
+        {"month_key": "2026-05", "tag_name": "N/A"},
+        {"currencies": {"CRC", "USD"}, "month_key": "2026-04"},
+        {"search_text": "uber", "currencies": {"USD"}},
+        {"tag_name": "Missing"},
+        {},
+    ):
+        assert facets.filter_indexes(**filters) == filter_purchase_indexes(rows, **filters)
+    assert facets.values("month") == ["2026-04", "2026-05"]
+    assert facets.counts("tag") == {"Groceries": 1, "Transport": 1, "N/A": 2}
+
+
+def test_facet_index_follows_appended_rows_and_tag_changes():
+    rows = [list(row) for row in ROWS]
+    facets = FacetIndex(rows)
+    rows.append(["04-JUN-26", "NEW", "1.00", "EUR", "N/A"])
+    facets.extend()
+
+    assert facets.is_current(rows)
+    assert facets.values("currency") == ["CRC", "EUR", "USD"]
+
+    facets.move("tag", 2, "N/A", "Transport")
+    assert list(facets.filter_indexes(tag_name="Transport")) == [1, 2]
+    facets.merge("tag", "Transport", "Rides")
+    assert facets.values("tag") == ["Groceries", "N/A", "Rides"]
+    assert facets.counts("tag")["Rides"] == 2
+
+
+def test_facet_values_are_kept_sorted_without_rescanning_rows():
+    rows = [list(row) for row in ROWS]
+    facets = FacetIndex(rows)
+    rows[:] = []
+
+    facets.move("tag", 0, "Groceries", "Bakery")
+    facets.move("tag", 2, "N/A", "Transport")
+
+    assert facets.values("tag") == ["Bakery", "Transport"]
+    facets.merge("tag", "Bakery", "Transport")
+    assert facets.values("tag") == ["Transport"]
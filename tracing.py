@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+TRACE_ENV = "PURCHASE_TAGGER_TRACE"
+MAX_TRACE_EVENTS = 100_000
+
+
+class _NullSpan:
+    """
+    Span vacio que se devuelve mientras la traza esta apagada, para que el
+    costo en el camino normal sea una comparacion y una llamada.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def add(self, count):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "file", "count", "started", "previous_file")
+
+    def __init__(self, tracer, name, file, count):
+        self.tracer = tracer
+        self.name = name
+        self.file = file
+        self.count = count
+
+    def __enter__(self):
+        local = self.tracer._local
+        self.previous_file = getattr(local, "file", None)
+        if self.file is None:
+            self.file = self.previous_file
+        else:
+            local.file = self.file
+        self.started = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ended = time.perf_counter_ns()
+        self.tracer._local.file = self.previous_file
+        self.tracer._record(self.name, self.file, self.started, ended - self.started, self.count)
+        return False
+
+    def add(self, count):
+        """
+        Suma elementos procesados dentro del span (filas, paginas...).
+        """
+        self.count += count
+
+
+class Tracer:
+    """
+    Registro de spans por etapa del pipeline de importacion. Cada span guarda
+    etapa, archivo, inicio, duracion, hilo y cantidad de elementos. Los spans
+    anidados heredan el archivo del span exterior.
+    """
+
+    def __init__(self, enabled=False, max_events=MAX_TRACE_EVENTS):
+        self.enabled = enabled
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter_ns()
+
+    def span(self, name, file=None, count=0):
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name, file, count)
+
+    def events(self):
+        with self._lock:
+            return list(self._events)
+
+    def merge(self, events, file=None):
+        """
+        Agrega spans grabados en otro proceso (ver `run_traced`). Los que no
+        traen archivo quedan con `file` o con el del span abierto en este hilo.
+        """
+        if not self.enabled or not events:
+            return
+        if file is None:
+            file = getattr(self._local, "file", None)
+        with self._lock:
+            self._events.extend((name, event_file or file, *event) for name, event_file, *event in events)
+
+    def reset(self):
+        with self._lock:
+            self._events.clear()
+            self._origin = time.perf_counter_ns()
+
+    def stage_totals(self):
+        """
+        Devuelve {etapa: {"calls", "items", "seconds", "max_seconds"}}.
+        """
+        return _aggregate((name, event) for name, _file, *event in self.events())
+
+    def file_totals(self):
+        """
+        Devuelve {archivo: {etapa: {"calls", "items", "seconds", "max_seconds"}}}
+        para los spans asociados a un archivo.
+        """
+        by_file = {}
+        for name, file, *event in self.events():
+            if file is not None:
+                by_file.setdefault(file, []).append((name, event))
+        return {file: _aggregate(entries) for file, entries in by_file.items()}
+
+    def chrome_trace(self):
+        """
+        Eventos en el formato "Trace Event" de Chrome (chrome://tracing,
+        Perfetto), con tiempos en microsegundos.
+        """
+        pid = os.getpid()
+        with self._lock:
+            origin = self._origin
+            events = list(self._events)
+        return {
+            "traceEvents": [
+                {
+                    "name": name,
+                    "cat": "import",
+                    "ph": "X",
+                    "ts": (started - origin) / 1000,
+                    "dur": duration / 1000,
+                    "pid": pid,
+                    "tid": thread_id,
+                    "args": {"file": file, "items": count},
+                }
+                for name, file, started, duration, thread_id, count in events
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def export_chrome_trace(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+
+    def _record(self, name, file, started, duration, count):
+        event = (name, file, started, duration, threading.get_ident(), count)
+        with self._lock:
+            self._events.append(event)
+
+
+def _aggregate(entries):
+    totals = {}
+    for name, (_started, duration, _thread_id, count) in entries:
+        stage = totals.setdefault(name, {"calls": 0, "items": 0, "seconds": 0.0, "max_seconds": 0.0})
+        seconds = duration / 1e9
+        stage["calls"] += 1
+        stage["items"] += count
+        stage["seconds"] += seconds
+        stage["max_seconds"] = max(stage["max_seconds"], seconds)
+    return totals
+
+
+TRACER = Tracer(enabled=os.environ.get(TRACE_ENV, "").strip().lower() in ("1", "true", "yes"))
+
+
+def trace_state():
+    """
+    Lo que un trabajo enviado a otro proceso necesita para seguir la traza de
+    este: si esta encendida y el pid del proceso principal.
+    """
+    return TRACER.enabled, os.getpid()
+
+
+def run_traced(state, function, *args):
+    """
+    Ejecuta `function(*args)` y devuelve (resultado, spans). En un proceso de
+    trabajo enciende o apaga TRACER como el principal y devuelve los spans
+    grabados para `TRACER.merge`; en el mismo proceso ya quedaron en TRACER y
+    la lista va vacia.
+    """
+    enabled, parent_pid = state
+    if os.getpid() == parent_pid:
+        return function(*args), []
+    TRACER.enabled = enabled
+    TRACER.reset()
+    try:
+        return function(*args), TRACER.events()
+    finally:
+        TRACER.reset()
+
+
+def merge_events(events, file=None):
+    """
+    Agrega al trazador global los spans devueltos por `run_traced`.
+    """
+    TRACER.merge(events, file)
+
+
+def span(name, file=None, count=0):
+    """
+    Abre un span en el trazador global. Si la traza esta apagada devuelve
+    NULL_SPAN sin tomar tiempos.
+    """
+    if not TRACER.enabled:
+        return NULL_SPAN
+    return _Span(TRACER, name, file, count)
@@ -1,23 +1,253 @@
 #!/usr/bin/env python3
 import os
+from array import array
+from bisect import insort
 from collections import Counter
+from functools import lru_cache
+from itertools import compress
 
-from money import ZERO, format_amount, parse_amount
-from summary import currency_totals, filter_rows_by_month, filter_rows_by_text, purchase_spend_amount
+from money import CENT, ZERO, format_amount, parse_amount
+from summary import (
+    currency_totals,
+    month_key_from_date,
+    parse_purchase_date,
+    purchase_spend_amount,
+)
 
 
 ALL_MONTHS = "Todos"
 ALL_TAGS = "Todos"
+SORT_COLUMNS = ("date", "description", "sign", "amount", "currency", "tag")
+_STATIC_SORT_KEY_INDEXES = {"date": 0, "description": 1, "sign": 2, "amount": 3, "currency": 4}
 
 
 def filter_purchase_rows(rows, search_text="", currencies=None, month_key=ALL_MONTHS, tag_name=ALL_TAGS):
-    filtered = filter_rows_by_text(rows, search_text)
-    if currencies:
-        filtered = [row for row in filtered if len(row) > 3 and row[3] in currencies]
-    filtered = filter_rows_by_month(filtered, month_key)
-    if tag_name and tag_name != ALL_TAGS:
-        filtered = [row for row in filtered if len(row) > 4 and row[4] == tag_name]
-    return filtered
+    return [rows[index] for index in filter_purchase_indexes(rows, search_text, currencies, month_key, tag_name)]
+
+
+def filter_purchase_indexes(rows, search_text="", currencies=None, month_key=ALL_MONTHS, tag_name=ALL_TAGS):
+    """
+    Recorre `rows` una sola vez y devuelve, como array de enteros, las
+    posiciones de las filas que pasan todos los filtros.
+    """
+    text = search_text.lower()
+    by_month = month_key != ALL_MONTHS
+    by_tag = bool(tag_name) and tag_name != ALL_TAGS
+    indexes = array("I")
+    for index, row in enumerate(rows):
+        if text and text not in " ".join(row).lower():
+            continue
+        if currencies and not (len(row) > 3 and row[3] in currencies):
+            continue
+        if by_month and not (row and month_key_from_date(row[0]) == month_key):
+            continue
+        if by_tag and not (len(row) > 4 and row[4] == tag_name):
+            continue
+        indexes.append(index)
+    return indexes
+
+
+class FilteredRows:
+    """
+    Vista de las filas visibles: posiciones dentro de la lista maestra en un
+    array de enteros, sin copiar las filas. Se recorre, se ordena y se borra
+    como una lista; deja de ser valida si la lista maestra se reemplaza o se
+    le quitan filas (agregar al final no la afecta).
+    """
+
+    __slots__ = ("rows", "indexes")
+
+    def __init__(self, rows, indexes=()):
+        self.rows = rows
+        self.indexes = indexes if isinstance(indexes, array) else array("I", indexes)
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def __iter__(self):
+        rows = self.rows
+        for index in self.indexes:
+            yield rows[index]
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return FilteredRows(self.rows, self.indexes[position])
+        return self.rows[self.indexes[position]]
+
+    def __delitem__(self, position):
+        del self.indexes[position]
+
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"FilteredRows({list(self)!r})"
+
+    def sort(self, key, reverse=False):
+        rows = self.rows
+        self.indexes = array("I", sorted(self.indexes, key=lambda index: key(rows[index]), reverse=reverse))
+
+
+FACETS = ("currency", "month", "tag")
+_BIT_FLAGS = bytes.maketrans(b"01", b"\x00\x01")
+
+
+class FacetIndex:
+    """
+    Indices de bits por moneda, mes y etiqueta. Para cada valor guarda un
+    entero cuyo bit i esta encendido si la fila i de `rows` tiene ese valor,
+    de modo que combinar filtros es un AND entre enteros y el conteo de filas
+    por valor es `bit_count()`. Las filas agregadas al final se incorporan
+    con `extend()`; los cambios de etiqueta se aplican con `move()` y
+    `merge()`. La lista ordenada de valores de cada faceta se mantiene con
+    esos mismos cambios, sin recorrer las filas.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.row_count = 0
+        self.bits = {facet: {} for facet in FACETS}
+        self._values = {facet: [] for facet in FACETS}
+        self.extend()
+
+    def is_current(self, rows):
+        return self.rows is rows and self.row_count == len(rows)
+
+    def extend(self):
+        start, stop = self.row_count, len(self.rows)
+        if start == stop:
+            return
+        currencies, months, tags = {}, {}, {}
+        month_keys = {}
+        for offset, row in enumerate(self.rows[start:stop]):
+            if not row:
+                continue
+            date = row[0]
+            month_key = month_keys.get(date)
+            if month_key is None:
+                month_key = month_keys[date] = month_key_from_date(date) or ""
+            if month_key:
+                months.setdefault(month_key, []).append(offset)
+            if len(row) > 3 and row[3]:
+                currencies.setdefault(row[3], []).append(offset)
+            if len(row) > 4 and row[4]:
+                tags.setdefault(row[4], []).append(offset)
+        offsets = {"currency": currencies, "month": months, "tag": tags}
+        for facet, by_value in offsets.items():
+            bits = self.bits[facet]
+            for value, value_offsets in by_value.items():
+                if value not in bits:
+                    insort(self._values[facet], value)
+                bits[value] = bits.get(value, 0) | (_bitset(value_offsets, stop - start) << start)
+        self.row_count = stop
+
+    def values(self, facet):
+        return list(self._values[facet])
+
+    def counts(self, facet):
+        """
+        Filas por valor de la faceta, para mostrar junto a cada opcion.
+        """
+        return {value: bits.bit_count() for value, bits in self.bits[facet].items() if bits}
+
+    def move(self, facet, position, old, new):
+        if old == new:
+            return
+        bit = 1 << position
+        bits = self.bits[facet]
+        if old in bits:
+            bits[old] &= ~bit
+            if not bits[old]:
+                del bits[old]
+                self._values[facet].remove(old)
+        if new:
+            self._add_value(facet, new, bit)
+
+    def merge(self, facet, old, new):
+        bits = self.bits[facet]
+        if old == new or old not in bits:
+            return
+        self._values[facet].remove(old)
+        self._add_value(facet, new, bits.pop(old))
+
+    def _add_value(self, facet, value, value_bits):
+        bits = self.bits[facet]
+        if value not in bits:
+            insort(self._values[facet], value)
+        bits[value] = bits.get(value, 0) | value_bits
+
+    def mask(self, currencies=None, month_key=ALL_MONTHS, tag_name=ALL_TAGS):
+        """
+        AND de los bits de los filtros elegidos, o None si ninguno filtra.
+        """
+        selected = []
+        if currencies:
+            currency_bits = 0
+            for currency in currencies:
+                currency_bits |= self.bits["currency"].get(currency, 0)
+            selected.append(currency_bits)
+        if month_key != ALL_MONTHS:
+            selected.append(self.bits["month"].get(month_key, 0))
+        if tag_name and tag_name != ALL_TAGS:
+            selected.append(self.bits["tag"].get(tag_name, 0))
+        if not selected:
+            return None
+        mask = selected[0]
+        for bits in selected[1:]:
+            mask &= bits
+        return mask
+
+    def filter_indexes(self, search_text="", currencies=None, month_key=ALL_MONTHS, tag_name=ALL_TAGS):
+        """
+        Mismo resultado que `filter_purchase_indexes`, pero moneda, mes y
+        etiqueta salen de los bits y el texto solo se busca en las filas que
+        quedan.
+        """
+        mask = self.mask(currencies, month_key, tag_name)
+        positions = range(self.row_count) if mask is None else _bit_positions(mask)
+        text = search_text.lower()
+        if text:
+            rows = self.rows
+            return array("I", (position for position in positions if text in " ".join(rows[position]).lower()))
+        return positions if isinstance(positions, array) else array("I", positions)
+
+
+def _bitset(offsets, size):
+    buffer = bytearray((size + 7) // 8)
+    for offset in offsets:
+        buffer[offset >> 3] |= 1 << (offset & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def _bit_positions(mask):
+    flags = bin(mask)[:1:-1].encode("ascii").translate(_BIT_FLAGS)
+    return array("I", compress(range(len(flags)), flags))
+
+
+class StringPool:
+    """
+    Comparte una sola copia de cada texto repetido de las filas (fechas,
+    comercios, montos, monedas y etiquetas) en lugar de guardar un objeto por
+    fila.
+    """
+
+    def __init__(self, strings=()):
+        self._strings = {value: value for value in strings}
+
+    def __len__(self):
+        return len(self._strings)
+
+    def intern(self, value):
+        return self._strings.setdefault(value, value)
+
+    def row(self, values):
+        strings = self._strings
+        return [strings.setdefault(value, value) for value in values]
 
 
 def available_currencies(rows):
@@ -28,46 +258,180 @@ def available_tags(rows):
     return sorted({row[4] for row in rows if len(row) > 4 and row[4]})
 
 
-def kpi_stats(all_rows, filtered_rows, tags, natag="N/A"):
-    totals_by_tag = Counter()
-    for row in filtered_rows:
-        if len(row) < 5:
-            continue
-        tag = row[4]
-        try:
-            if len(row) > 5 and row[5] == "+":
-                continue
-            amount = purchase_spend_amount(row[2])
-            if amount is None:
-                amount = parse_amount(row[2])
-        except (ValueError, AttributeError):
-            continue
-        totals_by_tag[tag] += amount
+def build_description_index(rows):
+    index = {}
+    for position, row in enumerate(rows):
+        if len(row) > 1:
+            index.setdefault(row[1], []).append(position)
+    return index
 
-    over_limit_tags = 0
-    for tag, total in totals_by_tag.items():
-        tag_info = tags.get(tag, {})
-        limit = parse_amount(tag_info.get("planned_amount", tag_info.get("limit", ZERO)))
-        if limit and total > limit:
-            over_limit_tags += 1
 
-    return {
-        "total_rows": len(all_rows),
-        "visible_rows": len(filtered_rows),
-        "untagged_rows": sum(1 for row in filtered_rows if len(row) > 4 and row[4] == natag),
-        "currency_count": len(available_currencies(filtered_rows)),
-        "over_limit_tags": over_limit_tags,
-    }
+def kpi_stats(all_rows, filtered_rows, tags, natag="N/A"):
+    return KpiCounters(all_rows, filtered_rows, natag).stats(tags)
 
 
 def format_totals(rows):
-    totals = currency_totals(rows)
+    return format_currency_totals(currency_totals(rows))
+
+
+def format_currency_totals(totals):
     if not totals:
         return "Totales: 0.00"
     parts = [f"{currency} {format_amount(amount)}" for currency, amount in sorted(totals.items())]
     return f"Totales: {'; '.join(parts)}"
 
 
+class KpiCounters:
+    """
+    Contadores de KPI y totales de las filas visibles que se ajustan por delta
+    al quitar o agregar una fila, sin recorrer de nuevo toda la tabla.
+    """
+
+    def __init__(self, all_rows, filtered_rows, natag="N/A"):
+        self.natag = natag
+        self.total_rows = len(all_rows)
+        self.visible_rows = 0
+        self.untagged_rows = 0
+        self.spend_by_tag = Counter()
+        self.currency_rows = Counter()
+        self.currency_totals = {}
+        self.currency_total_rows = Counter()
+        for row in filtered_rows:
+            self.add(row)
+
+    def add(self, row):
+        self._apply(row, 1)
+
+    def discard(self, row):
+        self._apply(row, -1)
+
+    def stats(self, tags):
+        over_limit_tags = 0
+        for tag, total in self.spend_by_tag.items():
+            tag_info = tags.get(tag, {})
+            limit = parse_amount(tag_info.get("planned_amount", tag_info.get("limit", ZERO)))
+            if limit and total > limit:
+                over_limit_tags += 1
+        return {
+            "total_rows": self.total_rows,
+            "visible_rows": self.visible_rows,
+            "untagged_rows": self.untagged_rows,
+            "currency_count": sum(1 for count in self.currency_rows.values() if count > 0),
+            "over_limit_tags": over_limit_tags,
+        }
+
+    def totals_text(self):
+        totals = {
+            currency: amount
+            for currency, amount in self.currency_totals.items()
+            if self.currency_total_rows[currency] > 0
+        }
+        return format_currency_totals(totals)
+
+    def _apply(self, row, direction):
+        self.visible_rows += direction
+        if len(row) > 3 and row[3]:
+            self.currency_rows[row[3]] += direction
+        if len(row) > 4 and row[4] == self.natag:
+            self.untagged_rows += direction
+        spend = _kpi_spend_amount(row)
+        if spend is not None:
+            self.spend_by_tag[row[4]] += spend if direction > 0 else -spend
+        try:
+            amount = parse_amount(row[2])
+            currency = row[3]
+        except (IndexError, TypeError, ValueError):
+            return
+        self.currency_totals[currency] = self.currency_totals.get(currency, ZERO) + (
+            amount if direction > 0 else -amount
+        )
+        self.currency_total_rows[currency] += direction
+
+
+def _kpi_spend_amount(row):
+    if len(row) < 5:
+        return None
+    try:
+        if len(row) > 5 and row[5] == "+":
+            return None
+        amount = purchase_spend_amount(row[2])
+        if amount is None:
+            amount = parse_amount(row[2])
+    except (ValueError, AttributeError):
+        return None
+    return amount
+
+
+class PurchaseSortKeys:
+    """
+    Cache de llaves de orden tipadas por fila: ordinal de fecha, centavos
+    absolutos y texto normalizado. La etiqueta se lee en cada orden porque
+    cambia al reasignarla.
+    """
+
+    def __init__(self):
+        self._keys = {}
+
+    def clear(self):
+        self._keys.clear()
+
+    def keys_for(self, row):
+        entry = self._keys.get(id(row))
+        if entry is not None and entry[0] is row:
+            return entry[1]
+        keys = _static_sort_keys(row)
+        self._keys[id(row)] = (row, keys)
+        return keys
+
+    def sort(self, rows, sort_spec):
+        """
+        Ordena `rows` en sitio. `sort_spec` es una lista de (columna, descendente)
+        con la columna principal primero; el orden es estable entre columnas.
+        """
+        for column, reverse in reversed(list(sort_spec)):
+            rows.sort(key=self._column_key(column), reverse=reverse)
+        return rows
+
+    def _column_key(self, column):
+        if column == "tag":
+            return lambda row: row[4].casefold() if len(row) > 4 and row[4] else ""
+        index = _STATIC_SORT_KEY_INDEXES.get(column)
+        if index is None:
+            raise ValueError(f"Unknown sort column: {column}")
+        keys_for = self.keys_for
+        return lambda row: keys_for(row)[index]
+
+
+def _static_sort_keys(row):
+    date_str, description, amount, currency = (list(row[:4]) + [""] * 4)[:4]
+    cents = _amount_cents(amount)
+    sign = row[5] if len(row) > 5 else ("-" if cents < 0 else "+")
+    return (
+        _date_ordinal(date_str),
+        str(description or "").casefold(),
+        sign,
+        abs(cents),
+        str(currency or "").casefold(),
+    )
+
+
+@lru_cache(maxsize=4096)
+def _date_ordinal(date_str):
+    try:
+        parsed_date = parse_purchase_date(date_str)
+    except (KeyError, TypeError, ValueError):
+        return 0
+    return parsed_date.toordinal() if parsed_date else 0
+
+
+@lru_cache(maxsize=65536)
+def _amount_cents(amount):
+    try:
+        return int(parse_amount(amount).quantize(CENT) * 100)
+    except (TypeError, ValueError):
+        return 0
+
+
 def build_file_label(pdf_files):
     if not pdf_files:
         return "No hay archivos seleccionados"
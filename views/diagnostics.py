@@ -0,0 +1,145 @@
+import sys
+import tkinter as tk
+from tkinter import ttk
+
+import customtkinter as ctk
+
+from tracing import TRACER
+
+
+STAGE_COLUMNS = ("stage", "calls", "items", "seconds", "average", "max")
+STAGE_HEADINGS = {
+    "stage": "Etapa",
+    "calls": "Llamadas",
+    "items": "Elementos",
+    "seconds": "Total (ms)",
+    "average": "Promedio (ms)",
+    "max": "Máximo (ms)",
+}
+
+
+def _app_dependencies():
+    app_module = sys.modules.get("purchase_tagger_app") or sys.modules.get("__main__")
+    if app_module is None:
+        import purchase_tagger_app
+
+        app_module = purchase_tagger_app
+    return app_module
+
+
+def _build_diagnostics_view(self):
+    self.workspace.grid_rowconfigure(1, weight=1)
+    self._build_page_header(
+        self.workspace,
+        "Diagnóstico",
+        "Tiempos por etapa y por archivo de las últimas cargas.",
+    )
+
+    content = ctk.CTkFrame(self.workspace, fg_color="transparent")
+    content.grid(row=1, column=0, sticky="nsew", padx=24, pady=(0, 14))
+    content.grid_columnconfigure(0, weight=1)
+    content.grid_rowconfigure(1, weight=1)
+
+    toolbar = ctk.CTkFrame(content, fg_color="transparent")
+    toolbar.grid(row=0, column=0, sticky="ew", pady=(0, 10))
+    self.tracing_enabled_var = tk.BooleanVar(value=TRACER.enabled)
+    ctk.CTkCheckBox(
+        toolbar,
+        text="Registrar tiempos",
+        variable=self.tracing_enabled_var,
+        command=self.toggle_tracing,
+    ).grid(row=0, column=0, sticky="w", padx=(0, 12))
+    ctk.CTkButton(toolbar, text="Actualizar", command=self.refresh_diagnostics, width=100).grid(
+        row=0, column=1, padx=(0, 8)
+    )
+    ctk.CTkButton(toolbar, text="Exportar traza", command=self.export_trace, width=120).grid(
+        row=0, column=2, padx=(0, 8)
+    )
+    ctk.CTkButton(toolbar, text="Limpiar", command=self.clear_trace, width=80, fg_color="#64748b").grid(
+        row=0, column=3
+    )
+
+    panel = self._panel(content, row=1, column=0, sticky="nsew")
+    panel.grid_columnconfigure(0, weight=1)
+    panel.grid_rowconfigure(0, weight=1)
+    self.diagnostics_tree = ttk.Treeview(panel, columns=STAGE_COLUMNS, show="tree headings")
+    self.diagnostics_tree.heading("#0", text="Archivo")
+    self.diagnostics_tree.column("#0", width=180, minwidth=120, anchor="w")
+    for column in STAGE_COLUMNS:
+        self.diagnostics_tree.heading(column, text=STAGE_HEADINGS[column])
+        self.diagnostics_tree.column(column, width=90, minwidth=70, anchor="w" if column == "stage" else "e")
+    self.diagnostics_tree.grid(row=0, column=0, sticky="nsew", padx=(1, 0), pady=1)
+    scrollbar = ttk.Scrollbar(panel, orient="vertical", command=self.diagnostics_tree.yview)
+    scrollbar.grid(row=0, column=1, sticky="ns")
+    self.diagnostics_tree.configure(yscrollcommand=scrollbar.set)
+    self.refresh_diagnostics()
+
+
+def diagnostics_rows(stage_totals, file_totals):
+    """
+    Filas para la tabla de diagnostico: primero el total por etapa y luego un
+    grupo por archivo. Devuelve [(grupo, [valores de STAGE_COLUMNS])].
+    """
+    groups = [("Todas las etapas", stage_totals)]
+    groups.extend(sorted(file_totals.items()))
+    return [
+        (
+            group,
+            [
+                _stage_values(stage, totals)
+                for stage, totals in sorted(stages.items(), key=lambda item: -item[1]["seconds"])
+            ],
+        )
+        for group, stages in groups
+    ]
+
+
+def _stage_values(stage, totals):
+    milliseconds = totals["seconds"] * 1000
+    return [
+        stage,
+        totals["calls"],
+        totals["items"],
+        f"{milliseconds:.1f}",
+        f"{milliseconds / totals['calls']:.2f}",
+        f"{totals['max_seconds'] * 1000:.1f}",
+    ]
+
+
+def refresh_diagnostics(self):
+    tree = self.__dict__.get("diagnostics_tree")
+    if tree is None:
+        return
+    tree.delete(*tree.get_children())
+    for group, stage_rows in diagnostics_rows(TRACER.stage_totals(), TRACER.file_totals()):
+        parent = tree.insert("", "end", text=group, open=True)
+        for values in stage_rows:
+            tree.insert(parent, "end", values=values)
+    if not TRACER.enabled and not TRACER.events():
+        self._set_status("Active 'Registrar tiempos' y cargue estados de cuenta")
+
+
+def toggle_tracing(self):
+    TRACER.enabled = bool(self.tracing_enabled_var.get())
+    self._set_status("Registro de tiempos activo" if TRACER.enabled else "Registro de tiempos detenido")
+
+
+def clear_trace(self):
+    TRACER.reset()
+    self.refresh_diagnostics()
+
+
+def export_trace(self):
+    app = _app_dependencies()
+    path = app.filedialog.asksaveasfilename(
+        defaultextension=".json",
+        initialfile="traza.json",
+        filetypes=[("Chrome trace", "*.json"), ("All files", "*.*")],
+    )
+    if not path:
+        return
+    try:
+        TRACER.export_chrome_trace(path)
+        self._set_status(f"Traza exportada a {path}")
+    except OSError as exc:
+        app.messagebox.showerror("Error de exportación", str(exc))
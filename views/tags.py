@@ -521,6 +521,15 @@ def _count_phrase(count, singular, plural=None):
     return f"{count} {word}"
 
 
+def _retag_status_message(message, result):
+    if not result:
+        return message
+    return (
+        f"{message}; {_count_phrase(result['changed'], 'compra re-etiquetada', 'compras re-etiquetadas')} "
+        f"en {result['seconds'] * 1000:.0f} ms"
+    )
+
+
 def _import_status_message(counts):
     return (
         f"Se importaron {_count_phrase(counts['tags_added'], 'etiqueta')}, "
@@ -530,6 +539,12 @@ def _import_status_message(counts):
     )
 
 
+def _show_import_progress(self, processed):
+    self._set_status(f"Importando etiquetas... {processed} procesadas")
+    if "tk" in self.__dict__:
+        self.update_idletasks()
+
+
 def import_tags_json(self):
     if not self.save_current_tag_limit():
         return
@@ -538,8 +553,11 @@ def import_tags_json(self):
     if not path:
         return
     try:
-        imported_tags = app.load_tags(path)
-        merged_tags, counts = app.merge_tags(self.tags, imported_tags)
+        merged_tags, counts = app.merge_tags(
+            self.tags,
+            app.iter_tag_file_items(path),
+            progress=lambda processed: _show_import_progress(self, processed),
+        )
         app.save_tags(merged_tags)
         self.tags = merged_tags
         self.refresh_tag_lists()
@@ -612,6 +630,8 @@ def edit_tag(self):
     for row in self.__dict__.get("all_rows", []):
         if row[4] == old:
             row[4] = new
+    self._merge_tag_facet(old, new)
+    self._rename_manual_tags(old, new)
     app.save_tags(self.tags)
     self.refresh_tag_lists()
     _refresh_metadata_option_values(self)
@@ -633,6 +653,8 @@ def remove_tag(self):
     for row in self.__dict__.get("all_rows", []):
         if row[4] == tag:
             row[4] = self.natag
+    self._merge_tag_facet(tag, self.__dict__.get("natag", "N/A"))
+    self._rename_manual_tags(tag, self.__dict__.get("natag", "N/A"))
     app.save_tags(self.tags)
     self.refresh_tag_lists()
     _refresh_metadata_option_values(self)
@@ -756,8 +778,9 @@ def add_keyword(self):
         return
     self.tags[tag].setdefault("keywords", []).append(keyword)
     app.save_tags(self.tags)
+    result = self.retag_rows_for_keywords(added=[keyword])
     self.load_tag_details()
-    self._set_status(f'Se agregó una palabra clave a "{tag}"')
+    self._set_status(_retag_status_message(f'Se agregó una palabra clave a "{tag}"', result))
 
 
 def edit_keyword(self):
@@ -775,9 +798,10 @@ def edit_keyword(self):
         return
     self.tags[tag]["keywords"][index] = new
     app.save_tags(self.tags)
+    result = self.retag_rows_for_keywords(added=[new], removed=[old])
     self.load_tag_details()
     self.keyword_listbox.selection_set(index)
-    self._set_status(f'Se actualizó una palabra clave de "{tag}"')
+    self._set_status(_retag_status_message(f'Se actualizó una palabra clave de "{tag}"', result))
 
 
 def remove_keyword(self):
@@ -794,8 +818,9 @@ def remove_keyword(self):
         return
     del self.tags[tag]["keywords"][index]
     app.save_tags(self.tags)
+    result = self.retag_rows_for_keywords(removed=[keyword])
     self.load_tag_details()
-    self._set_status(f'Se eliminó una palabra clave de "{tag}"')
+    self._set_status(_retag_status_message(f'Se eliminó una palabra clave de "{tag}"', result))
 
 
 def save_tags_from_view(self):